@@ -6,17 +6,52 @@ Created on Thu Jan  5 12:30:13 2023
 """
 
 import glob, os
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 
 import pandas as pd
 import numpy as np
 
+import kline_store
+import kline_mmap
+import kline_ingest
+import kline_pyramid
+import binance_zip_reader
+
 
 #################### Loading Price Data ####################
 # Read price data
-def read(ticker: str) -> pd.DataFrame:
+def read(
+    ticker: str, start=None, end=None, columns: list = None, mmap: bool = False
+) -> pd.DataFrame:
+    """
+    Read klines of ticker, indexed by "Open time"
+    Uses the partitioned kline_store when the ticker has been converted into it
+    (kline_store.convert), only opening the months in [start, end] and the columns asked for.
+    Otherwise falls back to parsing every daily csv, or streaming the downloaded
+    zips when they have not been extracted.
+    Once a ticker has been ingested (kline_ingest.ingest), new daily files are
+    appended to the consolidated data first.
+
+    mmap: return read only views over the memory mapped layout (kline_mmap.build)
+          instead, nothing is parsed or copied and processes share one page cache copy
+    """
+    if kline_ingest.read_manifest(ticker) is not None:
+        # pick up the daily files downloaded since the last call, only those are parsed
+        kline_ingest.ingest(ticker)
+    if mmap and kline_mmap.read_meta(ticker) is not None:
+        df = kline_mmap.read(ticker, start, end, columns)
+        return df
+    if kline_store.partitions(ticker):
+        df = kline_store.read(ticker, start, end, columns)
+        return df
+
     path = rf"D:\Binance Data\klines\{ticker} - Unzipped"
     all_files = glob.glob(os.path.join(path, "*.csv"))
+    if not all_files:
+        # stream the downloaded zips directly, no extracted csv needed
+        df = binance_zip_reader.read_klines(ticker, start, end, columns)
+        return df
 
     # Take / Maker, maker is liquidity provider limit order
     # https://dev.binance.vision/t/taker-buy-base-asset-volume/6026/2
@@ -50,6 +85,11 @@ def read(ticker: str) -> pd.DataFrame:
     df["Open time"] = pd.to_datetime(df["Open time"], unit="ms")
     df["Close time"] = pd.to_datetime(df["Close time"], unit="ms")
     df.set_index("Open time", inplace=True)
+    df.drop(columns="Ignore", inplace=True)
+    # files come in glob order, .loc with bounds needs a sorted index
+    df = df.sort_index().loc[start:end]
+    if columns is not None:
+        df = df[[c for c in columns if c != "Open time"]]
     return df
 
 
@@ -60,19 +100,24 @@ btc[["Close", "Volume"]].plot(subplots=True)
 
 
 #################### Change Resolution ####################
-def resample(DF: pd.DataFrame, freq: str) -> pd.DataFrame:
-    df = DF.copy()
-    resample = df.resample(freq)
-    o = resample.first()["Open"]
-    h = resample.max()["High"]
-    l = resample.min()["Low"]
-    c = resample.last()["Close"]
-    v = resample.sum()[["Volume"]]
+def resample(DF: pd.DataFrame, freq: str, symbol: str = None) -> pd.DataFrame:
+    """
+    OHLCV bars of DF at freq
+    Fixed frequencies that divide a day are aggregated in one vectorised pass.
+    symbol: DF is the unmodified read() of symbol, its buckets are then looked up from
+            the resolution pyramid (kline_pyramid.build) at freq (5min, 15min, 1h, 4h,
+            1d) instead. Leave it None for filtered or edited klines
+    """
+    df = kline_pyramid.resample(DF, freq, symbol)
+    if df is not None:
+        return df
 
-    return pd.concat([o, h, l, c, v], axis=1)
+    return DF.resample(freq).agg(
+        {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+    )
 
 
-consolidatedData = resample(btc, "1d")
+consolidatedData = resample(btc, "1d", symbol="BTCUSDT")
 consolidatedData["return"] = consolidatedData["Close"].pct_change()
 
 
@@ -87,11 +132,93 @@ def load_on_chain_data(data_name: str) -> pd.DataFrame:
 
 
 #################### highlight signal on a graph ####################
-def highlight_signal(price: pd.Series, signal: pd.Series, interactive: bool = True):
+def decimate(values: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Sorted positions of the min and max of values in each of buckets equal slices, plus
+    both ends. Drawing only those points keeps every spike of the line (min/max per
+    pixel column) with at most 2 * buckets + 2 points
+    """
+    n = len(values)
+    if n <= 2 * buckets + 2:
+        return np.arange(n)
+    size = -(-n // buckets)
+    padded = np.empty(buckets * size, dtype=np.float64)
+    padded[:n] = values
+    padded[n:] = values[-1]
+    padded = padded.reshape(buckets, size)
+    # nan never wins a bucket
+    nan = np.isnan(padded)
+    start = np.arange(buckets) * size
+    low = np.where(nan, np.inf, padded).argmin(axis=1) + start
+    high = np.where(nan, -np.inf, padded).argmax(axis=1) + start
+    positions = np.unique(np.concatenate([[0, n - 1], low, high]))
+    return positions[positions < n]
+
+
+def highlight_signal(
+    price: pd.Series,
+    signal: pd.Series,
+    interactive: bool = True,
+    max_points: int = 4000,
+    start=None,
+    end=None,
+):
     """
     Take in pd.Series of asset price and signal and plot an interactive graph
     signal must be either 1 for long, -1 for short, np.nan for no signal
+
+    max_points: points of the price line drawn, decimated with decimate() so that years
+                of minute bars render in under a second. Every signal marker is kept.
+                Zooming re-decimates only the visible slice.
+                None draws every point
+    start, end: only plot this time range
+    returns the matplotlib (fig, ax)
     """
+    price = price.loc[start:end]
+    if max_points is None:
+        return _highlight_signal_full(price, signal, interactive)
+
+    x = price.index.values
+    y = price.to_numpy(dtype=np.float64)
+
+    # interactive mode
+    # if interactive:
+    #     %matplotlib
+    fig, ax = plt.subplots(figsize=(30, 15))
+
+    shown = decimate(y, max_points // 2)
+    (line,) = ax.plot(x[shown], y[shown], label=price.name)
+    for i, label, colour in [(1, "Long", "g"), (-1, "Short", "r")]:
+        at = price.index.get_indexer(signal.index[signal == i])
+        at = at[at >= 0]
+        # markers as a line without segments, far cheaper than scatter
+        ax.plot(x[at], y[at], "o", c=colour, alpha=1, label=label, linestyle="none")
+
+    def redecimate(ax):
+        # xlim is in matplotlib date numbers, map it back to positions in x
+        lo, hi = (
+            np.datetime64(mdates.num2date(lim).replace(tzinfo=None), "ns")
+            for lim in ax.get_xlim()
+        )
+        first = max(np.searchsorted(x, lo) - 1, 0)
+        last = min(np.searchsorted(x, hi) + 1, len(x))
+        shown = first + decimate(y[first:last], max_points // 2)
+        line.set_data(x[shown], y[shown])
+        ax.figure.canvas.draw_idle()
+
+    ax.callbacks.connect("xlim_changed", redecimate)
+
+    ax.legend(prop={"size": 30})
+
+    plt.xlabel("Time", size=16)
+    plt.ylabel("Close Price", size=16)
+    plt.title("Price with highlighted Signals", size=16)
+    plt.show()
+    return fig, ax
+
+
+def _highlight_signal_full(price: pd.Series, signal: pd.Series, interactive: bool):
+    # every point of price, slow past a few hundred thousand bars
     plot = price.copy()
     for i in [1, -1]:
         temp = signal[signal == i].index
@@ -122,3 +249,4 @@ def highlight_signal(price: pd.Series, signal: pd.Series, interactive: bool = Tr
     plt.ylabel("Close Price", size=16)
     plt.title("Price with highlighted Signals", size=16)
     plt.show()
+    return fig, ax
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 15:48:26 2026
+
+@author: Jeffrey
+"""
+
+import glob, os
+import re
+import zipfile
+
+import pandas as pd
+import numpy as np
+
+import kline_store
+import kline_pyramid
+from kline_store import KLINE_COLUMNS
+
+ZIP_PATH = r"D:\Binance Data\{dtype}\{ticker}"
+
+# column: dtype, times are int64 milliseconds
+# https://github.com/binance/binance-public-data/#trades-1
+SCHEMAS = {
+    "klines": dict(
+        {name: dtype for name, (_, dtype) in KLINE_COLUMNS.items()}, Ignore="int64"
+    ),
+    "aggTrades": {
+        "Aggregate trade id": "int64",
+        "Price": "float64",
+        "Quantity": "float64",
+        "First trade id": "int64",
+        "Last trade id": "int64",
+        "Time": "int64",
+        "Is buyer maker": "bool",
+        "Is best match": "bool",
+    },
+    "trades": {
+        "Trade id": "int64",
+        "Price": "float64",
+        "Quantity": "float64",
+        "Quote quantity": "float64",
+        "Time": "int64",
+        "Is buyer maker": "bool",
+        "Is best match": "bool",
+    },
+}
+
+
+#################### Streaming ####################
+def iter_zip(
+    path: str, dtype: str = "klines", chunksize: int = 1_000_000, columns: list = None
+):
+    """
+    Yield typed pd.DataFrame chunks of at most chunksize rows from one binance zip
+    The csv is decompressed as a stream, nothing is extracted to disk and memory
+    is bounded by chunksize
+    columns: subset of SCHEMAS[dtype] to parse, default all but "Ignore"
+    """
+    schema = SCHEMAS[dtype]
+    if columns is None:
+        columns = [c for c in schema if c != "Ignore"]
+
+    with zipfile.ZipFile(path, "r") as zip_ref:
+        with zip_ref.open(zip_ref.namelist()[0], "r") as f:
+            # some archives start with a header line
+            header = not f.peek(1)[:1].isdigit()
+            for chunk in pd.read_csv(
+                f,
+                names=list(schema),
+                usecols=columns,
+                dtype={c: schema[c] for c in columns},
+                skiprows=1 if header else 0,
+                chunksize=chunksize,
+            ):
+                yield kline_store.normalise_time_unit(_normalise_trade_time(chunk))
+
+
+def _normalise_trade_time(df: pd.DataFrame) -> pd.DataFrame:
+    # spot trades from 2025 onwards are in microseconds
+    if "Time" in df and len(df) and df["Time"].iat[0] > 10**14:
+        df["Time"] //= 1000
+    return df
+
+
+def _date(path: str) -> str:
+    # daily {...}-yyyy-mm-dd.zip or monthly {...}-yyyy-mm.zip
+    date = re.search(r"(\d{4}-\d{2}(-\d{2})?)\.zip$", path)
+    return date.group(1) if date else ""
+
+
+def zip_files(
+    ticker: str,
+    dtype: str = "klines",
+    interval: str = "1m",
+    start: str = None,
+    end: str = None,
+    path: str = None,
+) -> list:
+    """
+    Downloaded zips of ticker sorted by date, restricted to [start, end] (yyyy-mm-dd)
+    """
+    if path is None:
+        path = ZIP_PATH.format(dtype=dtype, ticker=ticker)
+    name = f"{ticker}-{interval}-" if dtype == "klines" else f"{ticker}-{dtype}-"
+    files = sorted(
+        glob.glob(os.path.join(path, f"{name}*.zip")), key=lambda f: _date(f)
+    )
+    if start is not None:
+        # a monthly file yyyy-mm sorts before yyyy-mm-dd, compare on its month
+        files = [f for f in files if _date(f) >= start[: len(_date(f))]]
+    if end is not None:
+        files = [f for f in files if _date(f)[: len(end)] <= end]
+    return files
+
+
+def iter_chunks(
+    ticker: str,
+    dtype: str = "klines",
+    interval: str = "1m",
+    start: str = None,
+    end: str = None,
+    chunksize: int = 1_000_000,
+    columns: list = None,
+    path: str = None,
+):
+    """
+    Yield typed chunks of every downloaded zip of ticker in date order
+    """
+    for f in zip_files(ticker, dtype, interval, start, end, path):
+        yield from iter_zip(f, dtype, chunksize, columns)
+
+
+#################### Consumers ####################
+def read_klines(
+    ticker: str,
+    start=None,
+    end=None,
+    columns: list = None,
+    interval: str = "1m",
+    path: str = None,
+) -> pd.DataFrame:
+    """
+    Klines straight from the zips, in the same format as backtest_utility_functions.read()
+    """
+    if columns is None:
+        columns = [c for c in KLINE_COLUMNS if c != "Open time"]
+    day = lambda t: None if t is None else pd.Timestamp(t).strftime("%Y-%m-%d")
+    parse = list(dict.fromkeys(["Open time"] + columns))
+    chunks = list(
+        iter_chunks(
+            ticker, "klines", interval, day(start), day(end), columns=parse, path=path
+        )
+    )
+    arrays = {
+        KLINE_COLUMNS[c][0]: (
+            np.concatenate([chunk[c].to_numpy() for chunk in chunks])
+            if chunks
+            else np.empty(0, KLINE_COLUMNS[c][1])
+        )
+        for c in parse
+    }
+    df = kline_store.to_frame(arrays, columns).sort_index()
+    return df.loc[start:end]
+
+
+def trade_bars(
+    ticker: str,
+    freq: str = "1min",
+    dtype: str = "aggTrades",
+    start: str = None,
+    end: str = None,
+    chunksize: int = 1_000_000,
+    path: str = None,
+) -> pd.DataFrame:
+    """
+    OHLCV bars built from aggTrades/trades zips one chunk at a time, so a month of
+    trades never has to fit in memory. Same columns as backtest resample()
+    freq: fixed width dividing a day, ie "1s", "1min", "1h"
+    """
+    step = kline_pyramid.step_ms(freq)
+    if step is None:
+        raise ValueError(f"{freq} is not a fixed width frequency dividing a day")
+
+    parts = []
+    for chunk in iter_chunks(
+        ticker,
+        dtype,
+        start=start,
+        end=end,
+        chunksize=chunksize,
+        columns=["Price", "Quantity", "Time"],
+        path=path,
+    ):
+        price = chunk["Price"].to_numpy()
+        bars = kline_pyramid.aggregate(
+            {
+                "open_time": chunk["Time"].to_numpy(),
+                "open": price,
+                "high": price,
+                "low": price,
+                "close": price,
+                "volume": chunk["Quantity"].to_numpy(),
+            },
+            step,
+        )
+        if parts and parts[-1]["open_time"][-1] == bars["open_time"][0]:
+            # bucket split across two chunks, merge it back into one bar
+            prev = parts[-1]
+            prev["high"][-1] = max(prev["high"][-1], bars["high"][0])
+            prev["low"][-1] = min(prev["low"][-1], bars["low"][0])
+            prev["close"][-1] = bars["close"][0]
+            prev["volume"][-1] += bars["volume"][0]
+            bars = {f: arr[1:] for f, arr in bars.items()}
+        if len(bars["open_time"]):
+            parts.append(bars)
+
+    fields = ["open", "high", "low", "close", "volume"]
+    bars = {
+        f: np.concatenate([p[f] for p in parts]) if parts else np.empty(0)
+        for f in ["open_time"] + fields
+    }
+    return pd.DataFrame(
+        {f.capitalize(): bars[f] for f in fields},
+        index=pd.DatetimeIndex(
+            pd.to_datetime(bars["open_time"].astype(np.int64), unit="ms"),
+            name="Open time",
+        ),
+    )
+
+
+def to_store(ticker: str, interval: str = "1m", path: str = None):
+    """
+    Convert the downloaded kline zips into kline_store one month at a time,
+    without extracting them
+    """
+    by_month = {}
+    for f in zip_files(ticker, "klines", interval, path=path):
+        by_month.setdefault(_date(f)[:7], []).append(f)
+    for month, files in sorted(by_month.items()):
+        df = pd.concat(
+            (chunk for f in files for chunk in iter_zip(f, "klines")),
+            ignore_index=True,
+        )
+        kline_store.write(df, ticker)
+        print(f"{ticker} {month} converted")
+
+
+if __name__ == "__main__":
+    btc = read_klines("BTCUSDT", start="2023-01-01", end="2023-01-31")
+
+    btc_trades_1s = trade_bars("BTCUSDT", "1s", start="2023-01-01", end="2023-01-31")
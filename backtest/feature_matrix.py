@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 23 10:41:19 2026
+
+@author: Jeffrey
+"""
+
+import hashlib
+import json, os
+import sys
+
+import pandas as pd
+import numpy as np
+
+FEATURE_PATH = r"D:\Glassnode Data\features"
+CRYPTO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "crypto")
+
+
+#################### Inputs ####################
+def glassnode(metric: str, asset: str = "BTC", interval: str = "24h") -> pd.DataFrame:
+    """
+    Series cached by crypto/on_chain_data_downloader.fetch(), indexed by "t"
+    """
+    if CRYPTO_PATH not in sys.path:
+        sys.path.append(CRYPTO_PATH)
+    import on_chain_data_downloader
+
+    arrays = on_chain_data_downloader.read_cache(metric, asset, interval)
+    if arrays is None:
+        raise FileNotFoundError(f"{metric} {asset} {interval} has not been fetched yet")
+    return on_chain_data_downloader.to_frame(arrays)
+
+
+def _ns(index: pd.DatetimeIndex) -> np.ndarray:
+    return index.values.astype("datetime64[ns]").astype(np.int64)
+
+
+def _columns(name: str, data) -> dict:
+    """
+    {feature name: (t int64 ns sorted, float64 values)} of a pd.Series or pd.DataFrame
+    indexed by time, ie load_on_chain_data() or glassnode(). A single column frame keeps
+    name, otherwise columns are named "{name}.{column}"
+    """
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    data = data[~data.index.isna()]
+    t = _ns(data.index)
+    order = np.argsort(t, kind="stable")
+    t = t[order]
+    return {
+        name if data.shape[1] == 1 else f"{name}.{c}": (
+            t,
+            data[c].to_numpy(np.float64)[order],
+        )
+        for c in data.columns
+    }
+
+
+def step(t: np.ndarray) -> int:
+    """
+    Typical spacing of a sorted int64 ns time array, the median difference
+    """
+    if len(t) < 2:
+        return 0
+    return int(np.median(np.diff(t)))
+
+
+#################### As-of Join ####################
+def asof(t: np.ndarray, values: np.ndarray, at: np.ndarray, lag: int = 0) -> np.ndarray:
+    """
+    Last value of each point in time of at, only using points available by then
+    t: sorted int64 ns timestamps of values
+    at: int64 ns times the values are needed at
+    lag: ns between t and the value being usable, a point is available at t + lag
+    returns float32 array like at, np.nan before the first available point
+    """
+    idx = np.searchsorted(t + lag, at, "right") - 1
+    if not len(values):
+        return np.full(len(at), np.nan, dtype=np.float32)
+    out = values.astype(np.float32)[np.maximum(idx, 0)]
+    out[idx < 0] = np.nan
+    return out
+
+
+#################### Feature Matrix ####################
+def _key(
+    bar_time: np.ndarray, width: int, bar_arrays: dict, features: dict, lags: dict
+) -> str:
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(bar_time).tobytes())
+    digest.update(str(width).encode())
+    for name, arr in list(bar_arrays.items()) + [
+        (name, arr) for name, (t, arr) in features.items()
+    ]:
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(arr).tobytes())
+    for name, (t, _) in features.items():
+        digest.update(np.ascontiguousarray(t).tobytes())
+        digest.update(f"{name}:{lags[name]}".encode())
+    return digest.hexdigest()[:32]
+
+
+def build(
+    bars,
+    series: dict,
+    lags: dict = None,
+    bar_columns: list = None,
+    bar_width=None,
+    cache: bool = True,
+    path: str = FEATURE_PATH,
+) -> pd.DataFrame:
+    """
+    As of join any number of on chain series onto a bar index, as one float32 matrix
+
+    bars: read()/resample() pd.DataFrame or a pd.DatetimeIndex of bar open times
+    series: {name: pd.Series or pd.DataFrame indexed by time}, ie load_on_chain_data()
+            or glassnode(). Glassnode stamps a point with the start of its interval
+    lags: {name: publication lag} (anything pd.Timedelta accepts) between a point's
+          time stamp and the point being usable. Default the series' own spacing, so a
+          24h point stamped 00:00 is first used by a bar closing at 00:00 the next day.
+          Add the publication delay on top, ie "25h" for a daily metric out at 01:00
+    bar_columns: columns of bars to put in front of the features, ie ["Close"]
+    bar_width: bar length, default the index frequency. A bar uses the points available
+               at its close, the time vector_backtest trades its signal
+    cache: store the matrix under a hash of every input and load it back (memory
+           mapped, read only) when the same inputs come again
+
+    returns pd.DataFrame whose .to_numpy() is a C contiguous (bars, features) float32
+    matrix, no column ever sees a point before it was published
+    """
+    index = bars if isinstance(bars, pd.DatetimeIndex) else bars.index
+    bar_time = _ns(index)
+    if bar_width is None:
+        bar_width = (
+            pd.Timedelta(index.freq) if index.freq is not None else step(bar_time)
+        )
+    width = pd.Timedelta(bar_width).value
+    bar_arrays = {c: bars[c].to_numpy(np.float32) for c in (bar_columns or [])}
+
+    features = {}
+    for name, data in series.items():
+        features.update(_columns(name, data))
+    lags = dict(lags or {})
+    for name, (t, _) in features.items():
+        # a frame's lag applies to each of its columns
+        lag = lags.get(name, lags.get(name.split(".")[0]))
+        lags[name] = step(t) if lag is None else pd.Timedelta(lag).value
+
+    columns = list(bar_arrays) + list(features)
+    if cache:
+        key = _key(bar_time, width, bar_arrays, features, lags)
+        file = os.path.join(path, f"{key}.npy")
+        if os.path.exists(file) and os.path.exists(file[:-4] + ".json"):
+            matrix = np.load(file, mmap_mode="r")
+            return pd.DataFrame(matrix, index=index, columns=columns, copy=False)
+
+    matrix = np.empty((len(bar_time), len(columns)), dtype=np.float32)
+    bar_close = bar_time + width
+    for j, arr in enumerate(bar_arrays.values()):
+        matrix[:, j] = arr
+    for j, (name, (t, values)) in enumerate(features.items(), len(bar_arrays)):
+        matrix[:, j] = asof(t, values, bar_close, lags[name])
+
+    if cache:
+        os.makedirs(path, exist_ok=True)
+        tmp = file[:-4] + ".tmp.npy"
+        np.save(tmp, matrix)
+        os.replace(tmp, file)
+        with open(file[:-4] + ".json", "w") as f:
+            json.dump({"columns": columns, "lags_ns": lags, "width_ns": width}, f)
+    return pd.DataFrame(matrix, index=index, columns=columns, copy=False)
+
+
+if __name__ == "__main__":
+    import backtest_utility_functions as utility
+
+    btc_1h = utility.resample(
+        utility.read("BTCUSDT", start="2021-03-01"), "1h", symbol="BTCUSDT"
+    )
+    features = build(
+        btc_1h,
+        {
+            "active_addresses": glassnode("addresses/active_count"),
+            "sopr": glassnode("indicators/sopr"),
+            "mvrv_z": glassnode("market/mvrv_z_score"),
+        },
+        lags={"sopr": "26h"},
+        bar_columns=["Close"],
+    )
+    print(features.tail())
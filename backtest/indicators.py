@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 28 08:31:47 2026
+
+@author: Jeffrey
+"""
+
+import json, os
+from collections import deque
+
+import pandas as pd
+import numpy as np
+
+
+#################### Helpers ####################
+def _ewm(values: np.ndarray, alpha: float, prev: float = None) -> np.ndarray:
+    """
+    y[i] = y[i-1] + alpha * (x[i] - y[i-1]), seeded with prev or else the first value
+    """
+    if prev is None:
+        return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    series = pd.Series(np.concatenate([[prev], values]))
+    return series.ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def _column(bars: pd.DataFrame, name: str) -> np.ndarray:
+    # "close" of IBKR bars or "Close" of the backtest klines
+    for c in bars.columns:
+        if c.lower() == name:
+            return bars[c].to_numpy(np.float64)
+    raise KeyError(name)
+
+
+#################### Indicators ####################
+class Indicator:
+    """
+    Indicator with an O(1) update() per new bar for live bars and a vectorized batch()
+    over arrays for backtests. Both continue from the current state and leave the same
+    state behind, so batch() over the history followed by update() per bar gives the
+    values of one batch() over everything.
+
+    inputs: bar columns taken, in the order of update() / batch() arguments
+    warmup: bars before the first value, np.nan until then
+    """
+
+    inputs = ("close",)
+    _state = ("count",)  # attributes saved by state()
+
+    def __init__(self, period: int):
+        self.period = period
+        self.warmup = period
+        self.count = 0  # bars seen
+
+    @property
+    def params(self) -> dict:
+        return {"period": self.period}
+
+    def _warmup(self, out: np.ndarray, start: int) -> np.ndarray:
+        # np.nan for bars start, start+1, ... that are before the first value
+        out[: max(self.warmup - 1 - start, 0)] = np.nan
+        return out
+
+    def state(self) -> dict:
+        return {k: getattr(self, k) for k in self._state}
+
+    def load(self, state: dict):
+        for k in self._state:
+            setattr(self, k, state[k])
+
+
+class EMA(Indicator):
+    """
+    Exponential moving average, alpha = 2 / (period + 1), seeded with the first value
+    """
+
+    _state = ("count", "value")
+
+    def __init__(self, period: int):
+        super().__init__(period)
+        self.value = None
+
+    def update(self, close: float) -> float:
+        alpha = 2 / (self.period + 1)
+        self.value = (
+            close if self.value is None else self.value + alpha * (close - self.value)
+        )
+        self.count += 1
+        return self.value if self.count >= self.warmup else np.nan
+
+    def batch(self, close: np.ndarray) -> np.ndarray:
+        if not len(close):
+            return np.empty(0)
+        out = _ewm(close, 2 / (self.period + 1), self.value)
+        start, self.count = self.count, self.count + len(close)
+        self.value = float(out[-1])
+        return self._warmup(out, start)
+
+
+class RollingMean(Indicator):
+    """
+    Mean and sample standard deviation (ddof 1, like pd.rolling().std()) of the last
+    period values, updated in O(1) by adding the new value and removing the oldest
+    """
+
+    _state = ("count", "mean", "m2")
+
+    def __init__(self, period: int):
+        super().__init__(period)
+        self.window = deque(maxlen=period)  # last period values, oldest first
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from mean
+
+    def state(self) -> dict:
+        return {**super().state(), "window": list(self.window)}
+
+    def load(self, state: dict):
+        super().load(state)
+        self.window = deque(state["window"], maxlen=self.period)
+
+    def _push(self, x: float):
+        window = self.window
+        if len(window) < self.period:
+            # Welford's update while the window fills
+            window.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(window)
+            self.m2 += delta * (x - self.mean)
+        else:
+            old = window[0]
+            window.append(x)
+            mean = self.mean + (x - old) / self.period
+            self.m2 += (x - old) * (x - mean + old - self.mean)
+            self.mean = mean
+        self.count += 1
+
+    @property
+    def std(self) -> float:
+        if len(self.window) < max(self.warmup, 2):
+            return np.nan
+        return float(np.sqrt(max(self.m2, 0.0) / (self.period - 1)))
+
+    def update(self, close: float) -> float:
+        self._push(close)
+        return self.mean if self.count >= self.warmup else np.nan
+
+    def _rolling(self, close: np.ndarray):
+        # pd.rolling over the kept window followed by close
+        if not len(close):
+            return np.empty(0), np.empty(0), self.count
+        series = pd.Series(np.concatenate([self.window, close])).rolling(self.period)
+        skip = len(self.window)
+        mean = series.mean().to_numpy()[skip:]
+        std = series.std().to_numpy()[skip:]
+        # exact state from the new window rather than sliding through every value
+        start = self.count
+        self.window.extend(close[-self.period :].tolist())
+        window = np.array(self.window)
+        self.mean = float(window.mean())
+        self.m2 = float(((window - self.mean) ** 2).sum())
+        self.count = start + len(close)
+        return mean, std, start
+
+    def batch(self, close: np.ndarray) -> np.ndarray:
+        mean, _, start = self._rolling(close)
+        return self._warmup(mean, start)
+
+
+class RollingStd(RollingMean):
+    def update(self, close: float) -> float:
+        self._push(close)
+        return self.std
+
+    def batch(self, close: np.ndarray) -> np.ndarray:
+        _, std, start = self._rolling(close)
+        return self._warmup(std, start)
+
+
+class ZScore(RollingMean):
+    """
+    (close - rolling mean) / rolling std of the last period closes
+    """
+
+    def update(self, close: float) -> float:
+        self._push(close)
+        return (close - self.mean) / self.std if self.std else np.nan
+
+    def batch(self, close: np.ndarray) -> np.ndarray:
+        mean, std, start = self._rolling(close)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (close - mean) / std
+        z[std == 0] = np.nan
+        return self._warmup(z, start)
+
+
+class RSI(Indicator):
+    """
+    Relative strength index, Wilder smoothing (alpha = 1 / period) of gains and losses
+    seeded with the first change, first value after period changes
+    """
+
+    _state = ("count", "prev", "gain", "loss")
+
+    def __init__(self, period: int = 14):
+        super().__init__(period)
+        self.warmup = period + 1
+        self.prev = None
+        self.gain = None
+        self.loss = None
+
+    def _rsi(self, gain, loss):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(loss == 0, 100.0, 100 - 100 / (1 + np.divide(gain, loss)))
+
+    def update(self, close: float) -> float:
+        self.count += 1
+        if self.prev is None:
+            self.prev = close
+            return np.nan
+        change, self.prev = close - self.prev, close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        alpha = 1 / self.period
+        if self.gain is None:
+            self.gain, self.loss = gain, loss
+        else:
+            self.gain += alpha * (gain - self.gain)
+            self.loss += alpha * (loss - self.loss)
+        if self.count < self.warmup:
+            return np.nan
+        return float(self._rsi(self.gain, self.loss))
+
+    def batch(self, close: np.ndarray) -> np.ndarray:
+        if not len(close):
+            return np.empty(0)
+        start = self.count
+        prev = close[0] if self.prev is None else self.prev
+        change = np.diff(close, prepend=prev)
+        skip = 1 if self.prev is None else 0  # the first close has no change
+        alpha = 1 / self.period
+        gain = _ewm(np.maximum(change[skip:], 0.0), alpha, self.gain)
+        loss = _ewm(np.maximum(-change[skip:], 0.0), alpha, self.loss)
+        out = np.full(len(close), np.nan)
+        if len(gain):
+            out[skip:] = self._rsi(gain, loss)
+            self.gain, self.loss = float(gain[-1]), float(loss[-1])
+        self.prev = float(close[-1])
+        self.count += len(close)
+        return self._warmup(out, start)
+
+
+class ATR(Indicator):
+    """
+    Average true range, Wilder smoothing (alpha = 1 / period) of the true range, the
+    first bar's range being high - low
+    """
+
+    inputs = ("high", "low", "close")
+    _state = ("count", "prev", "value")
+
+    def __init__(self, period: int = 14):
+        super().__init__(period)
+        self.prev = None  # previous close
+        self.value = None
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr = high - low
+        if self.prev is not None:
+            tr = max(tr, abs(high - self.prev), abs(low - self.prev))
+        self.prev = close
+        alpha = 1 / self.period
+        self.value = (
+            tr if self.value is None else self.value + alpha * (tr - self.value)
+        )
+        self.count += 1
+        return self.value if self.count >= self.warmup else np.nan
+
+    def batch(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+        if not len(close):
+            return np.empty(0)
+        prev = np.concatenate(
+            [[np.nan if self.prev is None else self.prev], close[:-1]]
+        )
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+        out = _ewm(tr, 1 / self.period, self.value)
+        start, self.count = self.count, self.count + len(close)
+        self.prev, self.value = float(close[-1]), float(out[-1])
+        return self._warmup(out, start)
+
+
+#################### Indicator Set ####################
+class IndicatorSet:
+    """
+    Named indicators over one bar series, run in batch over a backtest frame or bar by
+    bar over live bars, with a checkpoint of every state so a restart only processes
+    the bars after the last one seen
+
+    indicators: {name: Indicator}, ie {"ema_200": EMA(200), "rsi": RSI(14)}
+
+    engine = IndicatorSet({"ema_200": EMA(200), "z_20": ZScore(20)})
+    engine.load(path)                     # no-op the first time
+    values = engine.update_bars(bars)     # only bars after the checkpoint
+    engine.save(path)
+    """
+
+    def __init__(self, indicators: dict):
+        self.indicators = indicators
+        self.last_time = None  # pd.Timestamp of the last bar processed
+        self.last = {}  # {name: latest value}
+
+    def batch(self, bars: pd.DataFrame) -> pd.DataFrame:
+        """
+        Every indicator over every bar (vectorized), continuing from the current state
+        returns pd.DataFrame of bars.index, one column per indicator
+        """
+        columns = {}
+        for name, indicator in self.indicators.items():
+            inputs = [_column(bars, c) for c in indicator.inputs]
+            columns[name] = indicator.batch(*inputs)
+        frame = pd.DataFrame(columns, index=bars.index)
+        if len(frame):
+            self.last_time = bars.index[-1]
+            self.last = frame.iloc[-1].to_dict()
+        return frame
+
+    def update(self, time, bar: dict) -> dict:
+        """
+        One new bar, {column: value} with the inputs of every indicator
+        returns {name: value}
+        """
+        bar = {k.lower(): v for k, v in bar.items()}
+        self.last = {
+            name: indicator.update(*(bar[c] for c in indicator.inputs))
+            for name, indicator in self.indicators.items()
+        }
+        self.last_time = pd.Timestamp(time)
+        return self.last
+
+    def update_bars(self, bars: pd.DataFrame) -> pd.DataFrame:
+        """
+        Process only the bars after the last one seen, ie a fresh kline download after
+        load(), one update() per bar for a few bars and batch() for more
+        """
+        if self.last_time is not None:
+            bars = bars[bars.index > self.last_time]
+        if len(bars) > 16:
+            return self.batch(bars)
+        rows = [
+            self.update(t, bar) for t, bar in zip(bars.index, bars.to_dict("records"))
+        ]
+        return pd.DataFrame(rows, index=bars.index, columns=list(self.indicators))
+
+    #################### Checkpoint ####################
+    def state(self) -> dict:
+        return {
+            "last_time": None if self.last_time is None else self.last_time.isoformat(),
+            "last": self.last,
+            "indicators": {
+                name: {
+                    "type": type(indicator).__name__,
+                    "params": indicator.params,
+                    "state": indicator.state(),
+                }
+                for name, indicator in self.indicators.items()
+            },
+        }
+
+    def save(self, path: str):
+        """
+        Checkpoint every state as json, through a temporary file
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.state(), f, default=float)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path: str) -> bool:
+        """
+        Restore the states saved by save(), only when the indicators are the same
+        returns False (states untouched) if there is no such checkpoint
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            saved = json.load(f)
+        indicators = saved["indicators"]
+        if {
+            name: (type(indicator).__name__, indicator.params)
+            for name, indicator in self.indicators.items()
+        } != {name: (s["type"], s["params"]) for name, s in indicators.items()}:
+            return False
+        for name, indicator in self.indicators.items():
+            indicator.load(indicators[name]["state"])
+        self.last_time = saved["last_time"] and pd.Timestamp(saved["last_time"])
+        self.last = saved["last"]
+        return True
+
+
+if __name__ == "__main__":
+    import backtest_utility_functions as utility
+
+    btc_1d = utility.resample(
+        utility.read("BTCUSDT", start="2021-03-01"), "1d", symbol="BTCUSDT"
+    )
+    engine = IndicatorSet(
+        {"ema_50": EMA(50), "rsi": RSI(14), "atr": ATR(14), "z_20": ZScore(20)}
+    )
+    history = engine.batch(btc_1d.iloc[:-1])
+    engine.save(r"D:\Binance Data\indicators\BTCUSDT_1d.json")
+
+    # next day: restore and process the new bar only
+    engine = IndicatorSet(
+        {"ema_50": EMA(50), "rsi": RSI(14), "atr": ATR(14), "z_20": ZScore(20)}
+    )
+    engine.load(r"D:\Binance Data\indicators\BTCUSDT_1d.json")
+    print(engine.update_bars(btc_1d))
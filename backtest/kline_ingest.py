@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:40:05 2026
+
+@author: Jeffrey
+"""
+
+import glob, os
+import hashlib
+import json
+
+import numpy as np
+
+import kline_store
+import kline_mmap
+import kline_pyramid
+from kline_store import KLINE_COLUMNS, STORE_PATH, UNZIPPED_PATH
+
+# {root}/{symbol}/manifest.json
+# {
+#     "last_open_time": int ms of the last consolidated row,
+#     "files": {file name: {"sha256", "rows", "first_open_time", "last_open_time"}}
+# }
+
+
+def _manifest_path(symbol: str, root: str = STORE_PATH) -> str:
+    return os.path.join(root, symbol.upper(), "manifest.json")
+
+
+def read_manifest(symbol: str, root: str = STORE_PATH) -> dict:
+    """
+    Manifest of the files ingested for symbol, None if nothing was ingested yet
+    """
+    path = _manifest_path(symbol, root)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_manifest(symbol: str, manifest: dict, root: str = STORE_PATH):
+    path = _manifest_path(symbol, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def new_files(symbol: str, unzipped_path: str = None, root: str = STORE_PATH) -> list:
+    """
+    Sorted csv files in unzipped_path that are not in the manifest yet
+    Only file names are compared, files already ingested are never opened
+    """
+    if unzipped_path is None:
+        unzipped_path = UNZIPPED_PATH.format(ticker=symbol)
+    manifest = read_manifest(symbol, root) or {"files": {}}
+    return sorted(
+        f
+        for f in glob.glob(os.path.join(unzipped_path, "*.csv"))
+        if os.path.basename(f) not in manifest["files"]
+    )
+
+
+def ingest(symbol: str, unzipped_path: str = None, root: str = STORE_PATH) -> int:
+    """
+    Append the daily files downloaded since the last ingest to the consolidated data
+    Each new file is parsed once, appended to the memory mapped layout and merged into
+    its kline_store month, then recorded in the manifest with its checksum and last
+    open time. The cost is proportional to the new files, not the whole history.
+    The resolution pyramid (kline_pyramid) is brought up to date when it exists.
+
+    Rows at or before the last consolidated open time (a back filled day) cannot be
+    appended, they are reported and skipped. Use kline_store.convert and
+    kline_mmap.build to rebuild in that case.
+
+    returns number of rows appended
+    """
+    manifest = read_manifest(symbol, root)
+    if manifest is None:
+        # first ingest starts from whatever has been converted already
+        if kline_mmap.read_meta(symbol, root) is None:
+            kline_mmap.build(symbol, root)
+        open_time = kline_mmap.open_arrays(symbol, ["open_time"], root)["open_time"]
+        manifest = {
+            "last_open_time": int(open_time[-1]) if len(open_time) else -1,
+            "files": {},
+        }
+
+    appended = 0
+    for f in new_files(symbol, unzipped_path, root):
+        df = kline_store.read_kline_csv(f)
+        arrays = {
+            file: df[name].to_numpy(dtype)
+            for name, (file, dtype) in KLINE_COLUMNS.items()
+        }
+        order = np.argsort(arrays["open_time"], kind="stable")
+        arrays = {file: arr[order] for file, arr in arrays.items()}
+
+        new = arrays["open_time"] > manifest["last_open_time"]
+        if not new.all():
+            print(
+                f"{os.path.basename(f)}: {(~new).sum()} rows already consolidated "
+                "or back filled, skipped"
+            )
+        tail = {file: arr[new] for file, arr in arrays.items()}
+
+        if len(tail["open_time"]):
+            kline_mmap.append(symbol, tail, root)
+            kline_store.write(df.iloc[order[new]], symbol, root)
+            manifest["last_open_time"] = int(tail["open_time"][-1])
+            appended += len(tail["open_time"])
+
+        manifest["files"][os.path.basename(f)] = {
+            "sha256": sha256(f),
+            "rows": len(df),
+            "first_open_time": int(arrays["open_time"][0]) if len(df) else None,
+            "last_open_time": int(arrays["open_time"][-1]) if len(df) else None,
+        }
+        # recorded after the data is committed, a crash before this re-ingests the
+        # file: kline_mmap.append skips the rows it already committed and
+        # kline_store.write overwrites the rows it already holds
+        _write_manifest(symbol, manifest, root)
+
+    if appended and kline_pyramid.read_meta(symbol, "1d", root) is not None:
+        kline_pyramid.update(symbol, root)
+    return appended
+
+
+def verify(symbol: str, unzipped_path: str = None, root: str = STORE_PATH) -> list:
+    """
+    Names of ingested files whose checksum no longer matches the manifest
+    (ie a day re-downloaded with corrected data). This reads every file.
+    """
+    if unzipped_path is None:
+        unzipped_path = UNZIPPED_PATH.format(ticker=symbol)
+    manifest = read_manifest(symbol, root) or {"files": {}}
+    changed = []
+    for name, record in manifest["files"].items():
+        path = os.path.join(unzipped_path, name)
+        if os.path.exists(path) and sha256(path) != record["sha256"]:
+            changed.append(name)
+    return changed
+
+
+if __name__ == "__main__":
+    print(f"{ingest('BTCUSDT')} rows appended")
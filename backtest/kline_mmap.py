@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:02:17 2026
+
+@author: Jeffrey
+"""
+
+import json, os
+
+import pandas as pd
+import numpy as np
+
+import kline_store
+from kline_store import KLINE_COLUMNS, KLINE_COLUMNS_BY_FILE, STORE_PATH
+
+# One fixed width little endian binary file per field, the whole history of a
+# symbol contiguous in each file: {root}/{symbol}/_mmap/{field}.bin
+# meta.json holds the number of committed rows, bytes past it are ignored
+MMAP_DIR = "_mmap"
+
+
+def _mmap_path(symbol: str, root: str = STORE_PATH) -> str:
+    return os.path.join(root, symbol.upper(), MMAP_DIR)
+
+
+def _dtype(field: str) -> np.dtype:
+    return np.dtype(KLINE_COLUMNS_BY_FILE[field]).newbyteorder("<")
+
+
+def read_meta(symbol: str, root: str = STORE_PATH) -> dict:
+    """
+    meta.json of the memory mapped layout, None if it has not been built
+    """
+    path = os.path.join(_mmap_path(symbol, root), "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_meta(symbol: str, meta: dict, root: str = STORE_PATH):
+    path = os.path.join(_mmap_path(symbol, root), "meta.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+#################### Building ####################
+def build(symbol: str, root: str = STORE_PATH):
+    """
+    Lay the kline_store partitions of symbol out as one contiguous array per field
+    Partitions are streamed one month at a time, memory use is one month of data
+    """
+    path = _mmap_path(symbol, root)
+    os.makedirs(path, exist_ok=True)
+    fields = list(KLINE_COLUMNS_BY_FILE)
+
+    handles = {f: open(os.path.join(path, f"{f}.bin.tmp"), "wb") for f in fields}
+    rows = 0
+    try:
+        for month in kline_store.partitions(symbol, root):
+            arrays = kline_store._read_partition(symbol, month, fields, root)
+            for f in fields:
+                handles[f].write(arrays[f].astype(_dtype(f), copy=False).tobytes())
+            rows += len(arrays["open_time"])
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    for f in fields:
+        os.replace(os.path.join(path, f"{f}.bin.tmp"), os.path.join(path, f"{f}.bin"))
+    write_meta(
+        symbol,
+        {"rows": rows, "dtypes": {f: _dtype(f).str for f in fields}},
+        root,
+    )
+
+
+def append(symbol: str, arrays: dict, root: str = STORE_PATH) -> int:
+    """
+    Append rows to the end of every field file and commit them in meta.json
+    arrays: {field: np.ndarray} for every field, sorted by open_time. Rows at or before
+            the last committed one are skipped, so appending the same rows again (a
+            crash before the caller recorded them) is a no op. Returns the new number
+            of rows
+
+    Anything past the committed row count (left by a crash mid append) is truncated first
+    """
+    meta = read_meta(symbol, root)
+    if meta is None:
+        build(symbol, root)
+        meta = read_meta(symbol, root)
+
+    path = _mmap_path(symbol, root)
+    if meta["rows"]:
+        dtype = np.dtype(meta["dtypes"]["open_time"])
+        last = np.fromfile(
+            os.path.join(path, "open_time.bin"),
+            dtype=dtype,
+            count=1,
+            offset=(meta["rows"] - 1) * dtype.itemsize,
+        )[0]
+        new = np.asarray(arrays["open_time"]) > last
+        if not new.all():
+            arrays = {f: np.asarray(arr)[new] for f, arr in arrays.items()}
+    if not len(arrays["open_time"]):
+        return meta["rows"]
+
+    for f, dtype in meta["dtypes"].items():
+        file = os.path.join(path, f"{f}.bin")
+        with open(file, "r+b") as handle:
+            handle.truncate(meta["rows"] * np.dtype(dtype).itemsize)
+            handle.seek(0, os.SEEK_END)
+            handle.write(np.asarray(arrays[f], dtype=dtype).tobytes())
+
+    meta["rows"] += len(arrays["open_time"])
+    write_meta(symbol, meta, root)
+    return meta["rows"]
+
+
+#################### Reading ####################
+def open_arrays(symbol: str, fields: list = None, root: str = STORE_PATH) -> dict:
+    """
+    Read only memory maps of the fields of symbol, {field: np.memmap}
+    The pages live in the OS page cache and are shared by every process mapping them
+    """
+    meta = read_meta(symbol, root)
+    if meta is None:
+        raise FileNotFoundError(f"{symbol} has no memory mapped layout, run build()")
+    if fields is None:
+        fields = list(meta["dtypes"])
+
+    arrays = {}
+    for f in fields:
+        if meta["rows"] == 0:  # np.memmap cannot map an empty file
+            arrays[f] = np.empty(0, meta["dtypes"][f])
+            continue
+        arrays[f] = np.memmap(
+            os.path.join(_mmap_path(symbol, root), f"{f}.bin"),
+            dtype=meta["dtypes"][f],
+            mode="r",
+            shape=(meta["rows"],),
+        )
+    return arrays
+
+
+def read_arrays(
+    ticker: str, start=None, end=None, fields: list = None, root: str = STORE_PATH
+) -> dict:
+    """
+    {field: np.ndarray} views of the memory maps restricted to [start, end], no copy
+    fields: file names of KLINE_COLUMNS, ie "open_time", "close"
+    start, end: inclusive, as kline_store.bounds()
+    """
+    if fields is None:
+        fields = list(KLINE_COLUMNS_BY_FILE)
+    arrays = open_arrays(ticker, list(dict.fromkeys(["open_time"] + fields)), root)
+
+    open_time = arrays["open_time"]
+    lo, hi = kline_store.bounds(start, end)
+    i = 0
+    j = len(open_time)
+    if lo is not None:
+        i = np.searchsorted(open_time, lo, "left")
+    if hi is not None:
+        j = np.searchsorted(open_time, hi, "right")
+    return {f: arrays[f][i:j] for f in fields}
+
+
+def read(
+    ticker: str,
+    start=None,
+    end=None,
+    columns: list = None,
+    root: str = STORE_PATH,
+) -> pd.DataFrame:
+    """
+    Same frame as kline_store.read(), but every column is a view over the memory map
+    Times are datetime64[ms] views of the int64 milliseconds, so nothing is copied.
+    The frame is read only, copy it before modifying in place.
+    """
+    if columns is None:
+        columns = [c for c in KLINE_COLUMNS if c != "Open time"]
+    columns = [c for c in columns if c != "Open time"]
+    unknown = set(columns) - set(KLINE_COLUMNS)
+    if unknown:
+        raise KeyError(f"Unknown columns: {sorted(unknown)}")
+
+    fields = ["open_time"] + [KLINE_COLUMNS[c][0] for c in columns]
+    arrays = read_arrays(ticker, start, end, fields, root)
+
+    data = {}
+    for name in columns:
+        arr = arrays[KLINE_COLUMNS[name][0]]
+        data[name] = arr.view("datetime64[ms]") if name == "Close time" else arr
+    index = pd.DatetimeIndex(
+        arrays["open_time"].view("datetime64[ms]"), name="Open time", copy=False
+    )
+    # copy=False keeps one block per column instead of consolidating into a 2-D copy
+    return pd.DataFrame(data, index=index, columns=columns, copy=False)
+
+
+if __name__ == "__main__":
+    build("BTCUSDT")
+
+    btc = read("BTCUSDT", columns=["Close", "Volume"])
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:21:48 2026
+
+@author: Jeffrey
+"""
+
+import json, os
+
+import pandas as pd
+import numpy as np
+
+import kline_mmap
+from kline_store import STORE_PATH
+
+# Standard resolutions, each level is aggregated from the one before it
+# 1m is the base itself, served by kline_mmap
+LEVELS = {
+    "1m": 60_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "1h": 3_600_000,
+    "4h": 14_400_000,
+    "1d": 86_400_000,
+}
+LEVEL_BY_STEP = {step: level for level, step in LEVELS.items()}
+
+FIRST_FIELDS = ["open"]
+MAX_FIELDS = ["high"]
+MIN_FIELDS = ["low"]
+LAST_FIELDS = ["close"]
+SUM_FIELDS = [
+    "volume",
+    "quote_volume",
+    "trades",
+    "taker_base_volume",
+    "taker_quote_volume",
+]
+FIELDS = (
+    ["open_time"] + FIRST_FIELDS + MAX_FIELDS + MIN_FIELDS + LAST_FIELDS + SUM_FIELDS
+)
+
+PYRAMID_DIR = "_pyramid"
+
+
+#################### Aggregation ####################
+def aggregate(arrays: dict, step: int) -> dict:
+    """
+    One pass OHLCV aggregation of sorted bars into step millisecond buckets
+    arrays: {field: np.ndarray} with "open_time" in int64 ms, any of FIELDS
+    Buckets are aligned to the epoch (1d buckets start at 00:00 UTC like binance)
+    Empty buckets are not emitted
+    """
+    open_time = np.asarray(arrays["open_time"])
+    if len(open_time) == 0:
+        return {f: np.asarray(arr)[:0] for f, arr in arrays.items()}
+
+    bucket = open_time // step * step
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(bucket)] - 1
+
+    out = {"open_time": bucket[starts]}
+    for f, arr in arrays.items():
+        if f in FIRST_FIELDS:
+            out[f] = arr[starts]
+        elif f in LAST_FIELDS:
+            out[f] = arr[ends]
+        elif f in MAX_FIELDS:
+            out[f] = np.maximum.reduceat(arr, starts)
+        elif f in MIN_FIELDS:
+            out[f] = np.minimum.reduceat(arr, starts)
+        elif f in SUM_FIELDS:
+            out[f] = np.add.reduceat(arr, starts)
+    return out
+
+
+def step_ms(freq: str) -> int:
+    """
+    Width in ms of a fixed pandas frequency that divides a day ("5min", "1h", "4h", "1d")
+    None if the frequency is not fixed width (ie "M") or does not tile a day
+    """
+    try:
+        step = pd.Timedelta(freq).value // 10**6
+    except ValueError:
+        return None
+    if step <= 0 or LEVELS["1d"] % step != 0:
+        return None
+    return step
+
+
+#################### Storage ####################
+def _level_path(symbol: str, level: str, root: str = STORE_PATH) -> str:
+    return os.path.join(root, symbol.upper(), PYRAMID_DIR, level)
+
+
+def read_meta(symbol: str, level: str, root: str = STORE_PATH) -> dict:
+    path = os.path.join(_level_path(symbol, level, root), "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write(symbol: str, level: str, arrays: dict, keep: int, root: str = STORE_PATH):
+    """
+    Truncate the level to its first keep rows and append arrays after them
+    """
+    path = _level_path(symbol, level, root)
+    os.makedirs(path, exist_ok=True)
+    for f in FIELDS:
+        arr = np.asarray(arrays[f])
+        arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+        with open(os.path.join(path, f"{f}.bin"), "ab+") as handle:
+            handle.truncate(keep * arr.dtype.itemsize)
+            handle.write(arr.tobytes())
+
+    meta = {
+        "rows": keep + len(arrays["open_time"]),
+        "dtypes": {
+            f: np.asarray(arrays[f]).dtype.newbyteorder("<").str for f in FIELDS
+        },
+    }
+    with open(os.path.join(path, "meta.json.tmp"), "w") as f:
+        json.dump(meta, f, indent=4)
+    os.replace(os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json"))
+
+
+def _open(symbol: str, level: str, root: str = STORE_PATH) -> dict:
+    """
+    {field: read only memory map} of a level, the 1m base comes from kline_mmap
+    """
+    if level == "1m":
+        return kline_mmap.open_arrays(symbol, FIELDS, root)
+    meta = read_meta(symbol, level, root)
+    if meta is None:
+        raise FileNotFoundError(f"{symbol} has no {level} level, run build()")
+    path = _level_path(symbol, level, root)
+    return {
+        f: (
+            np.memmap(
+                os.path.join(path, f"{f}.bin"),
+                dtype=dtype,
+                mode="r",
+                shape=(meta["rows"],),
+            )
+            if meta["rows"]
+            else np.empty(0, dtype)
+        )
+        for f, dtype in meta["dtypes"].items()
+    }
+
+
+#################### Building ####################
+def build(symbol: str, root: str = STORE_PATH):
+    """
+    Build every level from the 1m memory mapped base, each from the level below
+    """
+    levels = list(LEVELS)
+    for lower, level in zip(levels, levels[1:]):
+        _write(
+            symbol, level, aggregate(_open(symbol, lower, root), LEVELS[level]), 0, root
+        )
+
+
+def update(symbol: str, root: str = STORE_PATH):
+    """
+    Bring every level up to date with new 1m bars
+    The last bar of a level may have been partial, so it is dropped and everything from
+    its bucket onwards is re-aggregated from the level below. Cost is proportional to the
+    new minutes, not the history.
+    """
+    levels = list(LEVELS)
+    for lower, level in zip(levels, levels[1:]):
+        meta = read_meta(symbol, level, root)
+        if meta is None:
+            build(symbol, root)
+            return
+
+        keep = max(meta["rows"] - 1, 0)
+        i = 0
+        if keep:
+            last_bucket = _open(symbol, level, root)["open_time"][keep]
+            below = _open(symbol, lower, root)
+            i = np.searchsorted(below["open_time"], last_bucket, "left")
+        else:
+            below = _open(symbol, lower, root)
+        tail = {f: arr[i:] for f, arr in below.items()}
+        _write(symbol, level, aggregate(tail, LEVELS[level]), keep, root)
+
+
+#################### Reading ####################
+def read_arrays(symbol: str, level: str, root: str = STORE_PATH) -> dict:
+    """
+    {field: np.ndarray} read only views of a whole level
+    """
+    return _open(symbol, level, root)
+
+
+def resample(DF: pd.DataFrame, freq: str, symbol: str = None, root: str = STORE_PATH):
+    """
+    OHLCV bars of DF at freq, in the format of backtest_utility_functions.resample()
+    DF: klines indexed by "Open time" with Open, High, Low, Close, Volume
+    symbol: when the symbol has a pyramid level at freq, every bucket strictly inside DF
+            is looked up from disk and only the two edge buckets (which DF may only
+            partly cover) and anything newer than the pyramid are aggregated from DF
+
+    returns None when freq is not a fixed width dividing a day, DF is in another time
+    zone than UTC or holds NaN (skipped by pandas, spread by aggregate), DF.resample
+    is then the way
+    """
+    step = step_ms(freq)
+    tz = DF.index.tz
+    if step is None or (tz is not None and str(tz) != "UTC"):
+        return None
+
+    columns = ["Open", "High", "Low", "Close", "Volume"]
+    fields = ["open", "high", "low", "close", "volume"]
+    if DF[columns].isna().to_numpy().any():
+        return None
+    if not DF.index.is_monotonic_increasing:
+        DF = DF.sort_index(kind="stable")
+    time = DF.index.values.astype("datetime64[ms]").astype(np.int64)
+    rows = {"open_time": time}
+    rows.update({f: DF[c].to_numpy() for f, c in zip(fields, columns)})
+
+    level = LEVEL_BY_STEP.get(step)
+    if (
+        len(time)
+        and symbol is not None
+        and level is not None
+        and level != "1m"
+        and read_meta(symbol, level, root) is not None
+    ):
+        pyramid = _open(symbol, level, root)
+        first_bucket = time[0] // step * step
+        last_bucket = time[-1] // step * step
+        i = np.searchsorted(pyramid["open_time"], first_bucket, "right")
+        j = np.searchsorted(pyramid["open_time"], last_bucket, "left")
+        covered = pyramid["open_time"][j - 1] if j > i else first_bucket
+
+        head = np.searchsorted(time, first_bucket + step, "left")
+        tail = np.searchsorted(time, max(covered, first_bucket) + step, "left")
+        parts = [
+            aggregate({f: arr[:head] for f, arr in rows.items()}, step),
+            {f: pyramid[f][i:j] for f in rows},
+            aggregate({f: arr[tail:] for f, arr in rows.items()}, step),
+        ]
+        bars = {f: np.concatenate([p[f] for p in parts]) for f in rows}
+    else:
+        bars = aggregate(rows, step)
+
+    df = pd.DataFrame(
+        {c: bars[f] for f, c in zip(fields, columns)},
+        index=pd.DatetimeIndex(
+            pd.to_datetime(bars["open_time"], unit="ms"), name=DF.index.name
+        ),
+    )
+    if len(df):
+        # empty buckets as pandas resample gives them: NaN prices, 0 volume
+        df = df.reindex(
+            pd.date_range(
+                df.index[0],
+                df.index[-1],
+                freq=pd.Timedelta(milliseconds=step),
+                name=df.index.name,
+            )
+        )
+        df["Volume"] = df["Volume"].fillna(0)
+    if tz is not None:
+        df.index = df.index.tz_localize(tz)
+    return df
+
+
+if __name__ == "__main__":
+    build("BTCUSDT")
+
+    btc_1h = read_arrays("BTCUSDT", "1h")
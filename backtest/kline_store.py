@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:12:40 2026
+
+@author: Jeffrey
+"""
+
+import glob, os
+import re
+
+import pandas as pd
+import numpy as np
+
+STORE_PATH = r"D:\Binance Data\store"
+UNZIPPED_PATH = r"D:\Binance Data\klines\{ticker} - Unzipped"
+
+# Binance kline csv column: (column file name, dtype)
+# Open time and Close time are kept as int64 milliseconds since epoch
+KLINE_COLUMNS = {
+    "Open time": ("open_time", "int64"),
+    "Open": ("open", "float64"),
+    "High": ("high", "float64"),
+    "Low": ("low", "float64"),
+    "Close": ("close", "float64"),
+    "Volume": ("volume", "float64"),
+    "Close time": ("close_time", "int64"),
+    "Quote asset volume": ("quote_volume", "float64"),
+    "Number of trades": ("trades", "int64"),
+    "Taker buy base asset volume": ("taker_base_volume", "float64"),
+    "Taker buy quote asset volume": ("taker_quote_volume", "float64"),
+}
+KLINE_COLUMNS_BY_FILE = {f: dtype for f, dtype in KLINE_COLUMNS.values()}
+CSV_COLUMNS = list(KLINE_COLUMNS) + ["Ignore"]
+
+
+#################### Parsing ####################
+def read_kline_csv(path) -> pd.DataFrame:
+    """
+    Read one binance kline csv (or zip) into typed columns, without the "Ignore" column
+    Open time / Close time stay as int64 milliseconds
+
+    binance spot files from 2025 onwards are in microseconds, they are converted to milliseconds
+    """
+    df = pd.read_csv(
+        path,
+        names=CSV_COLUMNS,
+        usecols=list(KLINE_COLUMNS),
+        dtype={name: dtype for name, (_, dtype) in KLINE_COLUMNS.items()},
+    )
+    return normalise_time_unit(df)
+
+
+def normalise_time_unit(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert microsecond timestamps to milliseconds in place
+    """
+    for name in ["Open time", "Close time"]:
+        if name in df and len(df) and df[name].iat[0] > 10**14:
+            df[name] //= 1000
+    return df
+
+
+#################### Partitions ####################
+def _month(open_time_ms) -> np.ndarray:
+    """
+    "YYYY-MM" partition key of int64 millisecond timestamps
+    """
+    return (
+        np.asarray(open_time_ms)
+        .astype("datetime64[ms]")
+        .astype("datetime64[M]")
+        .astype(str)
+    )
+
+
+def _partition_path(symbol: str, month: str, root: str = STORE_PATH) -> str:
+    return os.path.join(root, symbol.upper(), month)
+
+
+def partitions(symbol: str, root: str = STORE_PATH) -> list:
+    """
+    Sorted list of the "YYYY-MM" partitions stored for a symbol
+    """
+    path = os.path.join(root, symbol.upper())
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        p for p in os.listdir(path) if re.fullmatch(r"\d{4}-\d{2}", p) is not None
+    )
+
+
+def _read_partition(
+    symbol: str, month: str, files: list, root: str = STORE_PATH
+) -> dict:
+    path = _partition_path(symbol, month, root)
+    return {f: np.load(os.path.join(path, f"{f}.npy")) for f in files}
+
+
+def _write_partition(symbol: str, month: str, arrays: dict, root: str = STORE_PATH):
+    """
+    Write each column to its own .npy file, through a temporary file so that a
+    crash never leaves a half written column behind
+    """
+    path = _partition_path(symbol, month, root)
+    os.makedirs(path, exist_ok=True)
+    for f, arr in arrays.items():
+        tmp = os.path.join(path, f"{f}.tmp.npy")
+        np.save(tmp, np.ascontiguousarray(arr))
+        os.replace(tmp, os.path.join(path, f"{f}.npy"))
+
+
+def write(df: pd.DataFrame, symbol: str, root: str = STORE_PATH):
+    """
+    Write klines into the store, merging with partitions that already exist
+    df: typed frame as returned by read_kline_csv (KLINE_COLUMNS as columns)
+    Rows with an open time already in the store are overwritten by df
+    """
+    files = [f for f, _ in KLINE_COLUMNS.values()]
+    new = {f: df[name].to_numpy(dtype) for name, (f, dtype) in KLINE_COLUMNS.items()}
+    months = _month(new["open_time"])
+    existing = set(partitions(symbol, root))
+
+    for month in np.unique(months):
+        mask = months == month
+        arrays = {f: arr[mask] for f, arr in new.items()}
+        if month in existing:
+            old = _read_partition(symbol, month, files, root)
+            arrays = {f: np.concatenate([old[f], arrays[f]]) for f in files}
+
+        # keep last occurrence of each open time, sorted by open time
+        open_time = arrays["open_time"]
+        _, last = np.unique(open_time[::-1], return_index=True)
+        order = len(open_time) - 1 - last
+        _write_partition(
+            symbol, month, {f: arr[order] for f, arr in arrays.items()}, root
+        )
+
+
+def convert(ticker: str, unzipped_path: str = None, root: str = STORE_PATH):
+    """
+    Convert the csv files extracted by binance_price_data_downloader.unzip() into the store
+    Files are converted one month at a time to keep memory bounded
+    """
+    if unzipped_path is None:
+        unzipped_path = UNZIPPED_PATH.format(ticker=ticker)
+    all_files = glob.glob(os.path.join(unzipped_path, "*.csv"))
+
+    by_month = {}
+    for f in all_files:
+        # {ticker}-{interval}-{yyyy}-{mm}(-{dd}).csv
+        month = re.search(r"(\d{4}-\d{2})(-\d{2})?\.csv$", f)
+        by_month.setdefault(month.group(1) if month else None, []).append(f)
+
+    for month in sorted(by_month, key=str):
+        df = pd.concat(
+            (read_kline_csv(f) for f in by_month[month]), axis=0, ignore_index=True
+        )
+        write(df, ticker, root)
+        print(f"{ticker} {month} converted")
+
+
+#################### Reading ####################
+def bounds(start=None, end=None) -> tuple:
+    """
+    (lo, hi) inclusive int ms of [start, end], None for unbounded, with the rule of
+    pandas .loc[start:end] on a datetime index: a date string covers the whole period
+    it names, end="2023-01-31" reaches 2023-01-31 23:59:59.999
+    """
+
+    def period(bound):
+        if isinstance(bound, str):
+            try:
+                return pd.Period(bound)
+            except ValueError:  # ie with a time zone
+                pass
+        return None
+
+    lo = hi = None
+    if start is not None:
+        p = period(start)
+        lo = (p.start_time if p is not None else pd.Timestamp(start)).value // 10**6
+    if end is not None:
+        p = period(end)
+        hi = (p.end_time if p is not None else pd.Timestamp(end)).value // 10**6
+    return lo, hi
+
+
+def read(
+    ticker: str,
+    start=None,
+    end=None,
+    columns: list = None,
+    root: str = STORE_PATH,
+) -> pd.DataFrame:
+    """
+    Read klines from the store, in the same format as backtest_utility_functions.read()
+    Only the partitions overlapping [start, end] and the requested columns are opened
+
+    start, end: anything pd.Timestamp accepts, both inclusive, None for unbounded,
+                date strings cover the whole day (month, ...) as with .loc, see bounds()
+    columns: list of KLINE_COLUMNS names, None for all. "Open time" is always the index
+    """
+    if columns is None:
+        columns = [c for c in KLINE_COLUMNS if c != "Open time"]
+    unknown = set(columns) - set(KLINE_COLUMNS)
+    if unknown:
+        raise KeyError(f"Unknown columns: {sorted(unknown)}")
+
+    lo, hi = bounds(start, end)
+
+    # partition pruning
+    months = partitions(ticker, root)
+    if lo is not None:
+        months = [m for m in months if m >= _month(lo).item()]
+    if hi is not None:
+        months = [m for m in months if m <= _month(hi).item()]
+
+    files = ["open_time"] + [KLINE_COLUMNS[c][0] for c in columns if c != "Open time"]
+    chunks = {f: [] for f in files}
+    for month in months:
+        arrays = _read_partition(ticker, month, files, root)
+        # time range pushdown inside the partition, open_time is sorted
+        i = 0 if lo is None else np.searchsorted(arrays["open_time"], lo, "left")
+        j = None if hi is None else np.searchsorted(arrays["open_time"], hi, "right")
+        for f in files:
+            chunks[f].append(arrays[f][i:j])
+
+    arrays = {
+        f: np.concatenate(c) if c else np.empty(0, KLINE_COLUMNS_BY_FILE[f])
+        for f, c in chunks.items()
+    }
+    return to_frame(arrays, columns)
+
+
+def to_frame(arrays: dict, columns: list) -> pd.DataFrame:
+    """
+    Build the backtest frame (datetime "Open time" index) from column arrays
+    """
+    data = {}
+    for name in columns:
+        if name == "Open time":
+            continue
+        arr = arrays[KLINE_COLUMNS[name][0]]
+        data[name] = pd.to_datetime(arr, unit="ms") if name == "Close time" else arr
+    index = pd.DatetimeIndex(
+        pd.to_datetime(arrays["open_time"], unit="ms"), name="Open time"
+    )
+    return pd.DataFrame(
+        data, index=index, columns=[c for c in columns if c != "Open time"]
+    )
+
+
+if __name__ == "__main__":
+    convert("BTCUSDT")
+
+    btc = read(
+        "BTCUSDT", start="2023-01-01", end="2023-03-31", columns=["Close", "Volume"]
+    )
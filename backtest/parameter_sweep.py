@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:26:09 2026
+
+@author: Jeffrey
+"""
+
+import concurrent.futures
+import itertools
+import json, os
+from multiprocessing import shared_memory
+
+import pandas as pd
+import numpy as np
+
+import vector_backtest
+
+
+#################### Shared Memory ####################
+def share(arrays: dict) -> tuple:
+    """
+    Copy arrays into shared memory blocks once
+    returns (list of SharedMemory to close/unlink when done,
+             spec {name: (block name, dtype, shape)} for attach())
+    """
+    blocks = []
+    spec = {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, arr.dtype, buffer=block.buf)[...] = arr
+        blocks.append(block)
+        spec[name] = (block.name, arr.dtype.str, arr.shape)
+    return blocks, spec
+
+
+def attach(spec: dict) -> tuple:
+    """
+    Read only views over blocks created by share(), without copying
+    returns (list of SharedMemory to keep alive, {name: np.ndarray})
+    """
+    blocks = []
+    arrays = {}
+    for name, (block_name, dtype, shape) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        arr = np.ndarray(shape, dtype, buffer=block.buf)
+        arr.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = arr
+    return blocks, arrays
+
+
+def frame_arrays(df: pd.DataFrame, columns: list = None) -> dict:
+    """
+    {column: np.ndarray} of a read()/resample() frame, with the index as int64 ns "time"
+    """
+    if columns is None:
+        columns = list(df.columns)
+    arrays = {"time": df.index.values.astype("datetime64[ns]").astype(np.int64)}
+    arrays.update({c: df[c].to_numpy() for c in columns})
+    return arrays
+
+
+# set in every worker by _init_worker
+_BLOCKS = []
+_ARRAYS = {}
+
+
+def _init_worker(spec: dict):
+    global _BLOCKS, _ARRAYS
+    _BLOCKS, _ARRAYS = attach(spec)
+
+
+def _evaluate(strategy, batch: list) -> list:
+    rows = []
+    for params in batch:
+        try:
+            rows.append({"params": params, "result": strategy(_ARRAYS, **params)})
+        except Exception as e:
+            rows.append({"params": params, "error": repr(e)})
+    return rows
+
+
+#################### Sweep ####################
+def grid(**params) -> list:
+    """
+    Every combination of the parameter values
+    grid(fast=[5, 10], slow=[50, 100]) -> [{"fast": 5, "slow": 50}, ...]
+    """
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*params.values())]
+
+
+def _scalar(value):
+    # numpy scalars as the python value json writes and reads back
+    return value.item() if isinstance(value, np.generic) else float(value)
+
+
+def _plain(params: dict) -> dict:
+    return {
+        name: value.item() if isinstance(value, np.generic) else value
+        for name, value in params.items()
+    }
+
+
+def _key(params: dict) -> str:
+    return json.dumps(params, sort_keys=True, default=_scalar)
+
+
+def load_results(results_path: str) -> pd.DataFrame:
+    """
+    Results streamed by run(), one row per parameter set, parameters then metrics
+    """
+    if not os.path.exists(results_path):
+        return pd.DataFrame()
+    rows = []
+    with open(results_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # line cut short by a crash
+                continue
+            row = dict(record["params"])
+            row.update(record.get("result") or {})
+            if "error" in record:
+                row["error"] = record["error"]
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def load_results_params(results_path: str) -> list:
+    """
+    Parameter sets already evaluated in results_path, failed ones are left out so
+    that they are retried
+    """
+    params = []
+    with open(results_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                params.append(record["params"])
+    return params
+
+
+def run(
+    strategy,
+    arrays,
+    param_grid: list,
+    results_path: str,
+    max_workers: int = None,
+    batch_size: int = 1,
+) -> pd.DataFrame:
+    """
+    Evaluate strategy for every parameter set across a process pool
+
+    strategy: top level function strategy(arrays: dict, **params) -> dict of metrics,
+              arrays are read only numpy views over shared memory
+    arrays: {name: np.ndarray} or a read()/resample() pd.DataFrame (see frame_arrays)
+            copied into shared memory once, never pickled per task
+    param_grid: list of parameter dicts, ie from grid()
+    results_path: json lines file results are appended to as they complete.
+                  Parameter sets already in it are skipped, so a crashed sweep is
+                  resumed by running it again
+    max_workers: processes, default os.cpu_count()
+    batch_size: parameter sets per task, raise it for strategies that run in milliseconds
+
+    returns load_results(results_path)
+
+    On windows the call must be under if __name__ == "__main__":
+    """
+    if isinstance(arrays, pd.DataFrame):
+        arrays = frame_arrays(arrays)
+
+    param_grid = [_plain(p) for p in param_grid]
+    done = set()
+    if os.path.exists(results_path):
+        done = {_key(p) for p in load_results_params(results_path)}
+    pending = [p for p in param_grid if _key(p) not in done]
+    batches = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+    if not batches:
+        return load_results(results_path)
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+    blocks, spec = share(arrays)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker, initargs=(spec,)
+        ) as executor, open(results_path, "a") as f:
+            # bounded number of tasks in flight, so huge grids do not queue up at once
+            todo = iter(batches)
+            in_flight = set()
+            completed = 0
+            for batch in itertools.islice(todo, max_workers * 4):
+                in_flight.add(executor.submit(_evaluate, strategy, batch))
+
+            while in_flight:
+                finished, in_flight = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    for row in future.result():
+                        f.write(json.dumps(row, default=_scalar) + "\n")
+                    f.flush()
+                    completed += 1
+                    batch = next(todo, None)
+                    if batch is not None:
+                        in_flight.add(executor.submit(_evaluate, strategy, batch))
+                print(f"{completed}/{len(batches)} batches done", end="\r")
+            print()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return load_results(results_path)
+
+
+#################### Example ####################
+def moving_average_crossover(arrays: dict, fast: int, slow: int, fee: float) -> dict:
+    """
+    Example strategy: long when the fast moving average is above the slow one
+    """
+    close = arrays["Close"]
+    cumsum = np.r_[0, np.cumsum(close)]
+    ma_fast = np.full(len(close), np.nan)
+    ma_fast[fast - 1 :] = (cumsum[fast:] - cumsum[:-fast]) / fast
+    ma_slow = np.full(len(close), np.nan)
+    ma_slow[slow - 1 :] = (cumsum[slow:] - cumsum[:-slow]) / slow
+    signal = np.sign(ma_fast - ma_slow)
+
+    stats = vector_backtest.run(close, signal, fee=fee, equity=False)["stats"]
+    return stats.iloc[0].to_dict()
+
+
+if __name__ == "__main__":
+    import kline_mmap
+
+    btc = kline_mmap.read("BTCUSDT", columns=["Close"])
+    results = run(
+        moving_average_crossover,
+        btc,
+        grid(fast=range(5, 100, 5), slow=range(100, 1000, 50), fee=[0.001, 0.00075]),
+        r"D:\Binance Data\sweeps\ma_crossover.jsonl",
+    )
+    print(results.sort_values("sharpe").tail())
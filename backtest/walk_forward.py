@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 10:17:52 2026
+
+@author: Jeffrey
+"""
+
+import concurrent.futures
+import os
+import time
+
+import pandas as pd
+import numpy as np
+
+import parameter_sweep
+import vector_backtest
+
+
+#################### Folds ####################
+def folds(
+    index: pd.DatetimeIndex,
+    train,
+    test,
+    step=None,
+    anchored: bool = False,
+    gap=0,
+) -> list:
+    """
+    Walk forward (train, test) windows as integer slices into index
+
+    train, test, step, gap: window lengths either in bars (int) or as time spans
+                            (anything pd.Timedelta accepts, ie "180D")
+    step: how far each fold rolls forward, default test so test windows tile
+    anchored: True keeps every train window starting at the first bar (expanding)
+    gap: bars/time dropped between train and test, to purge overlapping labels
+    """
+    n = len(index)
+    if step is None:
+        step = test
+
+    def bars(span, at: int) -> int:
+        # number of bars covered by span starting at bar position at
+        if isinstance(span, (int, np.integer)):
+            return int(span)
+        end = index[min(at, n - 1)] + pd.Timedelta(span)
+        return int(np.searchsorted(index, end, "left")) - at
+
+    result = []
+    train_start = 0
+    train_end = bars(train, 0)
+    while True:
+        test_start = train_end + bars(gap, train_end)
+        test_end = min(test_start + bars(test, test_start), n)
+        if test_start >= n or test_end <= test_start:
+            break
+        result.append((slice(train_start, train_end), slice(test_start, test_end)))
+
+        shift = bars(step, train_end)
+        if shift <= 0:
+            break
+        if not anchored:
+            train_start += bars(step, train_start)
+        train_end += shift
+    return result
+
+
+#################### Fold Evaluation ####################
+def _slice(arrays: dict, s: slice) -> dict:
+    return {name: arr[s] for name, arr in arrays.items()}
+
+
+def _evaluate(fit, signal, arrays: dict, fold: int, train: slice, test: slice):
+    """
+    Fit on the train window and produce the signal of the test window
+    Windows are views into the arrays, features are never recomputed
+    """
+    start = time.perf_counter()
+    params = fit(_slice(arrays, train))
+    fitted = time.perf_counter()
+    sig = np.asarray(signal(_slice(arrays, test), params), dtype=np.float64)
+    done = time.perf_counter()
+    if len(sig) != test.stop - test.start:
+        raise ValueError(f"fold {fold}: signal length does not match the test window")
+    timing = {
+        "fit_s": fitted - start,
+        "signal_s": done - fitted,
+        "pid": os.getpid(),
+    }
+    return fold, params, sig, timing
+
+
+def _evaluate_in_worker(fit, signal, fold: int, train: slice, test: slice):
+    return _evaluate(fit, signal, parameter_sweep._ARRAYS, fold, train, test)
+
+
+#################### Walk Forward ####################
+def run(
+    fit,
+    signal,
+    arrays,
+    train,
+    test,
+    step=None,
+    anchored: bool = False,
+    gap=0,
+    price: str = "Close",
+    max_workers: int = None,
+    **backtest_kwargs,
+) -> dict:
+    """
+    Walk forward optimisation: fit on each train window, trade the following test window,
+    and stitch the out of sample signals into one equity curve
+
+    fit: top level function fit(train: dict of arrays) -> params
+    signal: top level function signal(test: dict of arrays, params) -> signal array with
+            one 1/-1/np.nan value per test bar
+    arrays: {name: np.ndarray} or pd.DataFrame of price and features computed once over the
+            full index, fold windows are views into it (shared memory across processes)
+    train, test, step, anchored, gap: see folds()
+    price: name of the price array to backtest on
+    max_workers: processes running folds in parallel, 1 runs them in this process
+    backtest_kwargs: passed to vector_backtest.run (fee, slippage, periods_per_year)
+
+    returns dict
+        "folds": pd.DataFrame one row per fold with the windows, fitted params and timings
+        "signal": stitched out of sample signal
+        "equity": out of sample equity curve
+        "stats": vector_backtest stats of the out of sample period
+    """
+    if isinstance(arrays, pd.DataFrame):
+        arrays = parameter_sweep.frame_arrays(arrays)
+    index = pd.DatetimeIndex(arrays["time"]) if "time" in arrays else None
+    n = len(arrays[price])
+    windows = folds(
+        index if index is not None else pd.RangeIndex(n),
+        train,
+        test,
+        step,
+        anchored,
+        gap,
+    )
+    if not windows:
+        raise ValueError("not enough data for a single train / test fold")
+
+    start = time.perf_counter()
+    results = {}
+    if max_workers == 1:
+        for fold, (tr, te) in enumerate(windows):
+            results[fold] = _evaluate(fit, signal, arrays, fold, tr, te)
+    else:
+        blocks, spec = parameter_sweep.share(arrays)
+        try:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=parameter_sweep._init_worker,
+                initargs=(spec,),
+            ) as executor:
+                futures = [
+                    executor.submit(_evaluate_in_worker, fit, signal, fold, tr, te)
+                    for fold, (tr, te) in enumerate(windows)
+                ]
+                for future in concurrent.futures.as_completed(futures):
+                    result = future.result()
+                    results[result[0]] = result
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    elapsed = time.perf_counter() - start
+
+    # stitch out of sample signals, later folds overwrite overlapping test bars
+    oos = slice(windows[0][1].start, windows[-1][1].stop)
+    stitched = np.full(oos.stop - oos.start, np.nan)
+    rows = []
+    for fold, (tr, te) in enumerate(windows):
+        _, params, sig, timing = results[fold]
+        stitched[te.start - oos.start : te.stop - oos.start] = sig
+        rows.append(
+            {
+                "train_start": tr.start,
+                "train_end": tr.stop,
+                "test_start": te.start,
+                "test_end": te.stop,
+                "params": params,
+                **timing,
+            }
+        )
+    fold_table = pd.DataFrame(rows)
+    if index is not None:
+        for col in ["train_start", "test_start"]:
+            fold_table[col] = index[fold_table[col]]
+        for col in ["train_end", "test_end"]:
+            fold_table[col] = index[fold_table[col] - 1]
+    print(
+        f"{len(windows)} folds in {elapsed:.2f}s, "
+        f"fit {fold_table['fit_s'].sum():.2f}s, signal {fold_table['signal_s'].sum():.2f}s"
+    )
+
+    oos_index = index[oos] if index is not None else None
+    backtest = vector_backtest.run(
+        pd.Series(arrays[price][oos], index=oos_index), stitched, **backtest_kwargs
+    )
+    return {
+        "folds": fold_table,
+        "signal": pd.Series(stitched, index=oos_index, name="signal"),
+        "equity": backtest["equity"][0].rename("equity"),
+        "stats": backtest["stats"].iloc[0],
+    }
+
+
+#################### Example ####################
+def fit_momentum(train: dict) -> dict:
+    """
+    Example fit: pick the lookback with the best in sample Sharpe
+    """
+    best = None
+    for lookback in [60, 240, 1440]:
+        sig = np.sign(train[f"momentum_{lookback}"])
+        sharpe = vector_backtest.run(train["Close"], sig, equity=False)["stats"][
+            "sharpe"
+        ]
+        if best is None or sharpe.iloc[0] > best[1]:
+            best = (lookback, sharpe.iloc[0])
+    return {"lookback": best[0]}
+
+
+def signal_momentum(test: dict, params: dict) -> np.ndarray:
+    return np.sign(test[f"momentum_{params['lookback']}"])
+
+
+if __name__ == "__main__":
+    import kline_mmap
+
+    btc = kline_mmap.read("BTCUSDT", columns=["Close"]).copy()
+    for lookback in [60, 240, 1440]:  # features once over the full index
+        btc[f"momentum_{lookback}"] = btc["Close"].pct_change(lookback)
+
+    result = run(fit_momentum, signal_momentum, btc, train="180D", test="30D")
+    print(result["folds"])
+    result["equity"].plot()
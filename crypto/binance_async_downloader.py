@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 09:34:11 2026
+
+@author: Jeffrey
+"""
+
+# pylint: disable=line-too-long
+
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import random
+
+import aiohttp
+import pandas as pd
+
+BASE_URL = "https://data.binance.vision"
+DATA_PATH = r"D:\Binance Data\{dtype}\{ticker}"
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ChecksumError(Exception):
+    pass
+
+
+#################### Files ####################
+def file_name(ticker: str, dtype: str, interval: str, period: str) -> str:
+    """
+    period: yyyy-mm for a monthly archive, yyyy-mm-dd for a daily one
+    klines have an interval in the name, aggTrades and trades do not
+    """
+    if dtype == "klines":
+        return f"{ticker}-{interval}-{period}.zip"
+    return f"{ticker}-{dtype}-{period}.zip"
+
+
+def file_url(
+    ticker: str, dtype: str, interval: str, period: str, base_url: str = BASE_URL
+) -> str:
+    """
+    reference:
+    https://github.com/binance/binance-public-data/#trades-1
+    """
+    frequency = "monthly" if len(period) == 7 else "daily"
+    folder = f"{base_url}/data/spot/{frequency}/{dtype}/{ticker}"
+    if dtype == "klines":
+        folder += f"/{interval}"
+    return f"{folder}/{file_name(ticker, dtype, interval, period)}"
+
+
+def periods(start, end=None, today: datetime.date = None) -> list:
+    """
+    Archives covering [start, end]: yyyy-mm for every whole month before the current one
+    (one request instead of ~30), yyyy-mm-dd for the remaining days
+    """
+    if today is None:
+        today = datetime.date.today()
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(today if end is None else end).normalize()
+    this_month = pd.Timestamp(today).to_period("M")
+
+    result = []
+    for month in pd.period_range(start, end, freq="M"):
+        first, last = month.start_time.normalize(), month.end_time.normalize()
+        if month < this_month and first >= start and last <= end:
+            result.append(month.strftime("%Y-%m"))
+        else:
+            days = pd.date_range(max(first, start), min(last, end), freq="D")
+            result.extend(days.strftime("%Y-%m-%d"))
+    return result
+
+
+def sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+#################### Download ####################
+async def _retry(coroutine, retries: int, backoff: float, what: str):
+    """
+    Await coroutine() with exponential backoff and jitter on transient errors
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await coroutine()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ChecksumError) as e:
+            if (
+                isinstance(e, aiohttp.ClientResponseError)
+                and e.status not in RETRY_STATUS
+            ):
+                raise
+            if attempt == retries:
+                raise
+            delay = backoff * 2**attempt * (1 + random.random())
+            logging.debug("%s failed (%r), retry in %.1fs", what, e, delay)
+            await asyncio.sleep(delay)
+
+
+async def download_file(
+    session: aiohttp.ClientSession,
+    url: str,
+    dest: str,
+    chunk_size: int = 1 << 16,
+    on_block=None,
+) -> int:
+    """
+    Download url to dest + ".part", resuming a partial file left by an earlier attempt
+    on_block: optional coroutine function awaited with the size of every block received,
+              ie to hold downloads to a throughput budget
+    returns number of bytes received
+    raises FileNotFoundError on 404, aiohttp.ClientResponseError on other bad statuses
+    """
+    part = dest + ".part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    async with session.get(url, headers=headers) as res:
+        if res.status == 404:
+            raise FileNotFoundError(url)
+        if res.status == 416:  # nothing left to fetch, the part file is complete
+            return 0
+        res.raise_for_status()
+
+        # 200 means the server ignored the range, start over
+        mode = "ab" if res.status == 206 else "wb"
+        received = 0
+        with open(part, mode) as f:
+            async for block in res.content.iter_chunked(chunk_size):
+                f.write(block)
+                received += len(block)
+                if on_block is not None:
+                    await on_block(len(block))
+    return received
+
+
+async def verify_file(session: aiohttp.ClientSession, url: str, dest: str):
+    """
+    Check dest + ".part" against the published url + ".CHECKSUM" and move it to dest
+    A mismatching part file is deleted and ChecksumError raised
+    """
+    async with session.get(url + ".CHECKSUM") as res:
+        res.raise_for_status()
+        expected = (await res.text()).split()[0].lower()
+
+    part = dest + ".part"
+    actual = await asyncio.to_thread(sha256, part)
+    if actual != expected:
+        os.remove(part)
+        raise ChecksumError(f"{os.path.basename(dest)}: sha256 {actual} != {expected}")
+    os.replace(part, dest)
+
+
+async def fetch(
+    session: aiohttp.ClientSession,
+    url: str,
+    dest: str,
+    retries: int = 5,
+    backoff: float = 1.0,
+) -> int:
+    """
+    Download and verify one archive, retrying transient failures and bad checksums
+    returns bytes received
+    """
+
+    async def attempt():
+        received = await download_file(session, url, dest)
+        await verify_file(session, url, dest)
+        return received
+
+    return await _retry(attempt, retries, backoff, os.path.basename(dest))
+
+
+async def download_all(
+    ticker: str = "BTCUSDT",
+    dtype: str = "klines",
+    interval: str = "1m",
+    start="2021-03-01",
+    end=None,
+    dest_dir: str = None,
+    base_url: str = BASE_URL,
+    connections: int = 8,
+    retries: int = 5,
+    backoff: float = 1.0,
+    timeout: float = 60,
+) -> dict:
+    """
+    Download every archive of ticker between start and end
+    Monthly archives are used for whole past months, daily ones for the current month
+    and for any month whose monthly archive is not published yet.
+    Archives already in dest_dir are skipped.
+
+    connections: size of the connection pool, also the number of downloads in flight
+    base_url: point at a local stand-in server for testing
+    timeout: seconds without connecting or receiving data before a retry
+
+    returns {"downloaded": [...], "skipped": [...], "missing": [...], "failed": {name: error}}
+    """
+    if dest_dir is None:
+        dest_dir = DATA_PATH.format(dtype=dtype, ticker=ticker)
+    os.makedirs(dest_dir, exist_ok=True)
+    summary = {"downloaded": [], "skipped": [], "missing": [], "failed": {}, "bytes": 0}
+
+    connector = aiohttp.TCPConnector(limit=connections)
+    # no total timeout, monthly trades archives take minutes, only stalls are errors
+    client_timeout = aiohttp.ClientTimeout(
+        total=None, sock_connect=timeout, sock_read=timeout
+    )
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=client_timeout
+    ) as session:
+
+        async def one(period: str):
+            name = file_name(ticker, dtype, interval, period)
+            dest = os.path.join(dest_dir, name)
+            if os.path.exists(dest):
+                summary["skipped"].append(name)
+                return
+            url = file_url(ticker, dtype, interval, period, base_url)
+            try:
+                received = await fetch(session, url, dest, retries, backoff)
+                summary["bytes"] += received
+                summary["downloaded"].append(name)
+            except FileNotFoundError:
+                if len(period) == 7:
+                    # monthly archive not published yet, fall back to daily ones
+                    await asyncio.gather(*(one(day) for day in month_days(period, end)))
+                else:
+                    summary["missing"].append(name)
+            except Exception as e:
+                summary["failed"][name] = repr(e)
+
+        await asyncio.gather(*(one(p) for p in periods(start, end)))
+
+    logging.debug(
+        "%s %s: %d downloaded (%d bytes), %d skipped, %d missing, %d failed",
+        ticker,
+        dtype,
+        len(summary["downloaded"]),
+        summary["bytes"],
+        len(summary["skipped"]),
+        len(summary["missing"]),
+        len(summary["failed"]),
+    )
+    return summary
+
+
+def month_days(month: str, end=None) -> list:
+    """
+    yyyy-mm-dd of every day of a yyyy-mm month, up to end
+    """
+    month = pd.Period(month, freq="M")
+    last = month.end_time.normalize()
+    if end is not None:
+        last = min(last, pd.Timestamp(end).normalize())
+    return list(pd.date_range(month.start_time, last, freq="D").strftime("%Y-%m-%d"))
+
+
+if __name__ == "__main__":
+    summary = asyncio.run(
+        download_all("BTCUSDT", "klines", "1m", start=datetime.date(2021, 3, 1))
+    )
+    print(summary["failed"])
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 11:02:37 2026
+
+@author: Jeffrey
+"""
+
+# pylint: disable=line-too-long
+
+import asyncio
+import logging
+import os
+import sys
+import time
+import zipfile
+
+import aiohttp
+
+import binance_async_downloader as downloader
+from binance_async_downloader import BASE_URL, DATA_PATH
+
+BACKTEST_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "backtest"
+)
+
+# binance answers 429, then 418 once a client keeps going over its limits
+RATE_LIMIT_STATUS = {418, 429}
+
+
+#################### Job Graph ####################
+def jobs(specs: list) -> dict:
+    """
+    Deduplicated archives of a universe, {(ticker, dtype, interval): [period, ...]}
+
+    specs: list of dicts {"symbols": [...], "dtypes": [...], "intervals": [...],
+           "start": date, "end": date}, dtypes default ["klines"], intervals ["1m"],
+           end today. Overlapping specs are merged.
+    The interval only applies to klines, aggTrades/trades groups have interval None.
+    A day whose month is already covered by a monthly archive is dropped.
+    """
+    graph = {}
+    for spec in specs:
+        periods = downloader.periods(spec["start"], spec.get("end"))
+        for ticker in spec["symbols"]:
+            for dtype in spec.get("dtypes", ["klines"]):
+                intervals = (
+                    spec.get("intervals", ["1m"]) if dtype == "klines" else [None]
+                )
+                for interval in intervals:
+                    graph.setdefault((ticker, dtype, interval), set()).update(periods)
+
+    for group, periods in graph.items():
+        months = {p for p in periods if len(p) == 7}
+        graph[group] = sorted(p for p in periods if len(p) == 7 or p[:7] not in months)
+    return {group: periods for group, periods in graph.items() if periods}
+
+
+#################### Throughput Budget ####################
+class Budget:
+    """
+    Global throughput budget shared by every request of a run: token buckets of bytes
+    and requests per second, None leaves that side unlimited.
+    Takers go into debt and sleep it off, so concurrent downloads share the rate.
+    """
+
+    def __init__(
+        self,
+        bytes_per_s: float = None,
+        requests_per_s: float = None,
+        burst_s: float = 1.0,
+    ):
+        self.rates = {"bytes": bytes_per_s, "requests": requests_per_s}
+        self.capacity = {
+            kind: (rate or 0) * burst_s for kind, rate in self.rates.items()
+        }
+        self.tokens = dict(self.capacity)
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+
+    def _take(self, kind: str, amount: float) -> float:
+        # seconds to wait before amount is paid for
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        for k, rate in self.rates.items():
+            if rate:
+                self.tokens[k] = min(self.capacity[k], self.tokens[k] + elapsed * rate)
+        wait = max(self.resume_at - now, 0.0)
+        if self.rates[kind]:
+            self.tokens[kind] -= amount
+            wait = max(wait, -self.tokens[kind] / self.rates[kind])
+        return wait
+
+    async def request(self):
+        wait = self._take("requests", 1)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def received(self, size: int):
+        wait = self._take("bytes", size)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Hold every new request for seconds, after the server signalled a rate limit
+        """
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+
+#################### Progress ####################
+class Stage:
+    """
+    Progress and throughput of one stage of the job graph
+    """
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.amount = 0
+        self.first = None
+        self.last = None
+
+    def start(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+
+    def finish(self, amount: int = 0, failed: bool = False):
+        self.last = time.perf_counter()
+        self.amount += amount
+        if failed:
+            self.failed += 1
+        else:
+            self.done += 1
+
+    def summary(self) -> dict:
+        seconds = (self.last - self.first) if self.first and self.last else 0.0
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            self.unit: self.amount,
+            "seconds": seconds,
+            "jobs_per_s": self.done / seconds if seconds else 0.0,
+            f"{self.unit}_per_s": self.amount / seconds if seconds else 0.0,
+        }
+
+    def __str__(self) -> str:
+        s = self.summary()
+        rate = s[f"{self.unit}_per_s"]
+        rate = (
+            f"{rate / 1e6:.1f} MB/s"
+            if self.unit == "bytes"
+            else f"{rate:,.0f} {self.unit}/s"
+        )
+        failed = f" ({self.failed} failed)" if self.failed else ""
+        return f"{self.name} {self.done}/{self.total}{failed} {rate}"
+
+
+#################### Ingest ####################
+def ingest_klines(ticker: str, dtype: str, interval: str, paths: list) -> int:
+    """
+    Default ingest stage: 1m kline zips are extracted next to them (as unzip() does) and
+    appended to the consolidated data with backtest/kline_ingest.py.
+    Other archives are left as they are, backtest/binance_zip_reader.py streams them.
+    returns number of rows appended
+    """
+    if dtype != "klines" or interval != "1m" or not paths:
+        return 0
+    if BACKTEST_PATH not in sys.path:
+        sys.path.append(BACKTEST_PATH)
+    import kline_ingest
+
+    unzipped = os.path.dirname(os.path.abspath(paths[0])) + " - Unzipped"
+    for path in paths:
+        with zipfile.ZipFile(path, "r") as zip_ref:
+            for name in zip_ref.namelist():
+                if not os.path.exists(os.path.join(unzipped, name)):
+                    zip_ref.extract(name, unzipped)
+    return kline_ingest.ingest(ticker, unzipped)
+
+
+#################### Orchestrator ####################
+async def run(
+    specs: list,
+    ingest=ingest_klines,
+    data_path: str = DATA_PATH,
+    base_url: str = BASE_URL,
+    connections: int = 16,
+    bytes_per_s: float = None,
+    requests_per_s: float = None,
+    ingest_workers: int = 2,
+    retries: int = 5,
+    backoff: float = 1.0,
+    timeout: float = 60,
+    report_every: float = 5.0,
+) -> dict:
+    """
+    Download, verify and ingest every archive of a universe (see jobs())
+
+    Every archive goes download -> verify, a group (ticker, dtype, interval) is ingested
+    once all its archives are settled, so ingest always sees them complete and in order.
+    Archives already on disk skip download and verify. A checksum mismatch or a failed
+    verify sends the archive back to download, up to retries times.
+
+    ingest: function ingest(ticker, dtype, interval, paths) -> rows, run in a thread,
+            None to only download
+    data_path: archive directory pattern with {dtype} and {ticker}
+    connections: size of the connection pool, also the downloads/verifies in flight
+    bytes_per_s, requests_per_s: global throughput budget across all downloads.
+                                 A 429/418 from binance pauses every request
+    ingest_workers: groups ingested at once
+    report_every: seconds between progress lines
+
+    returns dict
+        "stages": {"download" | "verify" | "ingest": progress and throughput}
+        "skipped": archives already on disk
+        "missing": archives binance does not publish
+        "failed": {archive: error}
+    """
+    graph = jobs(specs)
+    budget = Budget(bytes_per_s, requests_per_s)
+    stages = {
+        "download": Stage("download", "bytes"),
+        "verify": Stage("verify", "bytes"),
+        "ingest": Stage("ingest", "rows"),
+    }
+    result = {"stages": {}, "skipped": [], "missing": [], "failed": {}}
+
+    pending = {group: len(periods) for group, periods in graph.items()}
+    paths = {group: [] for group in graph}
+    settled = asyncio.Event()
+    download_queue, verify_queue, ingest_queue = (asyncio.Queue() for _ in range(3))
+    for group, periods in graph.items():
+        for period in periods:
+            download_queue.put_nowait((group, period, 0))
+    stages["download"].total = stages["verify"].total = sum(pending.values())
+
+    def settle(group: tuple):
+        # one archive of group will not change any more
+        pending[group] -= 1
+        if pending[group] == 0:
+            if ingest is not None and paths[group]:
+                stages["ingest"].total += 1
+                ingest_queue.put_nowait((group,))
+            if not any(pending.values()):
+                settled.set()
+
+    def drop(n: int = 1):
+        # archives that will not be downloaded/verified after all
+        stages["download"].total -= n
+        stages["verify"].total -= n
+
+    async def download(session, group: tuple, period: str, attempt: int):
+        ticker, dtype, interval = group
+        name = downloader.file_name(ticker, dtype, interval, period)
+        folder = data_path.format(dtype=dtype, ticker=ticker)
+        dest = os.path.join(folder, name)
+        if os.path.exists(dest):
+            result["skipped"].append(name)
+            paths[group].append(dest)
+            drop()
+            settle(group)
+            return
+        os.makedirs(folder, exist_ok=True)
+        url = downloader.file_url(ticker, dtype, interval, period, base_url)
+
+        async def get():
+            await budget.request()
+            try:
+                return await downloader.download_file(
+                    session, url, dest, on_block=budget.received
+                )
+            except aiohttp.ClientResponseError as e:
+                if e.status in RATE_LIMIT_STATUS:
+                    retry_after = (e.headers or {}).get("Retry-After", "")
+                    budget.pause(
+                        float(retry_after) if retry_after.isdigit() else backoff
+                    )
+                raise
+
+        stage = stages["download"]
+        stage.start()
+        try:
+            received = await downloader._retry(get, retries, backoff, name)
+        except FileNotFoundError:
+            stage.total -= 1
+            stages["verify"].total -= 1
+            if len(period) == 7:
+                # monthly archive not published yet, fall back to daily ones
+                days = downloader.month_days(period)
+                pending[group] += len(days)
+                stage.total += len(days)
+                stages["verify"].total += len(days)
+                for day in days:
+                    download_queue.put_nowait((group, day, 0))
+            else:
+                result["missing"].append(name)
+            settle(group)
+        except Exception as e:
+            stage.finish(failed=True)
+            stages["verify"].total -= 1
+            result["failed"][name] = repr(e)
+            settle(group)
+        else:
+            stage.finish(received)
+            verify_queue.put_nowait((group, period, attempt, url, dest))
+
+    async def verify(
+        session, group: tuple, period: str, attempt: int, url: str, dest: str
+    ):
+        stage = stages["verify"]
+        stage.start()
+        try:
+            await budget.request()
+            await downloader.verify_file(session, url, dest)
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            downloader.ChecksumError,
+        ) as e:
+            if attempt < retries:
+                # back through download, a complete part file only costs a 416
+                logging.debug("%s failed verify (%r), attempt %d", dest, e, attempt + 1)
+                stages["download"].done -= 1
+                download_queue.put_nowait((group, period, attempt + 1))
+                return
+            stage.finish(failed=True)
+            result["failed"][os.path.basename(dest)] = repr(e)
+        except Exception as e:
+            # not worth a retry (ie an empty .CHECKSUM, the file locked on Windows)
+            stage.finish(failed=True)
+            result["failed"][os.path.basename(dest)] = repr(e)
+        else:
+            stage.finish(os.path.getsize(dest))
+            paths[group].append(dest)
+        settle(group)
+
+    async def ingest_group(group: tuple):
+        stage = stages["ingest"]
+        stage.start()
+        try:
+            rows = await asyncio.to_thread(ingest, *group, sorted(paths[group]))
+        except Exception as e:
+            stage.finish(failed=True)
+            result["failed"]["{} {} {} ingest".format(*group)] = repr(e)
+        else:
+            stage.finish(rows or 0)
+
+    async def worker(queue: asyncio.Queue, handle):
+        while True:
+            item = await queue.get()
+            try:
+                await handle(*item)
+            except Exception:
+                # a handler must not take the worker down, run() would never settle
+                logging.exception("%s failed", item)
+            finally:
+                queue.task_done()
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_every)
+            print(" | ".join(str(s) for s in stages.values()), end="\r")
+
+    if not graph:
+        settled.set()
+    connector = aiohttp.TCPConnector(limit=connections)
+    client_timeout = aiohttp.ClientTimeout(
+        total=None, sock_connect=timeout, sock_read=timeout
+    )
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=client_timeout
+    ) as session:
+        tasks = [asyncio.create_task(report())]
+        for _ in range(connections):
+            tasks.append(
+                asyncio.create_task(
+                    worker(download_queue, lambda *a: download(session, *a))
+                )
+            )
+            tasks.append(
+                asyncio.create_task(
+                    worker(verify_queue, lambda *a: verify(session, *a))
+                )
+            )
+        for _ in range(ingest_workers):
+            tasks.append(asyncio.create_task(worker(ingest_queue, ingest_group)))
+
+        try:
+            await settled.wait()
+            await ingest_queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(" | ".join(str(s) for s in stages.values()))
+    result["stages"] = {name: stage.summary() for name, stage in stages.items()}
+    return result
+
+
+if __name__ == "__main__":
+    universe = [
+        {
+            "symbols": ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT"],
+            "dtypes": ["klines"],
+            "intervals": ["1m", "1h"],
+            "start": "2021-03-01",
+        },
+        {
+            "symbols": ["BTCUSDT", "ETHUSDT"],
+            "dtypes": ["aggTrades"],
+            "start": "2024-01-01",
+        },
+    ]
+    summary = asyncio.run(run(universe, bytes_per_s=50e6, requests_per_s=20))
+    print(summary["missing"], summary["failed"])
@@ -50,9 +50,13 @@ def binance_data_download(
 def unzip(zip_directory: str):
     """
     Unzip file after downloaded price data
+    D:/Binance Data/{dtype}/{ticker}/x.zip is extracted to D:/Binance Data/{dtype}/{ticker} - Unzipped
+
+    Not needed for reading, backtest/binance_zip_reader.py streams the zips directly
     """
+    output = os.path.dirname(os.path.abspath(zip_directory)) + " - Unzipped"
     with zipfile.ZipFile(zip_directory, "r") as zip_ref:
-        zip_ref.extractall(r"D:\Binance Data\klines\BTCUSDT - Unzipped")  # Output
+        zip_ref.extractall(output)  # Output
 
 
 if __name__ == "__main__":
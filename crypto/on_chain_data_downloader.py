@@ -5,13 +5,215 @@ Created on Tue Aug 30 16:10:41 2022
 @author: Jeffrey
 """
 
+import concurrent.futures
+import glob, os
 import json
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
+
+API_KEY = os.environ.get("GLASSNODE_API_KEY", "")
+BASE_URL = "https://api.glassnode.com/v1/metrics/"
+CACHE_PATH = r"D:\Glassnode Data\cache"
+
+# seconds per point, the point at t covers [t, t + step)
+INTERVAL_SECONDS = {"10m": 600, "1h": 3600, "24h": 86400, "1w": 7 * 86400}
+
+
+#################### Session ####################
+def session(pool_size: int = 16, retries: int = 5, backoff: float = 1.0):
+    """
+    requests.Session keeping up to pool_size connections to glassnode alive, with
+    exponential backoff on rate limits (honouring Retry-After) and server errors
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+    http = requests.Session()
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    return http
+
+
+#################### Parsing ####################
+def parse(text: str) -> dict:
+    """
+    Glassnode JSON straight into typed columns, without building a DataFrame
+    [{"t": 1614556800, "v": 1.5}, ...] -> {"t": int64 seconds, "v": float64}
+    [{"t": ..., "o": {"a": 1, "b": 2}}, ...] -> {"t": int64 seconds, "a": ..., "b": ...}
+    null values become np.nan
+    """
+    points = json.loads(text)
+    n = len(points)
+    arrays = {"t": np.fromiter((p["t"] for p in points), np.int64, n)}
+    if n and "o" in points[0]:
+        keys = dict.fromkeys(k for p in points for k in p["o"])
+        for k in keys:
+            arrays[k] = np.fromiter(
+                (_value(p["o"].get(k)) for p in points), np.float64, n
+            )
+    else:
+        arrays["v"] = np.fromiter((_value(p.get("v")) for p in points), np.float64, n)
+    return arrays
 
 
-# Overwriting loads() function in pd.read_json()
-pd.io.json._json.loads = lambda s, *a, **kw: json.loads(s)
+def _value(v) -> float:
+    return np.nan if v is None else v
+
+
+def to_frame(arrays: dict) -> pd.DataFrame:
+    """
+    Columns from parse()/fetch() as a pd.DataFrame indexed by "t", like the csv files
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(arrays["t"], unit="s"), name="t")
+    return pd.DataFrame({c: arr for c, arr in arrays.items() if c != "t"}, index=index)
+
+
+#################### Cache ####################
+def metric_path(metric: str) -> str:
+    """
+    "addresses/active_count" from either that or the full endpoint url
+    """
+    if metric.startswith(BASE_URL):
+        metric = metric[len(BASE_URL) :]
+    return metric.strip("/")
+
+
+def _cache_path(metric: str, asset: str, interval: str, root: str = CACHE_PATH) -> str:
+    # {root}/{asset}/{interval}/{category}/{metric}/{column}.npy
+    return os.path.join(root, asset.upper(), interval, *metric_path(metric).split("/"))
+
+
+def read_cache(
+    metric: str, asset: str = "BTC", interval: str = "24h", root: str = CACHE_PATH
+) -> dict:
+    """
+    Cached columns of one series, None if it was never fetched
+    """
+    path = _cache_path(metric, asset, interval, root)
+    if not os.path.exists(os.path.join(path, "t.npy")):
+        return None
+    arrays = {
+        os.path.basename(f)[:-4]: np.load(f)
+        for f in glob.glob(os.path.join(path, "*.npy"))
+        if not f.endswith(".tmp.npy")
+    }
+    if len({len(arr) for arr in arrays.values()}) != 1:
+        return None  # interrupted write, fetch the series again
+    t = arrays.pop("t")
+    return {"t": t, **arrays}
+
+
+def _write_cache(metric: str, asset: str, interval: str, arrays: dict, root: str):
+    """
+    One .npy per column through a temporary file, "t" last
+    """
+    path = _cache_path(metric, asset, interval, root)
+    os.makedirs(path, exist_ok=True)
+    for c in [c for c in arrays if c != "t"] + ["t"]:
+        tmp = os.path.join(path, f"{c}.tmp.npy")
+        np.save(tmp, np.ascontiguousarray(arrays[c]))
+        os.replace(tmp, os.path.join(path, f"{c}.npy"))
+
+
+def _merge(cached: dict, new: dict) -> dict:
+    # cached points from the first new timestamp on are replaced by the new ones
+    keep = cached["t"] < new["t"][0]
+    columns = list(dict.fromkeys(list(cached) + list(new)))
+    nan = lambda n: np.full(n, np.nan)
+    return {
+        c: np.concatenate(
+            [
+                cached[c][keep] if c in cached else nan(keep.sum()),
+                new[c] if c in new else nan(len(new["t"])),
+            ]
+        )
+        for c in columns
+    }
+
+
+#################### Fetching ####################
+def fetch(
+    metric: str,
+    asset: str = "BTC",
+    interval: str = "24h",
+    http: requests.Session = None,
+    root: str = CACHE_PATH,
+    api_key: str = API_KEY,
+) -> dict:
+    """
+    Columns of one series, only asking glassnode for points since the cached last one
+    The last cached point is fetched again since glassnode revises the latest point.
+    No request is made when the next point cannot be complete yet.
+
+    metric: "addresses/active_count" or https://api.glassnode.com/v1/metrics/addresses/active_count
+    asset: BTC, ETH
+    interval: 10m, 1h, 24h, 1w, 1month
+    http: shared session(), default a plain request
+    """
+    metric = metric_path(metric)
+    cached = read_cache(metric, asset, interval, root)
+    params = {"a": asset, "i": interval, "f": "JSON", "api_key": api_key}
+    if cached is not None and len(cached["t"]):
+        last = int(cached["t"][-1])
+        step = INTERVAL_SECONDS.get(interval)
+        if step is not None and time.time() < last + 2 * step:
+            return cached
+        params["s"] = last
+
+    res = (http or requests).get(BASE_URL + metric, params=params, timeout=60)
+    res.raise_for_status()
+    new = parse(res.text)
+    if not len(new["t"]):
+        return cached if cached is not None else new
+
+    arrays = new if cached is None else _merge(cached, new)
+    _write_cache(metric, asset, interval, arrays, root)
+    return arrays
+
+
+def fetch_many(
+    metrics: list,
+    assets: list = ("BTC",),
+    interval: str = "24h",
+    max_workers: int = 16,
+    root: str = CACHE_PATH,
+    api_key: str = API_KEY,
+) -> dict:
+    """
+    fetch() every metric of every asset concurrently over one pooled session
+    returns {(metric, asset): pd.DataFrame indexed by "t"}, failed series are printed
+    and left out
+    """
+    http = session(max_workers)
+    frames = {}
+    failed = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch, metric, asset, interval, http, root, api_key): (
+                metric_path(metric),
+                asset,
+            )
+            for metric in metrics
+            for asset in assets
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                frames[futures[future]] = to_frame(future.result())
+            except Exception as e:
+                failed[futures[future]] = repr(e)
+    for key, error in failed.items():
+        print(f"{key} failed: {error}")
+    return frames
 
 
 def galssnode_data_downloader(
@@ -22,21 +224,33 @@ def galssnode_data_downloader(
     url: https://api.glassnode.com/v1/metrics/addresses/active_count
     asset symbol: BTC, ETH
     frequency interval: 1h, 24h, 10m
+
+    Downloads the full history every call, fetch() only asks for new points
     """
-    API_KEY = ""
     res = requests.get(
         url,
         params={"a": symbol, "api_key": API_KEY, "i": frequency, "f": "JSON"},
     )
-    return pd.read_json(res.text, convert_dates=["t"]).set_index("t")
+    res.raise_for_status()
+    return to_frame(parse(res.text))
 
 
 if __name__ == "__main__":
-    df = galssnode_data_downloader(
-        r"https://api.glassnode.com/v1/metrics/addresses/active_count"
-    )
+    df = to_frame(fetch("addresses/active_count"))
 
     df.plot()
 
     # Save to csv
     df.to_csv(r"D:\Glassnode Data\btc_active_addresses.csv")
+
+    # Daily refresh of many series, only the new points are downloaded
+    frames = fetch_many(
+        [
+            "addresses/active_count",
+            "addresses/new_non_zero_count",
+            "indicators/sopr",
+            "market/mvrv_z_score",
+            "transactions/transfers_volume_sum",
+        ],
+        assets=["BTC", "ETH"],
+    )
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 29 09:14:52 2026
+
+@author: Jeffrey
+"""
+
+import concurrent.futures
+import glob, os
+import json
+import logging
+import math
+import time
+
+import pandas as pd
+import numpy as np
+
+from tick_buffer import BAR_COLUMNS
+
+CACHE_PATH = r"D:\IBKR Data\bars"
+OVERLAP = 5  # cached bars requested again to detect revisions of adjusted prices
+
+_UNIT_SECONDS = {"sec": 1, "min": 60, "hour": 3600, "day": 86400, "week": 604800}
+_DURATION_SECONDS = {"S": 1, "D": 86400, "W": 604800, "M": 2592000, "Y": 31536000}
+
+
+#################### Durations ####################
+def bar_seconds(barSizeSetting: str) -> int:
+    """
+    "5 mins" -> 300, "1 day" -> 86400, "1 month" -> 30 days
+    """
+    n, unit = barSizeSetting.split()
+    unit = unit.rstrip("s")
+    return int(n) * _UNIT_SECONDS.get(unit, 2592000)
+
+
+def duration_seconds(durationStr: str) -> int:
+    n, unit = durationStr.split()
+    return int(n) * _DURATION_SECONDS[unit]
+
+
+def tail_duration(since: pd.Timestamp, barSizeSetting: str, now: float = None) -> str:
+    """
+    Smallest durationStr covering the bars from since until now
+    """
+    now = time.time() if now is None else now
+    seconds = now - since.timestamp() + bar_seconds(barSizeSetting)
+    if seconds < 86400:
+        return f"{math.ceil(seconds)} S"
+    days = math.ceil(seconds / 86400) + 1
+    if days > 365:
+        return f"{math.ceil(days / 365)} Y"
+    return f"{days} D"
+
+
+#################### Cache ####################
+def cache_path(
+    contract,
+    barSizeSetting: str,
+    whatToShow: str = "ADJUSTED_LAST",
+    useRTH: int = 1,
+    root: str = CACHE_PATH,
+) -> str:
+    # {root}/{symbol}_{secType}_{exchange}_{currency}/{barSize}/{whatToShow}_{RTH|ALL}
+    name = "_".join(
+        str(field)
+        for field in [
+            contract.symbol,
+            contract.secType,
+            contract.exchange,
+            contract.currency,
+        ]
+    )
+    return os.path.join(
+        root,
+        name,
+        barSizeSetting.replace(" ", ""),
+        f"{whatToShow}_{'RTH' if useRTH else 'ALL'}",
+    )
+
+
+# {path}/meta.json: {"generation": id of the column files, "durationStr", "updated"}
+# {path}/{column}.{generation}.npy for "time" and BAR_COLUMNS
+def read(path: str) -> tuple:
+    """
+    (bars pd.DataFrame indexed by utc time, meta dict) cached under path, (None, None)
+    if nothing is there. Only the columns of the generation in meta.json are read, an
+    interrupted write leaves the previous one
+    """
+    file = os.path.join(path, "meta.json")
+    if not os.path.exists(file):
+        return None, None
+    with open(file) as f:
+        meta = json.load(f)
+    try:
+        arrays = {
+            c: np.load(os.path.join(path, f"{c}.{meta['generation']}.npy"))
+            for c in BAR_COLUMNS + ["time"]
+        }
+    except (KeyError, FileNotFoundError):  # older layout or removed by a writer
+        return None, None
+    index = pd.to_datetime(arrays.pop("time"), utc=True).rename("time")
+    return pd.DataFrame({c: arrays[c] for c in BAR_COLUMNS}, index=index), meta
+
+
+def write(path: str, bars: pd.DataFrame, meta: dict):
+    """
+    One .npy per column under a new generation, committed by replacing meta.json
+    through a temporary file, the previous generation is removed after that
+    """
+    os.makedirs(path, exist_ok=True)
+    generation = f"{time.time_ns():x}"
+    arrays = {c: bars[c].to_numpy(np.float64) for c in BAR_COLUMNS}
+    arrays["time"] = bars.index.asi8
+    for c in BAR_COLUMNS + ["time"]:
+        np.save(os.path.join(path, f"{c}.{generation}.npy"), arrays[c])
+    file = os.path.join(path, "meta.json")
+    with open(file + ".tmp", "w") as f:
+        json.dump({**meta, "generation": generation}, f)
+    os.replace(file + ".tmp", file)
+    for f in glob.glob(os.path.join(path, "*.npy")):
+        if not f.endswith(f".{generation}.npy"):
+            os.remove(f)
+
+
+def merge(
+    cached: pd.DataFrame, tail: pd.DataFrame, tolerance: float = 1e-6
+) -> pd.DataFrame:
+    """
+    cached bars followed by the newly downloaded tail, the tail replacing the bars it
+    covers (the last cached bar may have been incomplete)
+    returns None when the bars both hold before the last cached one differ, ie the
+    history was re-adjusted for a dividend or split and has to be downloaded again
+    """
+    common = cached.index[:-1].intersection(tail.index)
+    if not len(common):
+        return None  # no overlap to verify the cache against
+    prices = ["open", "high", "low", "close"]
+    old = cached.loc[common, prices].to_numpy()
+    new = tail.loc[common, prices].to_numpy()
+    if not np.allclose(old, new, rtol=tolerance, atol=0.0):
+        return None
+    return pd.concat([cached[cached.index < tail.index[0]], tail[BAR_COLUMNS]])
+
+
+#################### Requests ####################
+def request(
+    bot,
+    ticker: str,
+    durationStr: str,
+    barSizeSetting: str,
+    whatToShow: str = "ADJUSTED_LAST",
+    useRTH: int = 1,
+    overlap: int = OVERLAP,
+    root: str = CACHE_PATH,
+) -> concurrent.futures.Future:
+    """
+    IBKRBot.request_klines through the cache: only the bars since the last cached
+    ones (and overlap bars before, to check for revisions) are asked from TWS.
+    Everything is downloaded again when nothing is cached yet, when durationStr goes
+    further back than what is cached, or when the overlap shows a revision
+
+    returns concurrent.futures.Future resolved with every cached bar (also put in
+    kline_data), or failed with the error of the request. Its request attribute is the
+    request_klines future in flight, see IBKRBot.cancel_klines
+    """
+    path = cache_path(
+        bot.contract_details[ticker][1], barSizeSetting, whatToShow, useRTH, root
+    )
+    cached, meta = read(path)
+    result = concurrent.futures.Future()
+
+    def done(bars: pd.DataFrame, duration: str):
+        if result.done():
+            return  # given up on, see IBKRBot.cancel_klines
+        write(path, bars, {"durationStr": duration, "updated": time.time()})
+        bot.kline_data[ticker] = bars
+        result.set_result(bars)
+
+    def on_full(future):
+        try:
+            done(future.result(), durationStr)
+        except Exception as e:
+            result.set_exception(e)
+
+    def full():
+        result.request = bot.request_klines(
+            ticker, durationStr, barSizeSetting, whatToShow=whatToShow, useRTH=useRTH
+        )
+        result.request.add_done_callback(on_full)
+
+    def on_tail(future):
+        try:
+            tail = future.result()
+            merged = cached if tail is None else merge(cached, tail)
+            if merged is None:
+                logging.debug("%s %s cache revised, downloading again", ticker, path)
+                full()
+            else:
+                done(merged, meta["durationStr"])
+        except Exception as e:
+            result.set_exception(e)
+
+    if (
+        cached is None
+        or len(cached) <= overlap
+        or duration_seconds(durationStr) > duration_seconds(meta["durationStr"])
+    ):
+        full()
+    else:
+        result.request = bot.request_klines(
+            ticker,
+            tail_duration(cached.index[-overlap - 1], barSizeSetting),
+            barSizeSetting,
+            whatToShow=whatToShow,
+            useRTH=useRTH,
+        )
+        result.request.add_done_callback(on_tail)
+    return result
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 08:57:12 2026
+
+@author: Jeffrey
+"""
+
+import logging
+import math
+import threading
+import time
+
+import pandas as pd
+import numpy as np
+
+from order_manager import ManagedOrder
+
+# tickPrice / tickSize types, https://interactivebrokers.github.io/tws-api/tick_types.html
+BID, ASK, LAST, VOLUME = 1, 2, 4, 8
+
+
+#################### Schedules ####################
+class TWAP:
+    """
+    Equal slices over minutes, each slice is due from the start of its interval
+    (slices=minutes: one slice a minute like the former minute loop)
+    """
+
+    def __init__(self, minutes: float, slices: int = None):
+        self.seconds = minutes * 60
+        self.slices = max(int(slices or math.ceil(minutes)), 1)
+
+    def due(self, parent: "ParentOrder", now: float) -> float:
+        """
+        fraction of the parent quantity that should be done by now
+        """
+        elapsed = now - parent.start
+        if elapsed >= self.seconds:
+            return 1.0
+        return (int(elapsed / self.seconds * self.slices) + 1) / self.slices
+
+    def finished(self, parent: "ParentOrder", now: float) -> bool:
+        return now - parent.start >= self.seconds
+
+
+class VWAP(TWAP):
+    """
+    Slices weighted by the expected volume of each interval, see volume_profile()
+    profile: weights of the consecutive intervals of minutes, default equal (TWAP)
+    """
+
+    def __init__(self, minutes: float, profile=None):
+        profile = (
+            np.ones(max(int(math.ceil(minutes)), 1)) if profile is None else profile
+        )
+        profile = np.asarray(profile, dtype=np.float64)
+        super().__init__(minutes, len(profile))
+        self.cumulative = np.cumsum(profile) / profile.sum()
+
+    def due(self, parent: "ParentOrder", now: float) -> float:
+        elapsed = now - parent.start
+        if elapsed >= self.seconds:
+            return 1.0
+        return float(self.cumulative[int(elapsed / self.seconds * self.slices)])
+
+
+class POV:
+    """
+    Participate in rate of the volume the market trades from the start, measured from
+    the VOLUME ticks of reqMktData. Finishes aggressively after max_minutes if given
+    """
+
+    def __init__(self, rate: float, max_minutes: float = None):
+        self.rate = rate
+        self.seconds = None if max_minutes is None else max_minutes * 60
+
+    def due(self, parent: "ParentOrder", now: float) -> float:
+        if self.finished(parent, now):
+            return 1.0
+        return min(self.rate * parent.market_volume / parent.quantity, 1.0)
+
+    def finished(self, parent: "ParentOrder", now: float) -> bool:
+        return self.seconds is not None and now - parent.start >= self.seconds
+
+
+def volume_profile(
+    bars: pd.DataFrame,
+    start: str = "09:30",
+    minutes: int = 390,
+    buckets: int = 13,
+    time_zone: str = "America/New_York",
+) -> np.ndarray:
+    """
+    Average share of the volume traded in each of buckets equal intervals of minutes
+    from start (exchange time), from intraday kline_data, ie 30 days of "5 mins" bars
+    returns weights for VWAP(minutes, profile)
+    """
+    local = bars.index.tz_convert(time_zone)
+    h, m = map(int, start.split(":"))
+    minute = local.hour * 60 + local.minute - (h * 60 + m)
+    inside = (minute >= 0) & (minute < minutes)
+    bucket = (minute[inside] * buckets) // minutes
+    volume = bars["volume"].to_numpy()[inside]
+    profile = np.bincount(bucket, weights=volume, minlength=buckets)[:buckets]
+    if profile.sum() <= 0:
+        return np.ones(buckets)
+    return profile / profile.sum()
+
+
+#################### Parent Orders ####################
+class ParentOrder:
+    """
+    One execution worked by ExecutionEngine through a single resting child limit order
+    that is amended (quantity and price) as the schedule and the quote move
+
+    arrival_price: mid (or last) when the parent was created, the slippage benchmark
+    """
+
+    def __init__(self, ticker: str, side: str, quantity: float, schedule):
+        self.ticker = ticker
+        self.side = side
+        self.quantity = float(quantity)
+        self.schedule = schedule
+        self.start = time.time()
+        self.arrival_price = None
+        self.child = None  # working ManagedOrder
+        self.child_filled = 0.0  # shares of child counted in filled, see _on_fill
+        self.children = []  # every ManagedOrder placed
+        self.filled = 0.0
+        self.cost = 0.0
+        self.market_volume = 0.0
+        self.status = "Working"
+        self.last_amend = 0.0
+        self._done = threading.Event()
+
+    @property
+    def sign(self) -> int:
+        return 1 if self.side == "BUY" else -1
+
+    @property
+    def avg_price(self) -> float:
+        return self.cost / self.filled if self.filled else np.nan
+
+    @property
+    def slippage_bps(self) -> float:
+        """
+        Cost against the arrival price in basis points, positive when paying more
+        (buying higher / selling lower) than the price on arrival
+        """
+        if not self.filled or not self.arrival_price:
+            return np.nan
+        return self.sign * (self.avg_price / self.arrival_price - 1) * 1e4
+
+    @property
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def report(self) -> dict:
+        return {
+            "Ticker": self.ticker,
+            "Side": self.side,
+            "Schedule": type(self.schedule).__name__,
+            "Quantity": self.quantity,
+            "Filled": self.filled,
+            "Status": self.status,
+            "Arrival price": self.arrival_price,
+            "Avg price": self.avg_price,
+            "Slippage bps": self.slippage_bps,
+            "Child orders": len(self.children),
+            "Seconds": time.time() - self.start,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"ParentOrder({self.side} {self.ticker} {self.filled}/{self.quantity} "
+            f"{type(self.schedule).__name__} {self.status})"
+        )
+
+
+#################### Engine ####################
+class ExecutionEngine:
+    """
+    Works any number of parent orders, on any tickers, at the same time.
+    Each parent keeps at most one child limit order resting at the near touch (bid to
+    buy, ask to sell). Ticks re-price it and fills re-size it by amending the same order
+    id, the schedule falling behind resizes it, and once the schedule is over the rest
+    is sent through the spread. Nothing blocks: ticks and fills come from the reader
+    thread, a heartbeat thread only advances the time based schedules.
+
+    bot: IBKRBot streaming market data (stream_data / reqMktData) of the tickers
+    heartbeat: seconds between schedule checks without ticks
+    min_amend_interval: seconds between two amendments of a child, pacing
+    """
+
+    def __init__(self, bot, heartbeat: float = 1.0, min_amend_interval: float = 0.5):
+        self.bot = bot
+        self.heartbeat = heartbeat
+        self.min_amend_interval = min_amend_interval
+        self.parents = []
+        self.quotes = {}  # {ticker: {BID: price, ASK: price, LAST: price}}
+        self._volume = {}  # {ticker: last cumulative VOLUME tick}
+        self._by_child = {}  # {order_id: ParentOrder}
+        self._lock = threading.RLock()
+        self._thread = None
+        bot.subscribe("tick", self._on_tick)
+        bot.subscribe("tick_size", self._on_tick_size)
+        bot.subscribe("order_status", self._on_order_status)
+        bot.orders.on_fill(self._on_fill)
+
+    #################### Parent Orders ####################
+    def execute(self, ticker: str, side: str, quantity: float, schedule) -> ParentOrder:
+        """
+        Start working a parent order
+        side: {"BUY", "SELL"}
+        schedule: TWAP(minutes), VWAP(minutes, profile) or POV(rate)
+        returns ParentOrder, .wait() for the end and .report() for the slippage
+        """
+        parent = ParentOrder(ticker, side, abs(quantity), schedule)
+        parent.arrival_price = self._mid(ticker)
+        with self._lock:
+            self.parents.append(parent)
+            self._step(parent)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return parent
+
+    def cancel(self, parent: ParentOrder):
+        with self._lock:
+            if parent.child is not None:
+                self.bot.orders.cancel(parent.child.order_id)
+            self._finish(parent, "Cancelled")
+
+    def active(self, ticker: str = None) -> list:
+        return [
+            p
+            for p in self.parents
+            if not p.is_done and (ticker is None or p.ticker == ticker)
+        ]
+
+    def report(self) -> pd.DataFrame:
+        """
+        One row per parent order with its arrival price slippage
+        """
+        return pd.DataFrame([p.report() for p in self.parents])
+
+    #################### Pricing ####################
+    def _mid(self, ticker: str) -> float:
+        quote = self.quotes.get(ticker, {})
+        if BID in quote and ASK in quote:
+            return (quote[BID] + quote[ASK]) / 2
+        return quote.get(LAST, self.bot.last_price.get(ticker))
+
+    def _price(self, parent: ParentOrder, aggressive: bool) -> float:
+        """
+        near touch while on schedule, far touch to catch up once the schedule is over
+        """
+        quote = self.quotes.get(parent.ticker, {})
+        buy = parent.side == "BUY"
+        side = (ASK if buy else BID) if aggressive else (BID if buy else ASK)
+        return quote.get(side, quote.get(LAST, self.bot.last_price.get(parent.ticker)))
+
+    #################### Scheduling ####################
+    def _step(self, parent: ParentOrder, tick: bool = False):
+        """
+        Bring the child order of a parent in line with its schedule and the quote
+        tick: stepped by a tick, the orders it sends are timed from it by bot.monitor
+        """
+        if parent.is_done:
+            return
+        if parent.filled >= parent.quantity:
+            self._finish(parent, "Filled")
+            return
+        child = parent.child
+        if child is not None and (child.is_done or child.remaining <= 0):
+            if child.status == "Inactive":  # rejected, see OrderManager._on_error
+                logging.debug("%s child rejected %s", parent, child.error)
+                self._finish(parent, "Inactive")
+                return
+            if child.filled < child.reported_filled:
+                return  # cancelled with executions on the way, due would over-fill
+            child = parent.child = None
+            parent.child_filled = 0.0
+
+        now = time.time()
+        due = math.ceil(parent.schedule.due(parent, now) * parent.quantity - 1e-9)
+        due = min(due, parent.quantity) - parent.filled
+        if due <= 0:
+            return
+        price = self._price(parent, parent.schedule.finished(parent, now))
+        if price is None:
+            return  # no quote yet
+
+        if child is None:
+            if not self.bot.orders.has_next_id:
+                return  # not connected yet
+            if tick:
+                self.bot.monitor.signal(parent.ticker)
+            order = self.bot._limit_order(parent.side, due, price)
+            contract = self.bot.contract_details[parent.ticker][1]
+            child = self.bot.orders.submit(contract, order)
+            parent.child = child
+            parent.children.append(child)
+            parent.last_amend = now
+            self._by_child[child.order_id] = parent
+            return
+
+        # child.filled moves on the reader thread before _on_fill runs, child_filled
+        # moves with parent.filled so due never counts the same shares twice
+        quantity = parent.child_filled + due
+        if (
+            quantity != child.order.totalQuantity or price != child.order.lmtPrice
+        ) and now - parent.last_amend >= self.min_amend_interval:
+            parent.last_amend = now
+            if tick:
+                self.bot.monitor.signal(parent.ticker)
+            self.bot.orders.modify(child.order_id, quantity, price)
+
+    def _finish(self, parent: ParentOrder, status: str):
+        parent.status = status
+        parent._done.set()
+
+    def _run(self):
+        # heartbeat, time based schedules move on without ticks
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                active = self.active()
+                if not active:
+                    self._thread = None
+                    return
+                for parent in active:
+                    self._step(parent)
+
+    #################### Callbacks ####################
+    def _on_tick(self, reqId: int, tickType: int, price: float):
+        if reqId >= len(self.bot._tickers) or price <= 0:
+            return
+        ticker = self.bot._tickers[reqId]
+        self.quotes.setdefault(ticker, {})[tickType] = price
+        with self._lock:
+            for parent in self.active(ticker):
+                if parent.arrival_price is None:
+                    parent.arrival_price = self._mid(ticker)
+                self._step(parent, tick=True)
+
+    def _on_tick_size(self, reqId: int, tickType: int, size):
+        if tickType != VOLUME or reqId >= len(self.bot._tickers):
+            return
+        ticker = self.bot._tickers[reqId]
+        size = float(size)
+        previous = self._volume.get(ticker)
+        self._volume[ticker] = size
+        if previous is None or size <= previous:
+            return
+        with self._lock:
+            for parent in self.active(ticker):
+                parent.market_volume += size - previous
+                self._step(parent)
+
+    def _on_fill(self, managed: ManagedOrder, execution):
+        with self._lock:
+            parent = self._by_child.get(managed.order_id)
+            if parent is None:
+                return
+            shares = float(execution.shares)
+            parent.filled += shares
+            if managed is parent.child:
+                parent.child_filled += shares
+            parent.cost += shares * float(execution.price)
+            self._step(parent)
+
+    def _on_order_status(self, orderId: int, status: str, *args):
+        with self._lock:
+            parent = self._by_child.get(orderId)
+            if parent is not None:
+                self._step(parent)
+
+
+if __name__ == "__main__":
+    from ibkr_bot import IBKRBot, websocket_connection
+
+    bot = IBKRBot(tickers=["SPY", "QQQ", "IWM"])
+    threading.Thread(
+        target=websocket_connection, args=[bot, "127.0.0.1", 4002, 3], daemon=True
+    ).start()
+    bot.orders.set_next_id(bot.request_order_id().result())  # wait for the connection
+    bot.stream_data()
+    spy_5m = bot.request_klines("SPY", "30 D", "5 mins", whatToShow="TRADES").result()
+
+    parents = [
+        bot.execution.execute(
+            "SPY", "BUY", 300, VWAP(30, volume_profile(spy_5m, "15:30", 30, 6))
+        ),
+        bot.execution.execute("QQQ", "SELL", 200, TWAP(10)),
+        bot.execution.execute("IWM", "BUY", 500, POV(0.05, max_minutes=30)),
+    ]
+    for parent in parents:
+        parent.wait()
+    print(bot.execution.report())
+    bot.close()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 24 10:12:44 2026
+
+@author: Jeffrey
+"""
+
+import asyncio
+import threading
+
+import pandas as pd
+
+from ibkr_bot import IBKRBot, REAL_TIME_BARS_REQ_ID
+
+
+class Stream:
+    """
+    Async iterator over the events of a topic of IBKRBot.subscribe, as tuples of args
+    Subscribed from creation, so no event is missed between a request and the first
+    iteration, until aclose() or the end of an async with block
+
+    maxsize: bound the backlog, the oldest event is dropped when a consumer lags
+    """
+
+    def __init__(self, bot: IBKRBot, topic: str, match=None, maxsize: int = 0):
+        self._bot = bot
+        self._topic = topic
+        self._match = match
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize)
+        bot.subscribe(topic, self._listener)
+
+    def _listener(self, *args):
+        # reader thread
+        if self._match is None or self._match(*args):
+            self._loop.call_soon_threadsafe(self._put, args)
+
+    def _put(self, args: tuple):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(args)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> tuple:
+        return await self._queue.get()
+
+    async def aclose(self):
+        self._bot.unsubscribe(self._topic, self._listener)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+class AsyncIBKR:
+    """
+    asyncio facade over IBKRBot
+
+    Request / response pairs are awaitables, streams are async iterators fed from the
+    reader thread with loop.call_soon_threadsafe, nothing blocks the event loop.
+    One loop can drive many tickers, and several bots (accounts / client ids) at once.
+
+    async def main():
+        ib = AsyncIBKR(IBKRBot(["SPY", "QQQ"]))
+        await ib.connect(port=4001, clientId=2)
+        bars = await ib.kline_download("5 Y", "1 day")
+        async with ib.ticks("SPY") as ticks:
+            async for reqId, tickType, price in ticks:
+                ...
+    """
+
+    def __init__(self, bot: IBKRBot):
+        self.bot = bot
+        self._thread = None
+
+    #################### Connection ####################
+    async def connect(
+        self, host: str = "127.0.0.1", port: int = 7497, clientId: int = 1
+    ) -> int:
+        """
+        Connect, start the reader thread and wait for the first nextValidId
+        returns the next valid order id
+        """
+        ready = self.next_event("order_id")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.bot.set_connection, host, port, clientId)
+        self._thread = threading.Thread(target=self.bot.run, daemon=True)
+        self._thread.start()
+        (order_id,) = await ready
+        return order_id
+
+    def close(self):
+        self.bot.close()
+
+    #################### Requests ####################
+    async def klines(
+        self, ticker: str, durationStr: str, barSizeSetting: str, **kwargs
+    ) -> pd.DataFrame:
+        """
+        Kline of one ticker, see IBKRBot.request_klines
+        """
+        return await asyncio.wrap_future(
+            self.bot.request_klines(ticker, durationStr, barSizeSetting, **kwargs)
+        )
+
+    async def kline_download(
+        self,
+        durationStr: str,
+        barSizeSetting: str,
+        tickers: list = None,
+        max_in_flight: int = 50,
+    ) -> dict:
+        """
+        Kline of every ticker concurrently
+        max_in_flight: simultaneous requests, TWS allows at most 50 open historical requests
+        returns {ticker: pd.DataFrame or the exception of a failed request}
+        """
+        tickers = self.bot._tickers if tickers is None else tickers
+        in_flight = asyncio.Semaphore(max_in_flight)
+
+        async def klines(ticker):
+            async with in_flight:
+                return await self.klines(ticker, durationStr, barSizeSetting)
+
+        results = await asyncio.gather(
+            *(klines(t) for t in tickers), return_exceptions=True
+        )
+        return dict(zip(tickers, results))
+
+    async def balance(self) -> pd.DataFrame:
+        await asyncio.wrap_future(self.bot.positions_ready())
+        return self.bot.positions_frame()
+
+    async def next_order_id(self) -> int:
+        return await asyncio.wrap_future(self.bot.request_order_id())
+
+    async def place_order(
+        self, ticker: str, side: str, type: str, quantity: float, price: float = None
+    ) -> int:
+        """
+        Place an order with an id allocated locally by IBKRBot.orders
+        side: {"BUY", "SELL"}, type: {"MARKET", "LIMIT"}
+        returns the order id, follow it with order_status() or bot.orders.orders[id]
+        """
+        if not self.bot.orders.has_next_id:
+            self.bot.orders.set_next_id(await self.next_order_id())
+        managed = self.bot.place_order(ticker, side, type, quantity, price)
+        return managed.order_id
+
+    def cancel_all_open_orders(self):
+        self.bot.reqGlobalCancel()
+
+    #################### Streams ####################
+    def next_event(self, topic: str, match=None) -> asyncio.Future:
+        """
+        Future resolved with the args of the next event of topic (see IBKRBot.subscribe)
+        for which match(*args) is true
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(args):
+            if not future.done():
+                future.set_result(args)
+
+        def listener(*args):
+            if match is None or match(*args):
+                self.bot.unsubscribe(topic, listener)
+                loop.call_soon_threadsafe(resolve, args)
+
+        self.bot.subscribe(topic, listener)
+        return future
+
+    def stream(self, topic: str, match=None, maxsize: int = 0) -> "Stream":
+        """
+        Stream of the events of topic (see IBKRBot.subscribe) for which match(*args) is true
+        """
+        return Stream(self.bot, topic, match, maxsize)
+
+    def ticks(self, ticker: str, request: bool = True, maxsize: int = 0):
+        """
+        Stream of (reqId, tickType, price) ticks of ticker
+        request: also start streaming market data of the ticker
+        """
+        reqId = self.bot.contract_details[ticker][0]
+        if request:
+            self.bot.reqMktData(
+                reqId, self.bot.contract_details[ticker][1], "", False, False, []
+            )
+        return self.stream("tick", lambda r, *_: r == reqId, maxsize)
+
+    def bars(self, ticker: str, request: bool = True, maxsize: int = 0):
+        """
+        Stream of (reqId, time, open, high, low, close, volume) 5 seconds bars of ticker
+        request: also start the real time bars of the ticker
+        """
+        reqId = REAL_TIME_BARS_REQ_ID + self.bot.contract_details[ticker][0]
+        if request:
+            self.bot.reqRealTimeBars(
+                reqId, self.bot.contract_details[ticker][1], 5, "TRADES", True, []
+            )
+        return self.stream("bar", lambda r, *_: r == reqId, maxsize)
+
+    def order_status(self, order_id: int = None):
+        """
+        Stream of (orderId, status, filled, remaining, avgFillPrice), of one order
+        or of every order
+        """
+        match = None if order_id is None else (lambda o, *_: o == order_id)
+        return self.stream("order_status", match)
+
+    async def wait_filled(self, order_id: int) -> tuple:
+        """
+        Wait until an order is filled or cancelled
+        returns its last (orderId, status, filled, remaining, avgFillPrice)
+        """
+        async with self.order_status(order_id) as events:
+            async for event in events:
+                if event[1] in ("Filled", "Cancelled", "ApiCancelled", "Inactive"):
+                    return event
+
+
+if __name__ == "__main__":
+
+    async def main():
+        ib = AsyncIBKR(IBKRBot(tickers=["SPY", "QQQ", "IWM"]))
+        await ib.connect("127.0.0.1", 4001, 2)
+
+        klines = await ib.kline_download("1 Y", "1 day")
+        print({ticker: len(bars) for ticker, bars in klines.items()})
+
+        async def watch(ticker):
+            async with ib.ticks(ticker) as ticks:
+                async for _, tickType, price in ticks:
+                    print(ticker, tickType, price)
+
+        tasks = [asyncio.create_task(watch(t)) for t in ["SPY", "QQQ", "IWM"]]
+        await asyncio.sleep(30)
+        for task in tasks:
+            task.cancel()
+        ib.close()
+
+    asyncio.run(main())
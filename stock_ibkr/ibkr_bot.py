@@ -5,21 +5,80 @@ Created on Thu Jul 27 12:23:06 2023
 @author: Jeffrey
 """
 
+import concurrent.futures
+import itertools
 import logging
-import threading
 import time
+from array import array
 from decimal import Decimal
 
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract, ContractDetails
+from ibapi.execution import Execution
 from ibapi.order import Order
+from ibapi.order_state import OrderState
 from ibapi.common import BarData, TickerId, TickAttrib
 from ibapi.ticktype import TickType
+from ibapi.message import OUT
+from ibapi.errors import SOCKET_EXCEPTION
+from ibapi.server_versions import MIN_SERVER_VER_ORDER_CONTAINER
 
 import pandas as pd
 import numpy as np
 
+from order_manager import OrderManager, ManagedOrder
+from execution import ExecutionEngine, ParentOrder, TWAP
+from tick_buffer import TickBuffer, BAR_COLUMNS
+import bar_cache
+from pacing import Pacer, MESSAGE_NAMES
+from latency import LatencyMonitor, TimedQueue
+
+POSITION_COLUMNS = [
+    "Account",
+    "Ticker",
+    "Contract ID",
+    "SecType",
+    "Strike",
+    "Call/Put",
+    "Expiry",
+    "Currency",
+    "Position",
+    "Avg cost",
+]
+
+# informational codes, never the failure of a request
+# 2104/2106/2158: data farm connection is OK, 10197: no market data in competing session
+# 202: order cancelled, 10147: order to cancel not found
+NOT_REQUEST_ERRORS = {10197, 2104, 2106, 2158, 10147, 202}
+
+# first reqId of the historical requests, one new id per request (see request_klines)
+HISTORICAL_REQ_ID = 1_000_000
+# reqId of the real time bars of a ticker, added to its market data reqId
+REAL_TIME_BARS_REQ_ID = 500_000
+
+
+def _execution_time(execution: Execution) -> float:
+    """
+    Unix time of an execution, "yyyymmdd  hh:mm:ss" in the time zone of TWS (this
+    machine) or followed by the name of the zone
+    """
+    day, clock, *zone = execution.time.split()
+    if zone:
+        return pd.Timestamp(f"{day} {clock}").tz_localize(zone[0]).timestamp()
+    return time.mktime(time.strptime(f"{day} {clock}", "%Y%m%d %H:%M:%S"))
+
+
+class IBKRRequestError(Exception):
+    """
+    Error reported by TWS for a pending request
+    """
+
+    def __init__(self, reqId: int, errorCode: int, errorString: str):
+        super().__init__(f"reqId {reqId} error {errorCode}: {errorString}")
+        self.reqId = reqId
+        self.errorCode = errorCode
+
 
 class IBKRBot(EClient, EWrapper):
     """
@@ -30,6 +89,8 @@ class IBKRBot(EClient, EWrapper):
     Call Option: 1000-1999
     Put Option: >=2000
     Option Data: x5xx
+    Real Time Bars: 500000 + Underlying Stock
+    Historical Data: >=1000000, one per request
 
     methods implemented in camelCase are overloaded from the api
     methods implemented in snake_case are utility functions
@@ -43,30 +104,45 @@ class IBKRBot(EClient, EWrapper):
     """
 
     def __init__(self, tickers: list):
+        # before EClient, its reset() times the reader queue
+        self.monitor = LatencyMonitor()
         super().__init__(self)
+        # every request goes out through the pacer, see sendMsg()
+        self.pacer = Pacer(
+            lambda msg: EClient.sendMsg(self, msg),
+            on_sent=self._on_sent,
+            on_error=self._on_send_error,
+        )
+        self.monitor.gauge(
+            "reader_queue_depth",
+            "messages read, not decoded yet",
+            lambda: self.msg_queue.qsize(),
+        )
+        self.monitor.gauge(
+            "pacer_depth", "requests waiting to be sent", self.pacer.depth
+        )
         self._tickers = tickers
         self._tickers = list(map(lambda x: x.upper(), self._tickers))
-        self._position = pd.DataFrame(
-            columns=[
-                "Account",
-                "Ticker",
-                "Contract ID",
-                "SecType",
-                "Strike",
-                "Call/Put",
-                "Expiry",
-                "Currency",
-                "Position",
-                "Avg cost",
-            ]
-        )
+        # position book kept current by the reqPositions subscription and fills
+        self._positions = {}  # {(account, conId): {POSITION_COLUMNS: value}}
+        self._positions_by_ticker = {}  # {ticker: set of (account, conId)}
+        self._positions_subscribed = False
+        self._exec_ids = set()  # fills already applied to the book
+        self._snapshots = {}  # {(account, conId): time.time() of its last position()}
         self.nextValidOrderId = -1
         self.simplePlaceOid = -1
         self.kline_data = {}  # OHLCV data
+        self._bars = {}  # {reqId: {column: buffer}} until historicalDataEnd
+        self._historical = {}  # {reqId: ticker} of the pending historical requests
+        self._historical_ids = itertools.count(HISTORICAL_REQ_ID)
         self.last_price = {}  # stream tick data
+        self.tick_buffer = TickBuffer()  # tick rings and live bars of stream_data
         self.contract_details = {}  # {ticker:str : [ReqID, Contract object]}
 
-        self.event = threading.Event()
+        self._requests = {}  # {reqId | "positions" | "order_id": Future}
+        self._listeners = {}  # {topic: [callback]} see subscribe()
+        self.orders = OrderManager(self)  # order ids and lifecycle of our orders
+        self.execution = ExecutionEngine(self)  # TWAP / VWAP / POV parent orders
 
         # initialisation
         for ticker in self._tickers:
@@ -90,7 +166,6 @@ class IBKRBot(EClient, EWrapper):
                 regulatorySnapshot=False,
                 mktDataOptions=[],
             )
-            time.sleep(1)
 
     def historicalData(self, reqId: int, bar: BarData):
         """
@@ -99,36 +174,21 @@ class IBKRBot(EClient, EWrapper):
         source: https://interactivebrokers.github.io/tws-api/historical_bars.html
                 https://interactivebrokers.github.io/tws-api/historical_limitations.html
         """
-        print("HistoricalData. ReqId:", reqId, "BarData.", bar)
-        if self._tickers[reqId] not in self.kline_data:
-            self.kline_data[self._tickers[reqId]] = pd.DataFrame(
-                {
-                    "time": bar.date,
-                    "open": bar.open,
-                    "high": bar.high,
-                    "low": bar.low,
-                    "close": bar.close,
-                    "volume": bar.volume,
-                },
-                index=[0],
-            )
-        else:
-            self.kline_data[self._tickers[reqId]] = pd.concat(
-                [
-                    self.kline_data[self._tickers[reqId]],
-                    pd.DataFrame(
-                        {
-                            "time": bar.date,
-                            "open": bar.open,
-                            "high": bar.high,
-                            "low": bar.low,
-                            "close": bar.close,
-                            "volume": bar.volume,
-                        },
-                        index=[len(self.kline_data[self._tickers[reqId]])],
-                    ),
-                ]
-            )
+        self.monitor.callback("historicalData")
+        if reqId not in self._historical:
+            return  # cancelled or given up, see cancel_klines
+        buffer = self._bars.get(reqId)
+        if buffer is None:
+            # growable typed columns, appending is amortised O(1)
+            buffer = {"time": []}
+            buffer.update({c: array("d") for c in BAR_COLUMNS})
+            self._bars[reqId] = buffer
+        buffer["time"].append(bar.date)
+        buffer["open"].append(bar.open)
+        buffer["high"].append(bar.high)
+        buffer["low"].append(bar.low)
+        buffer["close"].append(bar.close)
+        buffer["volume"].append(float(bar.volume))
 
     def historicalDataEnd(self, reqId: int, start: str, end: str):
         """
@@ -136,58 +196,193 @@ class IBKRBot(EClient, EWrapper):
         To handle data downloaded into pd.DataFrame, index is utc time
         """
         super().historicalDataEnd(reqId, start, end)
-        if reqId < 1000:  # Underlying Stocks
-            if len(self.kline_data[self._tickers[reqId]]["time"][0].split()) > 1:
-                # handle intraday data
-                time_zone = self.kline_data[self._tickers[reqId]]["time"][0].split()[-1]
-                self.kline_data[self._tickers[reqId]]["time"] = self.kline_data[
-                    self._tickers[reqId]
-                ]["time"].map(lambda x: x.rstrip(time_zone))
-                self.kline_data[self._tickers[reqId]]["time"] = pd.DatetimeIndex(
-                    self.kline_data[self._tickers[reqId]]["time"], tz=time_zone
-                )
-                self.kline_data[self._tickers[reqId]].set_index("time", inplace=True)
-                self.kline_data[self._tickers[reqId]] = self.kline_data[
-                    self._tickers[reqId]
-                ].tz_convert("utc")
-
-            else:
-                # handle interday data
-                self.kline_data[self._tickers[reqId]]["time"] = pd.to_datetime(
-                    self.kline_data[self._tickers[reqId]]["time"], utc=True
-                )
-                self.kline_data[self._tickers[reqId]].set_index("time", inplace=True)
-
+        self.monitor.callback("historicalDataEnd")
+        buffer = self._bars.pop(reqId, None)
+        ticker = self._historical.pop(reqId, None)
+        if ticker is None:
+            return  # cancelled or given up, see cancel_klines
+        bars = None if buffer is None else self._bars_frame(buffer)
+        if bars is not None:
+            self.kline_data[ticker] = bars
             logging.debug(
-                "HistoricalDataEnd. ticker: %s from %s to %s",
-                self._tickers[reqId],
-                start,
-                end,
+                "HistoricalDataEnd. ticker: %s from %s to %s", ticker, start, end
+            )
+        self._resolve(reqId, bars)
+
+    @staticmethod
+    def _bars_frame(buffer: dict) -> pd.DataFrame:
+        """
+        Private utility function to turn the buffers of one request into a pd.DataFrame, index is utc time
+        """
+        index = pd.Index(buffer["time"])
+        first = buffer["time"][0].split()
+        if len(first) > 1:
+            # handle intraday data, "yyyymmdd hh:mm:ss Time/Zone" with one zone per request
+            time_zone = first[-1]
+            index = pd.to_datetime(
+                index.str[: -len(time_zone)].str.strip(), format="%Y%m%d %H:%M:%S"
             )
-        self.event.set()
+            index = index.tz_localize(time_zone).tz_convert("utc")
+        else:
+            # handle interday data, "yyyymmdd"
+            index = pd.to_datetime(index, format="%Y%m%d", utc=True)
+
+        return pd.DataFrame(
+            {c: np.frombuffer(buffer[c], dtype=np.float64) for c in BAR_COLUMNS},
+            index=index.rename("time"),
+        )
+
+    def _request(self, reqId: int) -> concurrent.futures.Future:
+        """
+        Private utility function to register a pending request, resolved by its end callback or error()
+        """
+        future = concurrent.futures.Future()
+        self._requests[reqId] = future
+        return future
+
+    def _resolve(self, reqId: int, result=None):
+        """
+        Private utility function to complete a pending request with its result
+        """
+        future = self._requests.pop(reqId, None)
+        if future is not None and not future.done():
+            future.set_result(result)
 
-    def kline_download(self, durationStr: str, barSizeSetting: str):
+    def request_klines(
+        self,
+        ticker: str,
+        durationStr: str,
+        barSizeSetting: str,
+        endDateTime: str = "",
+        whatToShow: str = "ADJUSTED_LAST",
+        useRTH: int = 1,
+        cache: bool = False,
+    ) -> concurrent.futures.Future:
+        """
+        Utility function to request kline of one ticker without waiting
+        cache: keep the bars on disk (bar_cache) and only request the bars since the
+               last cached ones, up to endDateTime "" (now)
+        returns concurrent.futures.Future resolved with the pd.DataFrame (also put in
+        kline_data) by historicalDataEnd, or failed with IBKRRequestError. Give up on it
+        with cancel_klines. Its sent_at is the time.monotonic() the pacer sent it at
+        """
+        if cache and not endDateTime:
+            return bar_cache.request(
+                self, ticker, durationStr, barSizeSetting, whatToShow, useRTH
+            )
+        reqId = next(self._historical_ids)
+        future = self._request(reqId)
+        future.reqId = reqId
+        self._historical[reqId] = ticker
+        self.reqHistoricalData(
+            reqId=reqId,
+            contract=self.contract_details[ticker][1],
+            endDateTime=endDateTime,
+            durationStr=durationStr,
+            barSizeSetting=barSizeSetting,
+            whatToShow=whatToShow,
+            useRTH=useRTH,
+            formatDate=1,
+            keepUpToDate=False,
+            chartOptions=[],
+        )
+        return future
+
+    def cancel_klines(self, future: concurrent.futures.Future, error: Exception = None):
+        """
+        Utility function to give up on a future of request_klines (cached or not): its
+        request is cancelled, the future failed with error (TimeoutError by default) and
+        bars arriving after that are dropped, kline_data is left alone
+        """
+        error = TimeoutError("kline request cancelled") if error is None else error
+        inner = getattr(future, "request", None)  # current request of bar_cache
+        if inner is not None:
+            self.cancel_klines(inner, error)
+        reqId = getattr(future, "reqId", None)
+        if reqId is not None and self._historical.pop(reqId, None) is not None:
+            self._requests.pop(reqId, None)
+            self._bars.pop(reqId, None)
+            self.cancelHistoricalData(reqId)
+        if not future.done():
+            future.set_exception(error)
+
+    def kline_download(
+        self,
+        durationStr: str,
+        barSizeSetting: str,
+        tickers: list = None,
+        max_in_flight: int = 50,
+        timeout: float = None,
+        cache: bool = False,
+    ) -> dict:
         """
         Utility function to download kline for all tickers
 
+        Requests are kept in flight together, a universe takes about as long as its
+        slowest request instead of the sum of all of them
+
+        tickers: default all tickers of the bot
+        max_in_flight: simultaneous requests, TWS allows at most 50 open historical requests
+        timeout: seconds a request may take once sent, the time it waits in the pacer
+                 (historical pacing) does not count
+        cache: only download the bars missing from the on disk cache, see bar_cache
+
+        returns {ticker: exception} of the downloads that failed
+
         limitation: https://interactivebrokers.github.io/tws-api/historical_limitations.html
         interday data can download up to 20 years
         """
-        for ticker in self._tickers:
-            self.event.clear()
-            self.reqHistoricalData(
-                reqId=self.contract_details[ticker][0],
-                contract=self.contract_details[ticker][1],
-                endDateTime="",
-                durationStr=durationStr,
-                barSizeSetting=barSizeSetting,
-                whatToShow="ADJUSTED_LAST",
-                useRTH=1,
-                formatDate=1,
-                keepUpToDate=False,
-                chartOptions=[],
+        todo = iter(self._tickers if tickers is None else tickers)
+        in_flight = {}
+        failed = {}
+        request = lambda ticker: self.request_klines(
+            ticker, durationStr, barSizeSetting, cache=cache
+        )
+        for ticker in itertools.islice(todo, max_in_flight):
+            in_flight[request(ticker)] = ticker
+
+        while in_flight:
+            wait = timeout  # requests still in the pacer are checked again after it
+            for future, ticker in list(in_flight.items()):
+                # bar_cache futures are timed by the request they have in flight
+                sent_at = getattr(getattr(future, "request", future), "sent_at", None)
+                if timeout is None or sent_at is None or future.done():
+                    continue
+                left = sent_at + timeout - time.monotonic()
+                if left > 0:
+                    wait = min(wait, left)
+                    continue
+                del in_flight[future]
+                failed[ticker] = TimeoutError(f"{ticker} kline download timed out")
+                self.cancel_klines(future, failed[ticker])
+                ticker = next(todo, None)
+                if ticker is not None:
+                    in_flight[request(ticker)] = ticker
+            done, _ = concurrent.futures.wait(
+                in_flight, wait, concurrent.futures.FIRST_COMPLETED
             )
-            self.event.wait()
+            for future in done:
+                ticker = in_flight.pop(future)
+                if future.exception() is not None:
+                    failed[ticker] = future.exception()
+                    logging.debug(
+                        "kline download %s failed: %s", ticker, failed[ticker]
+                    )
+                ticker = next(todo, None)
+                if ticker is not None:
+                    in_flight[request(ticker)] = ticker
+        return failed
+
+    def live_bars(self, ticker: str, seconds: int = 60, partial: bool = True):
+        """
+        Utility function to read up to date bars without another request: the bars built
+        from stream_data ticks (1, 60 or 300 seconds) stitched onto kline_data[ticker]
+        when it holds bars of the same length, ie kline_download("2 D", "1 min")
+        partial: include the bar still being built
+        """
+        return self.tick_buffer.bars(
+            ticker, seconds, self.kline_data.get(ticker), partial
+        )
 
     def tickPrice(
         self, reqId: TickerId, tickType: TickType, price: float, attrib: TickAttrib
@@ -199,9 +394,136 @@ class IBKRBot(EClient, EWrapper):
         tickType: https://interactivebrokers.github.io/tws-api/tick_types.html
         """
         super().tickPrice(reqId, tickType, price, attrib)
+        now = self.monitor.callback("tickPrice")
         if reqId < 1000:  # Underlying Stocks
+            self.monitor.tick(self._tickers[reqId], now)
             if tickType == 4:
                 self.last_price[self._tickers[reqId]] = price
+            self.tick_buffer.on_price(self._tickers[reqId], tickType, price)
+        self._publish("tick", reqId, tickType, price)
+
+    def tickSize(self, reqId: TickerId, tickType: TickType, size: int):
+        """
+        wrapper function for reqMktData. this function handles streaming sizes (bid / ask / last / volume)
+        """
+        super().tickSize(reqId, tickType, size)
+        self.monitor.callback("tickSize")
+        if reqId < 1000:
+            self.tick_buffer.on_size(self._tickers[reqId], tickType, size)
+        self._publish("tick_size", reqId, tickType, size)
+
+    def realtimeBar(
+        self,
+        reqId: TickerId,
+        time: int,
+        open_: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: int,
+        wap: float,
+        count: int,
+    ):
+        """
+        wrapper function for reqRealTimeBars. this function gives 5 seconds bars
+
+        source: https://interactivebrokers.github.io/tws-api/realtime_bars.html
+        """
+        super().realtimeBar(reqId, time, open_, high, low, close, volume, wap, count)
+        self.monitor.callback("realtimeBar")
+        self._publish("bar", reqId, time, open_, high, low, close, volume)
+
+    def orderStatus(
+        self,
+        orderId: int,
+        status: str,
+        filled: float,
+        remaining: float,
+        avgFillPrice: float,
+        permId: int,
+        parentId: int,
+        lastFillPrice: float,
+        clientId: int,
+        whyHeld: str,
+        mktCapPrice: float,
+    ):
+        """
+        wrapper function for placeOrder / reqOpenOrders. this function gives every order status change
+
+        source: https://interactivebrokers.github.io/tws-api/order_submission.html
+        """
+        super().orderStatus(
+            orderId,
+            status,
+            filled,
+            remaining,
+            avgFillPrice,
+            permId,
+            parentId,
+            lastFillPrice,
+            clientId,
+            whyHeld,
+            mktCapPrice,
+        )
+        self.monitor.order_status(orderId, status)
+        self._publish("order_status", orderId, status, filled, remaining, avgFillPrice)
+
+    def openOrder(
+        self, orderId: int, contract: Contract, order: Order, orderState: OrderState
+    ):
+        """
+        wrapper function for placeOrder / reqOpenOrders. this function gives the open orders
+        """
+        super().openOrder(orderId, contract, order, orderState)
+        self.monitor.callback("openOrder")
+        self._publish("open_order", orderId, contract, order, orderState)
+
+    def execDetails(self, reqId: int, contract: Contract, execution: Execution):
+        """
+        wrapper function for fills and reqExecutions. this function gives every execution
+
+        source: https://interactivebrokers.github.io/tws-api/executions_commissions.html
+        """
+        super().execDetails(reqId, contract, execution)
+        self.monitor.callback("execDetails")
+        self.monitor.fill(execution.orderId)
+        if execution.execId not in self._exec_ids:
+            self._exec_ids.add(execution.execId)
+            self._apply_fill(contract, execution)
+        self._publish("execution", reqId, contract, execution)
+
+    def subscribe(self, topic: str, callback):
+        """
+        Utility function to call callback(*args) on every event of topic, from the reader thread
+        topics and args:
+            "tick": reqId, tickType, price
+            "tick_size": reqId, tickType, size
+            "bar": reqId, time, open, high, low, close, volume
+            "order_status": orderId, status, filled, remaining, avgFillPrice
+            "open_order": orderId, contract, order, orderState
+            "execution": reqId, contract, execution
+            "position": account, contract, position, avgCost
+            "order_id": orderId
+        callback must return quickly, it holds up every later message
+        """
+        self._listeners.setdefault(topic, []).append(callback)
+        return callback
+
+    def unsubscribe(self, topic: str, callback):
+        """
+        Utility function to stop calling a callback given to subscribe()
+        """
+        if callback in self._listeners.get(topic, []):
+            self._listeners[topic].remove(callback)
+
+    def _publish(self, topic: str, *args):
+        """
+        Private utility function to call the listeners of topic
+        """
+        listeners = self._listeners.get(topic)
+        if listeners:
+            for callback in tuple(listeners):
+                callback(*args)
 
     @staticmethod
     def _us_stock(ticker) -> Contract:
@@ -225,33 +547,65 @@ class IBKRBot(EClient, EWrapper):
         source: https://interactivebrokers.github.io/tws-api/positions.html
         """
         super().position(account, contract, position, avgCost)
-        position = {
-            "Account": str(account),
-            "Ticker": str(contract.symbol),
-            "Contract ID": str(contract.conId),
-            "SecType": str(contract.secType),
-            "Strike": float(contract.strike),
-            "Call/Put": str(contract.right),
-            "Expiry": str(contract.lastTradeDateOrContractMonth),
-            "Currency": str(contract.currency),
-            "Position": int(position),
-            "Avg cost": float(avgCost),
-        }
-
-        idx = self._position[
-            (self._position["Account"] == str(account))
-            & (self._position["Contract ID"] == str(contract.conId))
-        ].index
-
-        if idx.empty:
-            idx = len(self._position)
-            self._position = pd.concat(
-                [self._position, pd.DataFrame(position, index=[idx])]
-            )
-
-        else:
-            idx = idx[0]
-            self._position.update(pd.DataFrame(position, index=[idx]))
+        self.monitor.callback("position")
+        # authoritative, overwrites whatever fills were applied before
+        record = self._position_record(account, contract)
+        record["Position"] = int(position)
+        record["Avg cost"] = float(avgCost)
+        self._snapshots[(str(account), contract.conId)] = time.time()
+        self._publish("position", account, contract, record["Position"], avgCost)
+
+    def _position_record(self, account: str, contract: Contract) -> dict:
+        """
+        Private utility function to return the book entry of (account, conId), created flat if new
+        """
+        key = (str(account), contract.conId)
+        record = self._positions.get(key)
+        if record is None:
+            record = {
+                "Account": str(account),
+                "Ticker": str(contract.symbol),
+                "Contract ID": str(contract.conId),
+                "SecType": str(contract.secType),
+                "Strike": float(contract.strike),
+                "Call/Put": str(contract.right),
+                "Expiry": str(contract.lastTradeDateOrContractMonth),
+                "Currency": str(contract.currency),
+                "Position": 0,
+                "Avg cost": 0.0,
+            }
+            self._positions[key] = record
+            self._positions_by_ticker.setdefault(record["Ticker"], set()).add(key)
+        return record
+
+    def _apply_fill(self, contract: Contract, execution: Execution):
+        """
+        Private utility function to move the book by a fill as soon as it happens,
+        the position() update that follows confirms it. Fills executed before the last
+        position() of the contract (ie replayed by reqExecutions) are already in it and
+        skipped, to the second: a fill in the same second waits for its position()
+        """
+        snapshot = self._snapshots.get((str(execution.acctNumber), contract.conId))
+        if (
+            snapshot is not None
+            and execution.time
+            and _execution_time(execution) <= int(snapshot)
+        ):
+            return
+        record = self._position_record(execution.acctNumber, contract)
+        held = record["Position"]
+        change = int(execution.shares) * (1 if execution.side == "BOT" else -1)
+        new = held + change
+        if new == 0:
+            record["Avg cost"] = 0.0
+        elif held == 0 or (held > 0) != (new > 0):
+            # opened or flipped, the remainder is at the fill price
+            record["Avg cost"] = float(execution.price)
+        elif abs(new) > abs(held):
+            record["Avg cost"] = (
+                record["Avg cost"] * held + float(execution.price) * change
+            ) / new
+        record["Position"] = new
 
     def positionEnd(self):
         """
@@ -260,33 +614,66 @@ class IBKRBot(EClient, EWrapper):
         source: https://interactivebrokers.github.io/tws-api/positions.html
         """
         super().positionEnd()
+        self.monitor.callback("positionEnd")
         logging.debug("PositionEnd")
-        self.event.set()
+        self._resolve("positions", self.positions_frame())
+
+    def request_positions(self) -> concurrent.futures.Future:
+        """
+        Utility function to request the positions without waiting
+        returns concurrent.futures.Future resolved with the positions pd.DataFrame by positionEnd,
+        callers asking while a request is pending share it
+        """
+        future = self._requests.get("positions")
+        if future is None or future.done():
+            future = self._request("positions")
+            # reqPositions keeps streaming position() updates after positionEnd
+            self._positions_subscribed = True
+            self.reqPositions()
+        return future
+
+    def positions_frame(self) -> pd.DataFrame:
+        """
+        Utility function to return the position book as a pd.DataFrame
+        """
+        return pd.DataFrame(list(self._positions.values()), columns=POSITION_COLUMNS)
+
+    def positions_ready(self) -> concurrent.futures.Future:
+        """
+        Utility function to subscribe to positions once
+        returns concurrent.futures.Future done once the book holds the first positionEnd
+        """
+        if not self._positions_subscribed:
+            return self.request_positions()
+        future = self._requests.get("positions")
+        if future is None:
+            future = concurrent.futures.Future()
+            future.set_result(None)
+        return future
 
     def balance(self) -> pd.DataFrame:
         """
         Utility function to obtain account balance of all tickers
+        Only the first call waits for TWS, the book is kept current afterwards
         """
-        self.event.clear()
-        self.reqPositions()
-        self.event.wait()
-        return self._position
+        self.positions_ready().result()
+        return self.positions_frame()
 
-    def balance_single(self, ticker) -> int:
+    def balance_single(self, ticker, account: str = None) -> int:
         """
-        Utility function to return the current position of a single ticker
+        Utility function to return the current stock position of a single ticker, without a TWS round trip
+        account: default summed over every account
         """
         if ticker not in self._tickers:
             raise Exception("Ticker is not traded by this bot")
 
-        balance = self.balance()
-        if balance["Ticker"].str.contains(ticker).any():
-            current_position = balance[balance["Ticker"] == ticker]["Position"].values[
-                0
-            ]
-        else:
-            current_position = 0
-        return current_position
+        self.positions_ready().result()
+        return sum(
+            self._positions[key]["Position"]
+            for key in self._positions_by_ticker.get(ticker, ())
+            if self._positions[key]["SecType"] == "STK"
+            and (account is None or key[0] == account)
+        )
 
     def cancel_all_open_orders(self):
         """
@@ -295,7 +682,6 @@ class IBKRBot(EClient, EWrapper):
         source: https://interactivebrokers.github.io/tws-api/cancel_order.html
         """
         self.reqGlobalCancel()
-        time.sleep(1)
 
     def error(
         self,
@@ -310,12 +696,20 @@ class IBKRBot(EClient, EWrapper):
         source: https://interactivebrokers.github.io/tws-api/error_handling.html
         """
         # super().error(reqId, errorCode, errorString, advancedOrderRejectJson)
+        self.monitor.callback("error")
         logging.debug("Error. Id: %s Code: %s Mgs: %s", reqId, errorCode, errorString)
-        if errorCode in [10197, 2104, 2106, 10147, 202]:
-            pass
-        elif errorCode == 200:
+        self._publish("error", reqId, errorCode, errorString)
+        if errorCode in NOT_REQUEST_ERRORS or 2100 <= errorCode < 2200:
+            return
+        if errorCode == 200:
             logging.debug("No security definition has been found for the request")
 
+        self._historical.pop(reqId, None)
+        self._bars.pop(reqId, None)
+        future = self._requests.pop(reqId, None)
+        if future is not None and not future.done():
+            future.set_exception(IBKRRequestError(reqId, errorCode, errorString))
+
     @staticmethod
     def _limit_order(side, quantity, limit_price) -> Order:
         """
@@ -352,31 +746,39 @@ class IBKRBot(EClient, EWrapper):
         source: https://interactivebrokers.github.io/tws-api/order_submission.html
         """
         super().nextValidId(orderId)
+        self.monitor.callback("nextValidId")
         # logging.debug("setting nextValidOrderId: %d", orderId)
         self.nextValidOrderId = orderId
         logging.debug("NextValidId: %d", orderId)
-        self.event.set()
+        self._resolve("order_id", orderId)
+        self._publish("order_id", orderId)
+
+    def request_order_id(self) -> concurrent.futures.Future:
+        """
+        Utility function to request the next valid order id without waiting
+        returns concurrent.futures.Future resolved with the id by nextValidId
+        """
+        future = self._requests.get("order_id")
+        if future is None or future.done():
+            future = self._request("order_id")
+            self.reqIds(-1)
+        return future
 
     def place_order(
         self, ticker: str, side: str, type: str, quantity: float, price: float = None
-    ):
+    ) -> ManagedOrder:
         """
-        Utility function to place order
+        Utility function to place order, the order id is allocated locally by self.orders
         input:
             ticker
             side: {"BUY", "SELL"}
             type: {"MARKET", "LIMIT"}
             quantity
             price
+        returns ManagedOrder tracking the order, ie .wait(timeout), .status, .filled
 
         source: https://interactivebrokers.github.io/tws-api/order_submission.html
         """
-        self.event.clear()
-        self.reqIds(-1)
-        self.event.wait()
-
-        self.simplePlaceOid = self.nextValidOrderId
-
         if type == "MARKET":
             order = self._market_order(side, quantity)
 
@@ -385,8 +787,9 @@ class IBKRBot(EClient, EWrapper):
         else:
             raise Exception("Wrong Order Type")
 
-        self.placeOrder(self.simplePlaceOid, self.contract_details[ticker][1], order)
-        time.sleep(1)
+        managed = self.orders.submit(self.contract_details[ticker][1], order)
+        self.simplePlaceOid = managed.order_id
+        return managed
 
     def open_position(self, ticker: str, signal_now: int, unit_size: int, span: int):
         """
@@ -439,57 +842,35 @@ class IBKRBot(EClient, EWrapper):
         elif holding_position < 0:
             self._execution_algo(ticker, holding_position, "BUY", 1)
 
-    def _execution_algo(self, ticker: str, target_size: int, side: str, span: int):
-        """
-        Private utility function to control the mechanism to change position using TWAP
-        span = 1: using limit order to make position change immediately
+    def _execution_algo(
+        self,
+        ticker: str,
+        target_size: int,
+        side: str,
+        span: int,
+        timeout: float = None,
+    ) -> ParentOrder:
+        """
+        Private utility function to change position using TWAP, worked by self.execution
+        alongside any other parent order, only its own child order is ever amended or
+        cancelled. Blocks until the parent order is done, or cancels it after timeout
+        seconds (default span plus 5 minutes, ie no quotes to work it with)
+        span = 1: one slice, resting for a minute then crossing the spread
 
         input
             ticker
             target_size: unit of asset to change
             side: {'BUY', 'SELL'}
             span: time span in minute to make the change
+        returns ParentOrder, .report() gives the slippage against the arrival price
         TWAP: https://empirica.io/blog/twap-strategy/
         """
-        holding_position = self.balance_single(ticker)
-        initial_position = holding_position
-        target_per_minute = target_size / span
-
-        # Set target_position
-        if side == "BUY":
-            target_position = holding_position + target_size
-        elif side == "SELL":
-            target_position = holding_position - target_size
-
-        # TWAP
-        for minute in range(1, span + 1):
-            if side == "BUY":
-                minute_target = initial_position + target_per_minute * minute
-            elif side == "SELL":
-                minute_target = initial_position - target_per_minute * minute
-
-            start_time = time.time()
-
-            while holding_position != minute_target:
-                self.place_order(
-                    ticker,
-                    side,
-                    "LIMIT",
-                    abs(minute_target - holding_position),
-                    self.last_price[ticker],
-                )
-                time.sleep(10)
-                self.cancel_all_open_orders()
-                holding_position = self.balance_single(ticker)
-                time.sleep(1)
-
-            if (
-                holding_position == target_position
-            ):  # exit loop if target_position reached
-                break
-
-            if start_time + 60 > time.time():  # wait for next minute to execute again
-                time.sleep(start_time + 60 - time.time())
+        parent = self.execution.execute(ticker, side, abs(target_size), TWAP(span))
+        if not parent.wait(span * 60 + 300 if timeout is None else timeout):
+            logging.debug("%s timed out, cancelling", parent)
+            self.execution.cancel(parent)
+        logging.debug("%s", parent.report())
+        return parent
 
     @staticmethod
     def config_logging(logging, logging_level, log_file: str = None):
@@ -509,11 +890,68 @@ class IBKRBot(EClient, EWrapper):
             datefmt="%Y-%m-%d %H:%M:%S",
         )
 
+    def placeOrder(self, orderId: int, contract: Contract, order: Order):
+        """
+        EClient function to place or amend an order, timed from the last signal on the
+        contract until its first fill by self.monitor
+        """
+        self.monitor.order(orderId, contract.symbol)
+        super().placeOrder(orderId, contract, order)
+
+    def sendMsg(self, msg: str):
+        """
+        EClient function every request is sent with, queued to self.pacer which sends it
+        as soon as the pacing limits allow, orders first
+        """
+        self.monitor.request(msg)
+        self.pacer.submit(msg)
+
+    def _on_sent(self, msg: str):
+        """
+        Private utility function called by the pacer once msg is sent, starts the clock
+        of the historical requests (see kline_download)
+        """
+        if msg.startswith(f"{OUT.REQ_HISTORICAL_DATA}\0"):
+            future = self._requests.get(int(msg.split("\0", 2)[1]))
+            if future is not None:
+                future.sent_at = time.monotonic()
+
+    def _on_send_error(self, msg: str, e: Exception):
+        """
+        Private utility function called by the pacer when msg could not be sent, the
+        order or historical request it carries is failed through error()
+        """
+        fields = msg.split("\0")
+        message = int(fields[0])
+        if message == OUT.PLACE_ORDER:
+            # a version field before the order id on older servers
+            reqId = fields[
+                1 if self.serverVersion() >= MIN_SERVER_VER_ORDER_CONTAINER else 2
+            ]
+        elif message == OUT.REQ_HISTORICAL_DATA:
+            reqId = fields[1]
+        else:
+            return
+        self.error(
+            int(reqId),
+            SOCKET_EXCEPTION.code(),
+            f"sending {MESSAGE_NAMES[message]} failed: {e}",
+        )
+
+    def reset(self):
+        """
+        EClient function called on creation and disconnection, the reader queue is
+        replaced by one timing every message until its callback
+        """
+        super().reset()
+        self.msg_queue = TimedQueue(self.monitor.histograms["reader_queue"])
+
     def close(self):
         """
         Utility function to disconnect
         """
         self.disconnect()
+        self.pacer.close()
 
     def set_connection(
         self, host: str = "127.0.0.1", port: int = 7497, clientId: int = 1
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Nov  1 09:41:12 2026
+
+@author: Jeffrey
+"""
+
+import http.server
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from order_manager import TERMINAL_STATUS
+from pacing import MESSAGE_NAMES
+
+METRICS_PATH = r"D:\IBKR Data\metrics\ibkr_bot.prom"
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+HISTOGRAMS = ["tick_to_signal", "signal_to_order", "order_to_fill", "reader_queue"]
+
+
+#################### Histogram ####################
+class Histogram:
+    """
+    HDR style histogram of nanoseconds: exact below 2**(sub_bits + 1), above that every
+    power of 2 is split into 2**sub_bits buckets, so any value is kept within
+    1 / 2**sub_bits (0.8% by default) up to 2**max_bits ns (18 minutes)
+
+    record() is a few integer operations without a lock, a record racing another one
+    on the same histogram may be lost
+    """
+
+    def __init__(self, sub_bits: int = 7, max_bits: int = 40):
+        self.sub_bits = sub_bits
+        self._linear = 1 << (sub_bits + 1)
+        self._highest = (1 << max_bits) - 1
+        self.counts = [0] * (self._index(self._highest) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def _index(self, ns: int) -> int:
+        if ns < self._linear:
+            return ns
+        shift = ns.bit_length() - self.sub_bits - 1
+        return (shift << self.sub_bits) + (ns >> shift)
+
+    def _value(self, index: int) -> int:
+        # highest value of a bucket
+        if index < self._linear:
+            return index
+        shift = (index >> self.sub_bits) - 1
+        return ((index - (shift << self.sub_bits) + 1) << shift) - 1
+
+    def record(self, ns: int):
+        ns = min(max(ns, 0), self._highest)
+        self.counts[self._index(ns)] += 1
+        self.count += 1
+        self.sum += ns
+        if ns > self.max:
+            self.max = ns
+
+    def quantile(self, q: float) -> int:
+        """
+        ns below which q of the values are, within the precision of the buckets
+        """
+        if not self.count:
+            return 0
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, max(1, np.ceil(q * cumulative[-1]))))
+        return min(self._value(index), self.max)
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def prometheus(self, name: str, help: str) -> list:
+        """
+        Lines of a Prometheus summary in seconds
+        """
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} summary"]
+        lines += [
+            f'{name}{{quantile="{q}"}} {self.quantile(q) / 1e9:.9f}' for q in QUANTILES
+        ]
+        lines += [f"{name}_sum {self.sum / 1e9:.9f}", f"{name}_count {self.count}"]
+        return lines
+
+
+#################### Timed Queue ####################
+class TimedQueue(queue.Queue):
+    """
+    EClient.msg_queue keeping when the reader thread put each message, the time until
+    EClient.run() takes it out to decode is recorded into histogram
+    """
+
+    def __init__(self, histogram: Histogram, maxsize: int = 0):
+        self.histogram = histogram
+        super().__init__(maxsize)
+
+    def _put(self, item):
+        self.queue.append((time.perf_counter_ns(), item))
+
+    def _get(self):
+        put, item = self.queue.popleft()
+        self.histogram.record(time.perf_counter_ns() - put)
+        return item
+
+
+#################### Latency Monitor ####################
+class LatencyMonitor:
+    """
+    Timestamps and counts of the callbacks and requests of IBKRBot, and the latency
+    histograms (Histogram, in ns)
+        tick_to_signal: last tickPrice of a ticker to a signal() on it
+        signal_to_order: signal() to the next placeOrder of the ticker
+        order_to_fill: placeOrder to the first execution of the order
+        reader_queue: message read from the socket to its callback (TimedQueue)
+    Recording only reads the clock and updates dicts, exporting (prometheus, write,
+    serve) does the rest
+
+    Gauges are read at export, see gauge()
+    """
+
+    def __init__(self):
+        self.histograms = {name: Histogram() for name in HISTOGRAMS}
+        self.callback_count = {}  # {callback name: calls}
+        self.callback_time = {}  # {callback name: perf_counter_ns of the last call}
+        self.request_count = {}  # {OUT message id: requests}
+        self.request_time = {}  # {OUT message id: perf_counter_ns of the last one}
+        self.gauges = {}  # {name: (help, callable)}
+        self._ticks = {}  # {ticker: ns of the last tickPrice}
+        self._signals = {}  # {ticker: ns of the signal waiting for its order}
+        self._orders = {}  # {orderId: ns of the placeOrder waiting for its fill}
+        self._server = None
+
+    #################### Recording ####################
+    def callback(self, name: str) -> int:
+        """
+        Count and timestamp a callback, returns the timestamp
+        """
+        now = time.perf_counter_ns()
+        self.callback_count[name] = self.callback_count.get(name, 0) + 1
+        self.callback_time[name] = now
+        return now
+
+    def request(self, msg: str):
+        """
+        Count and timestamp an EClient message
+        """
+        message = int(msg[: msg.index("\0")])
+        self.request_count[message] = self.request_count.get(message, 0) + 1
+        self.request_time[message] = time.perf_counter_ns()
+
+    def tick(self, ticker: str, now: int):
+        self._ticks[ticker] = now
+
+    def signal(self, ticker: str):
+        """
+        A decision taken on ticker, timed from its last tick
+        """
+        now = time.perf_counter_ns()
+        tick = self._ticks.get(ticker)
+        if tick is not None:
+            self.histograms["tick_to_signal"].record(now - tick)
+        self._signals[ticker] = now
+
+    def order(self, orderId: int, ticker: str):
+        """
+        placeOrder, timed from the last signal on ticker. Amendments of an order
+        already placed are not timed again
+        """
+        now = time.perf_counter_ns()
+        signal = self._signals.pop(ticker, None)
+        if signal is not None:
+            self.histograms["signal_to_order"].record(now - signal)
+        self._orders.setdefault(orderId, now)
+
+    def fill(self, orderId: int):
+        placed = self._orders.pop(orderId, None)
+        if placed is not None:
+            self.histograms["order_to_fill"].record(time.perf_counter_ns() - placed)
+
+    def order_status(self, orderId: int, status: str):
+        self.callback("orderStatus")
+        if status == "Filled":
+            self.fill(orderId)
+        elif status in TERMINAL_STATUS:
+            self._orders.pop(orderId, None)
+
+    def gauge(self, name: str, help: str, read):
+        """
+        Export read() as name, ie the depth of a queue
+        """
+        self.gauges[name] = (help, read)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    #################### Export ####################
+    def prometheus(self, prefix: str = "ibkr") -> str:
+        """
+        Every metric in the Prometheus text format, times in seconds
+        """
+        # perf_counter_ns timestamps to unix time
+        offset = time.time() - time.perf_counter_ns() / 1e9
+        lines = []
+        for name, histogram in self.histograms.items():
+            lines += histogram.prometheus(
+                f"{prefix}_{name}_seconds", name.replace("_", " ")
+            )
+        for kind, counts, times, names in [
+            ("callback", self.callback_count, self.callback_time, {}),
+            ("request", self.request_count, self.request_time, MESSAGE_NAMES),
+        ]:
+            # copies, the reader thread keeps adding to them
+            times, counts = dict(times), dict(counts)
+            total, last = f"{prefix}_{kind}s_total", f"{prefix}_{kind}_last_seconds"
+            lines += [f"# HELP {total} {kind}s", f"# TYPE {total} counter"]
+            lines += [
+                f'{total}{{{kind}="{names.get(k, k)}"}} {n}' for k, n in counts.items()
+            ]
+            lines += [
+                f"# HELP {last} unix time of the last one",
+                f"# TYPE {last} gauge",
+            ]
+            lines += [
+                f'{last}{{{kind}="{names.get(k, k)}"}} {offset + t / 1e9:.6f}'
+                for k, t in times.items()
+            ]
+        for name, (help, read) in self.gauges.items():
+            lines += [
+                f"# HELP {prefix}_{name} {help}",
+                f"# TYPE {prefix}_{name} gauge",
+                f"{prefix}_{name} {read()}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str = METRICS_PATH):
+        """
+        Write prometheus() to path through a temporary file, for the node_exporter
+        textfile collector
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            f.write(self.prometheus())
+        os.replace(path + ".tmp", path)
+
+    def serve(self, port: int = 9108, host: str = "127.0.0.1"):
+        """
+        Serve prometheus() on http://host:port/metrics from a daemon thread
+        """
+        monitor = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = monitor.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+if __name__ == "__main__":
+    import itertools
+    import urllib.request
+
+    from ibkr_bot import IBKRBot
+    from tws_simulator import TWSSimulator
+
+    # a market order on every 20th last price against the simulator, then the metrics
+    # as Prometheus scrapes them
+    simulator = TWSSimulator(port=0, latency=0.001, ticks_per_s=50).start()
+    bot = IBKRBot(tickers=["SPY"])
+    bot.set_connection(port=simulator.port, clientId=1)
+    threading.Thread(target=bot.run, daemon=True).start()
+    bot.request_order_id().result(5)
+    bot.kline_download("5 D", "1 min")
+    ticks = itertools.count()
+
+    def on_tick(reqId, tickType, price):
+        if tickType == 4 and next(ticks) % 20 == 0:
+            bot.monitor.signal("SPY")
+            bot.place_order("SPY", "BUY", "MARKET", 100)
+
+    bot.subscribe("tick", on_tick)
+    bot.stream_data()
+    time.sleep(5)
+    bot.unsubscribe("tick", on_tick)
+
+    server = bot.monitor.serve(port=0)
+    url = f"http://127.0.0.1:{server.server_port}/metrics"
+    print(urllib.request.urlopen(url).read().decode())
+    bot.monitor.close()
+    bot.close()
+    simulator.stop()
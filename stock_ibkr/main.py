@@ -13,17 +13,24 @@ from ibkr_bot import IBKRBot, websocket_connection
 
 
 # Strategy
-def signals_spy() -> int:
+def signals_spy(bot: IBKRBot) -> int:
     """
     sum all signals together for SPY
+    indicators restart from their checkpoint, so only the new daily bars are processed
+    today's bar counts as it is now, it is only checkpointed once completed
     """
-    cumu_signals = 0
+    engine = strategies.spy_indicators()
+    values = strategies.update_indicators(bot, "SPY", engine, "1 day")
+    last = values.iloc[-1].to_dict() if len(values) else engine.last
+    close = bot.kline_data["SPY"]["close"].iloc[-1]
+    cumu_signals = strategies.sum_signals(close, last)
+    bot.monitor.signal("SPY")
 
-    return cumu_signals
+    return int(cumu_signals)
 
 
 if __name__ == "__main__":
-    bot = IBKRBot(tickers=[""])
+    bot = IBKRBot(tickers=["SPY"])
     connection_thread = threading.Thread(
         target=websocket_connection, args=[bot, "127.0.0.1", 4001, 2], daemon=True
     )
@@ -31,10 +38,10 @@ if __name__ == "__main__":
     time.sleep(1)
 
     bot.stream_data()
-    bot.kline_download("5 Y", "1 day")
 
-    signal_today = signals_spy()
+    signal_today = signals_spy(bot)
     print(str(date.today()) + "signal: " + str(signal_today))
     bot.open_position(ticker="SPY", signal_now=signal_today, unit_size=100, span=1)
 
+    bot.monitor.write()  # prometheus text file of the run
     bot.close()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 25 09:48:30 2026
+
+@author: Jeffrey
+"""
+
+import logging
+import threading
+import time
+
+from ibapi.contract import Contract
+from ibapi.execution import Execution
+from ibapi.order import Order
+
+# statuses after which an order never changes again
+TERMINAL_STATUS = {"Filled", "Cancelled", "ApiCancelled", "Inactive"}
+
+# error codes about an order, error() ids are shared with the reqIds of market data
+# (0, 1, ... see IBKRBot) so any other code on an order id is not about the order
+# 103: duplicate order id, 110: price does not conform to the tick size, 135: order
+# not found, 201: rejected, 202: cancelled, 203: security not allowed for the account,
+# 10147: order to cancel not found, 509: not sent (IBKRBot._on_send_error)
+ORDER_REJECTED = {103, 110, 135, 201, 202, 203, 10147, 509}
+# the amendment or cancel was refused, the order keeps working
+# 104: can't modify a filled order, 105: modification does not match the order,
+# 161: not in a cancellable state, 10148: order cannot be cancelled
+ORDER_ERRORS = ORDER_REJECTED | {104, 105, 161, 10148}
+
+
+class ManagedOrder:
+    """
+    Lifecycle of one order placed through OrderManager, updated from the reader thread
+    by openOrder / orderStatus / execDetails / error. filled, remaining and
+    avg_fill_price are the sum of the executions, status follows orderStatus
+
+    reported_filled: cumulative filled of the last orderStatus, executions can lag it
+    fills: list of (execId, shares, price, perf_counter when received)
+    submitted_at, acknowledged_at: perf_counter of placeOrder and of the first answer
+    """
+
+    def __init__(self, order_id: int, contract: Contract, order: Order):
+        self.order_id = order_id
+        self.contract = contract
+        self.order = order
+        self.status = "PendingSubmit"
+        self.filled = 0.0
+        self.reported_filled = 0.0
+        self.remaining = float(order.totalQuantity)
+        self.avg_fill_price = 0.0
+        self.fills = []
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.acknowledged_at = None
+        self._done = threading.Event()
+
+    @property
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until the order is filled, cancelled or rejected
+        returns False on timeout
+        """
+        return self._done.wait(timeout)
+
+    def __repr__(self) -> str:
+        return (
+            f"ManagedOrder({self.order_id} {self.order.action} {self.contract.symbol} "
+            f"{self.status} {self.filled}/{self.order.totalQuantity} @ {self.avg_fill_price})"
+        )
+
+
+class OrderManager:
+    """
+    Order ids are allocated locally from the nextValidId TWS sends on connection, so an
+    order costs one placeOrder message, no reqIds round trip and no sleep.
+    Every order placed through it is tracked from the callbacks of IBKRBot.subscribe and
+    fills are pushed to on_fill() listeners as soon as execDetails arrives.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.orders = {}  # {order_id: ManagedOrder}
+        self._next_id = -1
+        self._lock = threading.Lock()
+        self._fill_listeners = []
+        self._exec_ids = set()
+        bot.subscribe("order_id", self.set_next_id)
+        bot.subscribe("open_order", self._on_open_order)
+        bot.subscribe("order_status", self._on_order_status)
+        bot.subscribe("execution", self._on_execution)
+        bot.subscribe("error", self._on_error)
+
+    #################### Ids ####################
+    @property
+    def has_next_id(self) -> bool:
+        """
+        False until a nextValidId was received, next_id() raises until then
+        """
+        return self._next_id >= 0
+
+    def set_next_id(self, order_id: int):
+        """
+        Allocate from a nextValidId, ids already allocated are never given again
+        """
+        with self._lock:
+            self._next_id = max(self._next_id, order_id)
+
+    def next_id(self) -> int:
+        """
+        Allocate an order id, TWS sends the first nextValidId on connection
+        raises RuntimeError before that, waiting here would block the reader thread
+        when called from a callback: wait for bot.request_order_id() beforehand
+        """
+        if not self.has_next_id:
+            raise RuntimeError("no nextValidId received yet, not connected")
+        with self._lock:
+            order_id = self._next_id
+            self._next_id += 1
+        return order_id
+
+    #################### Orders ####################
+    def submit(self, contract: Contract, order: Order) -> ManagedOrder:
+        """
+        Place an order
+        returns its ManagedOrder, wait() on it or listen with on_fill()
+        """
+        managed = ManagedOrder(self.next_id(), contract, order)
+        self.orders[managed.order_id] = managed
+        self.bot.placeOrder(managed.order_id, contract, order)
+        return managed
+
+    def modify(
+        self, order_id: int, quantity: float = None, limit_price: float = None
+    ) -> bool:
+        """
+        Amend a working order in place (placeOrder with the same id), keeping its id and,
+        where the exchange allows it, its queue priority on a size decrease
+        returns False if the order is already done
+        """
+        managed = self.orders[order_id]
+        if managed.is_done:
+            return False
+        if quantity is not None:
+            managed.order.totalQuantity = quantity
+        if limit_price is not None:
+            managed.order.lmtPrice = limit_price
+        self.bot.placeOrder(order_id, managed.contract, managed.order)
+        return True
+
+    def cancel(self, order_id: int):
+        managed = self.orders.get(order_id)
+        if managed is not None and not managed.is_done:
+            managed.status = "PendingCancel"
+            self.bot.cancelOrder(order_id)
+
+    def cancel_all(self, ticker: str = None):
+        """
+        Cancel the working orders placed through this manager, of one ticker or all of
+        them. Orders of other clients are left alone, unlike reqGlobalCancel
+        """
+        for managed in self.open_orders(ticker):
+            self.cancel(managed.order_id)
+
+    def open_orders(self, ticker: str = None) -> list:
+        return [
+            managed
+            for managed in list(self.orders.values())
+            if not managed.is_done
+            and (ticker is None or managed.contract.symbol == ticker)
+        ]
+
+    def on_fill(self, callback):
+        """
+        Call callback(managed_order, execution) on every fill, from the reader thread
+        """
+        self._fill_listeners.append(callback)
+        return callback
+
+    #################### Callbacks ####################
+    def _acknowledge(self, managed: ManagedOrder):
+        if managed.acknowledged_at is None:
+            managed.acknowledged_at = time.perf_counter()
+
+    def _finish(self, managed: ManagedOrder, status: str):
+        managed.status = status
+        if status in TERMINAL_STATUS:
+            managed._done.set()
+
+    def _on_open_order(self, order_id: int, contract, order, orderState):
+        managed = self.orders.get(order_id)
+        if managed is not None:
+            self._acknowledge(managed)
+
+    def _on_order_status(
+        self,
+        order_id: int,
+        status: str,
+        filled: float,
+        remaining: float,
+        avgFillPrice: float,
+    ):
+        # status only, filled / remaining / avg_fill_price come from execDetails: TWS
+        # sends the two in either order, taking both would count fills twice
+        managed = self.orders.get(order_id)
+        if managed is None:  # placed by another client or session
+            return
+        self._acknowledge(managed)
+        managed.reported_filled = max(managed.reported_filled, float(filled))
+        if managed.is_done:
+            return
+        if status == "Filled" and managed.remaining > 0:
+            managed.status = status  # done once its executions arrived
+            return
+        self._finish(managed, status)
+
+    def _on_execution(self, reqId: int, contract, execution: Execution):
+        managed = self.orders.get(execution.orderId)
+        if managed is None or execution.execId in self._exec_ids:
+            return
+        self._exec_ids.add(execution.execId)
+        self._acknowledge(managed)
+        shares = float(execution.shares)
+        managed.fills.append(
+            (execution.execId, shares, float(execution.price), time.perf_counter())
+        )
+        cost = managed.avg_fill_price * managed.filled + float(execution.price) * shares
+        managed.filled += shares
+        managed.avg_fill_price = cost / managed.filled
+        managed.remaining = max(
+            float(managed.order.totalQuantity) - managed.filled, 0.0
+        )
+        for callback in tuple(self._fill_listeners):
+            callback(managed, execution)
+        if managed.remaining <= 0:
+            self._finish(managed, "Filled")
+
+    def _on_error(self, reqId: int, errorCode: int, errorString: str):
+        managed = self.orders.get(reqId)
+        if managed is None or managed.is_done:
+            return
+        if errorCode not in ORDER_ERRORS:
+            return  # ie market data of the ticker with the same reqId
+        logging.debug("order %d: %d %s", reqId, errorCode, errorString)
+        managed.error = (errorCode, errorString)
+        if errorCode in ORDER_REJECTED:
+            self._finish(managed, "Cancelled" if errorCode == 202 else "Inactive")
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 30 09:03:18 2026
+
+@author: Jeffrey
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+import numpy as np
+
+from ibapi.message import OUT
+
+# priorities, lowest first out
+ORDER, CONTROL, MARKET_DATA, HISTORICAL = 0, 1, 2, 3
+KIND_NAMES = ["order", "control", "market_data", "historical"]
+
+_KIND = {
+    OUT.PLACE_ORDER: ORDER,
+    OUT.CANCEL_ORDER: ORDER,
+    OUT.REQ_GLOBAL_CANCEL: ORDER,
+    OUT.REQ_IDS: ORDER,
+    OUT.REQ_MKT_DATA: MARKET_DATA,
+    OUT.REQ_MKT_DEPTH: MARKET_DATA,
+    OUT.REQ_REAL_TIME_BARS: MARKET_DATA,
+    OUT.REQ_TICK_BY_TICK_DATA: MARKET_DATA,
+    # counted in the historical data pacing
+    OUT.REQ_HISTORICAL_DATA: HISTORICAL,
+    OUT.REQ_HEAD_TIMESTAMP: HISTORICAL,
+    OUT.REQ_HISTOGRAM_DATA: HISTORICAL,
+    OUT.REQ_HISTORICAL_TICKS: HISTORICAL,
+}
+MESSAGE_NAMES = {v: k for k, v in vars(OUT).items() if not k.startswith("_")}
+
+# {cancel: (request it cancels, field of the reqId in the request, in the cancel)}
+_CANCELS = {
+    OUT.CANCEL_MKT_DATA: (OUT.REQ_MKT_DATA, 2, 2),
+    OUT.CANCEL_MKT_DEPTH: (OUT.REQ_MKT_DEPTH, 2, 2),
+    OUT.CANCEL_REAL_TIME_BARS: (OUT.REQ_REAL_TIME_BARS, 2, 2),
+    OUT.CANCEL_TICK_BY_TICK_DATA: (OUT.REQ_TICK_BY_TICK_DATA, 1, 1),
+    OUT.CANCEL_HISTORICAL_DATA: (OUT.REQ_HISTORICAL_DATA, 1, 2),
+    OUT.CANCEL_HEAD_TIMESTAMP: (OUT.REQ_HEAD_TIMESTAMP, 1, 1),
+    OUT.CANCEL_HISTOGRAM_DATA: (OUT.REQ_HISTOGRAM_DATA, 1, 1),
+}
+
+
+def kind(msg: str) -> int:
+    """
+    Priority of an EClient message from its message id, anything else than orders, data
+    and historical requests (cancels, account, positions, ...) is CONTROL
+    """
+    return _KIND.get(int(msg[: msg.index("\0")]), CONTROL)
+
+
+#################### Token Bucket ####################
+class TokenBucket:
+    """
+    rate tokens a second up to capacity, not thread safe (used under Pacer's lock)
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        seconds until a token is available
+        """
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+#################### Pacer ####################
+class Pacer:
+    """
+    Every outgoing EClient message goes through one queue per priority and is sent by a
+    single thread as soon as IB's pacing allows, orders before control messages before
+    market data before historical requests
+
+    A cancel of a request still queued removes the request instead of being sent, it
+    would otherwise go out first and leave the request running
+
+    send: callable writing one message (EClient.sendMsg)
+    messages_per_s: messages a second over the whole connection, 50 by default
+    historical: (requests, seconds) sliding window of historical requests, IB allows
+                60 in 10 minutes
+    identical_s: seconds between two identical historical requests
+    on_sent: called with each message once it is sent
+    on_error: called with a message and the exception raised sending it, it is dropped
+
+    source: https://interactivebrokers.github.io/tws-api/historical_limitations.html
+    """
+
+    def __init__(
+        self,
+        send,
+        messages_per_s: float = 50,
+        historical: tuple = (60, 600),
+        identical_s: float = 15,
+        keep: int = 10_000,
+        on_sent=None,
+        on_error=None,
+    ):
+        self._send = send
+        self.on_sent = on_sent
+        self.on_error = on_error
+        self._messages = TokenBucket(messages_per_s, messages_per_s)
+        self.historical = historical
+        self.identical_s = identical_s
+        self._historical = deque()  # send times in the window
+        self._identical = {}  # {request without its reqId: send time}
+        self._queues = [deque() for _ in KIND_NAMES]  # (enqueued, msg, key)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.sent = [0] * len(KIND_NAMES)
+        self.waits = [deque(maxlen=keep) for _ in KIND_NAMES]  # seconds queued
+
+    def submit(self, msg: str):
+        """
+        Queue one message, returns at once
+        """
+        fields = msg.split("\0")
+        k = kind(msg)
+        key = None
+        if k == HISTORICAL:
+            # identical requests differ by their reqId only, the field after the
+            # message id (server version 124+)
+            key = "\0".join(fields[:1] + fields[2:])
+        with self._cond:
+            cancel = _CANCELS.get(int(fields[0]))
+            if cancel is not None and self._unqueue(*cancel[:2], fields[cancel[2]]):
+                return
+            self._queues[k].append((time.monotonic(), msg, key))
+            self._closed = False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def close(self):
+        """
+        Stop the sending thread, queued messages are dropped
+        """
+        with self._cond:
+            self._closed = True
+            for queue in self._queues:
+                queue.clear()
+            self._cond.notify()
+
+    #################### Scheduling ####################
+    def _unqueue(self, message: int, field: int, reqId: str) -> bool:
+        """
+        Remove the queued message with reqId as its field, False if there is none
+        (sent already)
+        """
+        queue = self._queues[_KIND.get(message, CONTROL)]
+        for item in queue:
+            fields = item[1].split("\0", field + 1)
+            if int(fields[0]) == message and fields[field] == reqId:
+                queue.remove(item)
+                return True
+        return False
+
+    def _wait_time(self, k: int, key: str, now: float) -> float:
+        wait = self._messages.wait_time(now)
+        if k == HISTORICAL:
+            requests, seconds = self.historical
+            window = self._historical
+            while window and window[0] <= now - seconds:
+                window.popleft()
+            if len(window) >= requests:
+                wait = max(wait, window[0] + seconds - now)
+            last = self._identical.get(key)
+            if last is not None:
+                wait = max(wait, last + self.identical_s - now)
+        return wait
+
+    def _next(self) -> tuple:
+        """
+        (kind, enqueued, msg) of the first message that may go now, waiting until then
+        """
+        while not self._closed:
+            now = time.monotonic()
+            wait = None
+            for k, queue in enumerate(self._queues):
+                if not queue:
+                    continue
+                enqueued, msg, key = queue[0]
+                w = self._wait_time(k, key, now)
+                if w <= 0:
+                    queue.popleft()
+                    self._messages.take(now)
+                    if k == HISTORICAL:
+                        self._historical.append(now)
+                        self._identical[key] = now
+                    self.sent[k] += 1
+                    self.waits[k].append(now - enqueued)
+                    return k, enqueued, msg
+                wait = w if wait is None else min(wait, w)
+            self._cond.wait(wait)
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                item = self._next()
+                if item is None:
+                    self._thread = None
+                    return
+            try:
+                self._send(item[2])
+            except Exception as e:
+                logging.error("sending %s failed: %s", KIND_NAMES[item[0]], e)
+                if self.on_error is not None:
+                    self.on_error(item[2], e)
+                continue
+            if self.on_sent is not None:
+                self.on_sent(item[2])
+
+    #################### Inspection ####################
+    def pending(self) -> pd.DataFrame:
+        """
+        Queued messages in sending order with the seconds they have been waiting
+        """
+        now = time.monotonic()
+        with self._cond:
+            rows = [
+                (KIND_NAMES[k], MESSAGE_NAMES.get(int(msg[: msg.index("\0")])), now - t)
+                for k, queue in enumerate(self._queues)
+                for t, msg, _ in queue
+            ]
+        return pd.DataFrame(rows, columns=["kind", "message", "waiting_s"])
+
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    def metrics(self) -> pd.DataFrame:
+        """
+        Messages sent and queued, and their wait in ms (over the last keep messages)
+        per priority
+        """
+        with self._cond:
+            waits = [np.array(w) * 1000 for w in self.waits]
+            queued = [len(queue) for queue in self._queues]
+            window = len(self._historical)
+        stats = pd.DataFrame(
+            {
+                "sent": self.sent,
+                "queued": queued,
+                "mean_wait_ms": [w.mean() if len(w) else np.nan for w in waits],
+                "p99_wait_ms": [
+                    np.percentile(w, 99) if len(w) else np.nan for w in waits
+                ],
+                "max_wait_ms": [w.max() if len(w) else np.nan for w in waits],
+            },
+            index=pd.Index(KIND_NAMES, name="kind"),
+        )
+        stats.attrs["historical_in_window"] = window
+        return stats
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 28 14:02:36 2026
+
+@author: Jeffrey
+"""
+
+import copy
+import os
+import sys
+
+import pandas as pd
+import numpy as np
+
+BACKTEST_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "backtest"
+)
+if BACKTEST_PATH not in sys.path:
+    sys.path.append(BACKTEST_PATH)
+
+from indicators import IndicatorSet, EMA, RSI, ATR, ZScore
+from bar_cache import bar_seconds, tail_duration
+
+CHECKPOINT_PATH = r"D:\IBKR Data\indicators"
+
+
+#################### Indicators ####################
+def spy_indicators() -> IndicatorSet:
+    return IndicatorSet(
+        {
+            "ema_200": EMA(200),
+            "rsi_14": RSI(14),
+            "atr_14": ATR(14),
+            "z_20": ZScore(20),
+        }
+    )
+
+
+#################### Signals ####################
+# each signal takes the close and the indicator values, either scalars of the last bar
+# (live) or arrays / pd.Series of every bar (backtest), and returns -1, 0 or 1
+def trend(close, values):
+    """
+    long above the 200 days ema, short below
+    """
+    return np.sign(close - values["ema_200"])
+
+
+def mean_reversion(close, values):
+    """
+    fade a close more than 2 standard deviations away from its 20 days mean
+    """
+    z = values["z_20"]
+    return -np.sign(z) * (np.abs(z) > 2)
+
+
+def rsi_extreme(close, values):
+    """
+    long when oversold, short when overbought
+    """
+    rsi = values["rsi_14"]
+    return (rsi < 30) * 1 - (rsi > 70) * 1
+
+
+SPY_SIGNALS = [trend, mean_reversion, rsi_extreme]
+
+
+def sum_signals(close, values, signals: list = SPY_SIGNALS):
+    """
+    sum of every signal, 0 where an indicator is still warming up
+    """
+    return np.nan_to_num(sum(signal(close, values) for signal in signals))
+
+
+#################### Live ####################
+def update_indicators(
+    bot,
+    ticker: str,
+    engine: IndicatorSet,
+    barSizeSetting: str = "1 day",
+    path: str = CHECKPOINT_PATH,
+) -> pd.DataFrame:
+    """
+    Bring engine up to the last bar of ticker with as small a download as possible:
+    the whole history ("5 Y") the first time, then only the days since the checkpoint,
+    of which only the bars after the last one processed are run
+
+    Only completed bars go into engine and its checkpoint. The bar still being built
+    (ie today's daily bar) is run on a copy of engine, its values are the last row
+
+    ADJUSTED_LAST history is re-adjusted on dividends and splits, delete the checkpoint
+    to rebuild it from the full history
+    returns the indicator values of the new bars
+    """
+    file = os.path.join(path, f"{ticker}_{barSizeSetting.replace(' ', '')}.json")
+    if engine.last_time is None:
+        engine.load(file)
+    if engine.last_time is None:
+        durationStr = "5 Y"
+    else:  # "N D" past a year is refused, tail_duration moves on to "N Y"
+        durationStr = tail_duration(engine.last_time, barSizeSetting)
+    bars = bot.request_klines(ticker, durationStr, barSizeSetting).result()
+    end = bars.index + pd.Timedelta(seconds=bar_seconds(barSizeSetting))
+    completed = int((end <= pd.Timestamp.now(tz="utc")).sum())
+    new = engine.update_bars(bars.iloc[:completed])
+    if len(new):
+        engine.save(file)
+    if completed < len(bars):
+        live = copy.deepcopy(engine).update_bars(bars.iloc[completed:])
+        new = pd.concat([new, live]) if len(new) else live
+    return new
+
+
+if __name__ == "__main__":
+    import vector_backtest
+
+    # the live signals in batch over a random walk daily history
+    n = 2500
+    close = 100 * np.exp(np.random.standard_normal(n).cumsum() * 0.01)
+    spy = pd.DataFrame(
+        {"high": close * 1.005, "low": close * 0.995, "close": close},
+        index=pd.date_range("2016-01-01", periods=n, freq="B", tz="utc"),
+    )
+    values = spy_indicators().batch(spy)
+    signal = np.clip(sum_signals(spy["close"], values), -1, 1)
+    result = vector_backtest.run(
+        spy["close"], pd.DataFrame({"spy": signal}), periods_per_year=252
+    )
+    print(result["stats"])
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 27 09:20:05 2026
+
+@author: Jeffrey
+"""
+
+import threading
+import time
+from array import array
+
+import pandas as pd
+import numpy as np
+
+BAR_COLUMNS = ["open", "high", "low", "close", "volume"]
+RING_COLUMNS = ["bid", "ask", "last", "bid_size", "ask_size", "last_size"]
+
+# tickPrice / tickSize types, https://interactivebrokers.github.io/tws-api/tick_types.html
+BID_SIZE, BID, ASK, ASK_SIZE, LAST, LAST_SIZE, VOLUME = 0, 1, 2, 3, 4, 5, 8
+_COLUMN = {BID: 0, ASK: 1, LAST: 2, BID_SIZE: 3, ASK_SIZE: 4, LAST_SIZE: 5}
+
+
+#################### Tick Ring ####################
+class TickRing:
+    """
+    Fixed size ring of the quote of one ticker, one row (time, RING_COLUMNS) per tick
+    holding the whole top of book after that tick, the oldest rows are overwritten
+    """
+
+    def __init__(self, capacity: int = 100_000):
+        self.capacity = capacity
+        self.time = np.zeros(capacity, dtype=np.float64)  # epoch seconds
+        self.values = np.full((capacity, len(RING_COLUMNS)), np.nan)
+        self.quote = np.full(len(RING_COLUMNS), np.nan)  # latest row
+        self.count = 0  # ticks ever written
+
+    def update(self, t: float, column: int, value: float):
+        self.quote[column] = value
+        i = self.count % self.capacity
+        self.time[i] = t
+        self.values[i] = self.quote
+        self.count += 1
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def last(self, n: int = None) -> tuple:
+        """
+        (time, values) copies of the last n ticks, oldest first, default all kept
+        """
+        count = self.count
+        n = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+        idx = np.arange(count - n, count) % self.capacity
+        return self.time[idx], self.values[idx]
+
+    def frame(self, n: int = None) -> pd.DataFrame:
+        t, values = self.last(n)
+        index = pd.to_datetime(t, unit="s", utc=True).rename("time")
+        return pd.DataFrame(values, index=index, columns=RING_COLUMNS)
+
+
+#################### Bar Aggregator ####################
+class BarAggregator:
+    """
+    OHLCV bars of seconds from the trades of one ticker, indexed by bar start like
+    reqHistoricalData. Prices come from LAST ticks, volume from VOLUME ticks (same unit
+    as the historical bars)
+    """
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self._bars = {c: array("d") for c in ["time"] + BAR_COLUMNS}
+        self._lock = threading.Lock()  # no append while frame() reads the buffers
+        self.current = None  # [start, open, high, low, close, volume, trades]
+        self._frame = None  # completed bars as pd.DataFrame, until the next bar closes
+
+    def _roll(self, t: float) -> list:
+        # current bar for time t, closing the previous one
+        start = t - t % self.seconds
+        bar = self.current
+        if bar is not None and start > bar[0]:
+            with self._lock:
+                for c, value in zip(["time"] + BAR_COLUMNS, bar):
+                    self._bars[c].append(value)
+                self._frame = None
+            close = bar[4]
+            bar = self.current = [start, close, close, close, close, 0.0, 0]
+        return bar
+
+    def on_trade(self, t: float, price: float):
+        bar = self._roll(t)
+        if bar is None:
+            self.current = [t - t % self.seconds, price, price, price, price, 0.0, 1]
+        elif bar[6] == 0:
+            # first trade of a bar rolled over by time or volume
+            bar[1:5] = price, price, price, price
+            bar[6] = 1
+        else:
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[6] += 1
+
+    def on_volume(self, t: float, volume: float):
+        bar = self._roll(t)
+        if bar is not None:
+            bar[5] += volume
+
+    def __len__(self) -> int:
+        return len(self._bars["time"])
+
+    def frame(self, partial: bool = True) -> pd.DataFrame:
+        """
+        Completed bars, plus the one being built if partial
+        """
+        with self._lock:
+            if self._frame is None:
+                columns = {c: np.array(self._bars[c]) for c in ["time"] + BAR_COLUMNS}
+                index = pd.to_datetime(columns.pop("time"), unit="s", utc=True)
+                self._frame = pd.DataFrame(columns, index=index.rename("time"))
+            frame = self._frame
+        current = self.current
+        if not partial or current is None:
+            return frame
+        current = pd.DataFrame(
+            [current[1:6]],
+            index=pd.to_datetime([current[0]], unit="s", utc=True).rename("time"),
+            columns=BAR_COLUMNS,
+        )
+        return pd.concat([frame, current]) if len(frame) else current
+
+
+#################### Tick Buffer ####################
+class TickBuffer:
+    """
+    Tick rings and live bars of every streamed ticker, fed by IBKRBot.tickPrice /
+    tickSize from the reader thread
+
+    capacity: ticks kept per ticker
+    bar_seconds: bar lengths built from the stream, 1s / 1m / 5m by default
+    """
+
+    def __init__(self, capacity: int = 100_000, bar_seconds: tuple = (1, 60, 300)):
+        self.capacity = capacity
+        self.bar_seconds = bar_seconds
+        self.rings = {}  # {ticker: TickRing}
+        self.aggregators = {}  # {ticker: {seconds: BarAggregator}}
+        self._volume = {}  # {ticker: last cumulative VOLUME tick}
+
+    def _ring(self, ticker: str) -> TickRing:
+        ring = self.rings.get(ticker)
+        if ring is None:
+            ring = self.rings[ticker] = TickRing(self.capacity)
+            self.aggregators[ticker] = {s: BarAggregator(s) for s in self.bar_seconds}
+        return ring
+
+    def on_price(self, ticker: str, tickType: int, price: float, t: float = None):
+        column = _COLUMN.get(tickType)
+        if column is None or price == -1:  # -1: no price available
+            return
+        t = time.time() if t is None else t
+        self._ring(ticker).update(t, column, price)
+        if tickType == LAST:
+            for aggregator in self.aggregators[ticker].values():
+                aggregator.on_trade(t, price)
+
+    def on_size(self, ticker: str, tickType: int, size, t: float = None):
+        t = time.time() if t is None else t
+        if tickType == VOLUME:
+            # cumulative day volume, bars get the difference
+            size = float(size)
+            previous = self._volume.get(ticker)
+            self._volume[ticker] = size
+            if previous is not None and size > previous:
+                self._ring(ticker)
+                for aggregator in self.aggregators[ticker].values():
+                    aggregator.on_volume(t, size - previous)
+            return
+        column = _COLUMN.get(tickType)
+        if column is not None:
+            self._ring(ticker).update(t, column, float(size))
+
+    def quote(self, ticker: str) -> dict:
+        """
+        Latest {bid, ask, last, bid_size, ask_size, last_size} of ticker
+        """
+        return dict(zip(RING_COLUMNS, self._ring(ticker).quote.tolist()))
+
+    def ticks(self, ticker: str, n: int = None) -> pd.DataFrame:
+        return self._ring(ticker).frame(n)
+
+    def bars(
+        self,
+        ticker: str,
+        seconds: int = 60,
+        history: pd.DataFrame = None,
+        partial: bool = True,
+    ) -> pd.DataFrame:
+        """
+        Live bars of seconds of ticker stitched after history, the kline_data bars of the
+        same length: history bars after the first live bar are replaced by the live ones.
+        The first live bar only holds the ticks since the stream started, it is merged
+        into the history bar of the same time. history of another bar length is ignored
+        partial: include the bar still being built
+        """
+        self._ring(ticker)
+        live = self.aggregators[ticker][seconds].frame(partial)
+        if history is None or not len(history) or _seconds(history) != seconds:
+            return live
+        if not len(live):
+            return history
+        first = live.index[0]
+        history = history.loc[history.index <= first, BAR_COLUMNS]
+        if history.index[-1] == first:
+            # open from the download, close from the stream, volume of both
+            old, new = history.iloc[-1], live.iloc[0]
+            merged = [
+                old["open"],
+                max(old["high"], new["high"]),
+                min(old["low"], new["low"]),
+                new["close"],
+                old["volume"] + new["volume"],
+            ]
+            live = live.copy()
+            live.iloc[0] = merged
+            history = history.iloc[:-1]
+        return pd.concat([history, live]) if len(history) else live
+
+
+def _seconds(bars: pd.DataFrame) -> int:
+    # bar length of a kline_data frame, the median spacing of its index
+    if len(bars) < 2:
+        return 0
+    return int(np.median(np.diff(bars.index.asi8)) // 10**9)
@@ -0,0 +1,728 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 31 10:05:27 2026
+
+@author: Jeffrey
+"""
+
+import itertools
+import logging
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+import numpy as np
+
+from ibapi.message import IN, OUT
+
+from bar_cache import bar_seconds, duration_seconds
+from tick_buffer import BID, ASK, LAST, VOLUME
+
+# the message layouts below are the ones of this server version (ibapi 9.81)
+SERVER_VERSION = 157
+ACCOUNT = "DU0000000"
+
+
+def _frame(fields) -> bytes:
+    # size prefix then null terminated fields, see ibapi.comm
+    msg = "".join(f"{field}\0" for field in fields).encode()
+    return struct.pack("!I", len(msg)) + msg
+
+
+#################### Market ####################
+class Market:
+    """
+    Top of book of one symbol, a random walk or the replay of recorded ticks
+
+    price: first price of the random walk
+    volatility: daily volatility of the random walk
+    ticks: pd.DataFrame of bid, ask, last, last_size columns (ie TickBuffer.ticks),
+           replayed one row per tick, the random walk continues after the last row
+    """
+
+    def __init__(
+        self,
+        price: float = 100.0,
+        volatility: float = 0.01,
+        spread: float = 0.01,
+        ticks: pd.DataFrame = None,
+        rng: np.random.Generator = None,
+    ):
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.volatility = volatility
+        self.spread = spread
+        self.bid = round(price - spread / 2, 2)
+        self.ask = round(self.bid + spread, 2)
+        self.last = price
+        self.last_size = 0
+        self.volume = 0  # cumulative, like the VOLUME tick
+        self._replay = None
+        if ticks is not None:
+            columns = ["bid", "ask", "last", "last_size"]
+            self._replay = ticks[columns].ffill().dropna().itertuples(index=False)
+
+    def step(self, seconds: float = 0.1):
+        """
+        Move the book by one tick, seconds after the previous one
+        """
+        row = None if self._replay is None else next(self._replay, None)
+        if row is not None:
+            self.bid, self.ask, self.last, size = row
+            self.last_size = int(size)
+        else:
+            self._replay = None
+            sigma = self.volatility * np.sqrt(seconds / 86400)
+            mid = (self.bid + self.ask) / 2 * np.exp(self.rng.normal(0, sigma))
+            self.bid = round(mid - self.spread / 2, 2)
+            self.ask = round(self.bid + self.spread, 2)
+            self.last = self.ask if self.rng.random() < 0.5 else self.bid
+            self.last_size = int(self.rng.integers(1, 10)) * 100
+        self.volume += self.last_size
+
+
+def _walk(rng: np.random.Generator, path: np.ndarray, sigma: float) -> dict:
+    # bars between the consecutive prices of path, in time order
+    open_, close = path[:-1], path[1:]
+    wick = np.abs(rng.normal(0, sigma / 2, (2, len(close))))
+    return {
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + wick[0]),
+        "low": np.minimum(open_, close) * (1 - wick[1]),
+        "close": close,
+        "volume": rng.integers(1_000, 100_000, len(close)).astype(np.float64),
+    }
+
+
+#################### Session ####################
+class _Session:
+    """
+    One connected client, messages to it are delayed by latency on their own thread
+    """
+
+    def __init__(self, sock: socket.socket, latency: float):
+        self.sock = sock
+        self.latency = latency
+        self.client_id = None
+        self.market_data = {}  # {reqId: symbol}
+        self.history = {}  # {reqId: threading.Timer} of delayed historical answers
+        self.executions = []  # (orderId, execution fields) sent to this client
+        self.positions = False  # reqPositions subscription
+        self.sent = 0
+        self._out = deque()  # (due, bytes)
+        self._cond = threading.Condition()
+        self._closed = False
+        if latency:
+            threading.Thread(target=self._send_delayed, daemon=True).start()
+
+    def send(self, *fields):
+        data = _frame(fields)
+        with self._cond:
+            if self._closed:
+                return
+            self.sent += 1
+            if not self.latency:
+                self._sendall(data)
+                return
+            # constant latency, the queue stays in due order
+            self._out.append((time.monotonic() + self.latency, data))
+            self._cond.notify()
+
+    def _sendall(self, data: bytes):
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            self._closed = True
+
+    def _send_delayed(self):
+        with self._cond:
+            while not self._closed:
+                if not self._out:
+                    self._cond.wait()
+                    continue
+                wait = self._out[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                self._sendall(self._out.popleft()[1])
+
+    def recv(self, n: int) -> bytes:
+        data = b""
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("client disconnected")
+            data += chunk
+        return data
+
+    def read(self) -> list:
+        """
+        Fields of the next message from the client
+        """
+        size = struct.unpack("!I", self.recv(4))[0]
+        return self.recv(size).decode().split("\0")[:-1]
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            for timer in self.history.values():
+                timer.cancel()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+#################### Simulator ####################
+class TWSSimulator:
+    """
+    Local server speaking enough of the TWS API socket protocol for IBKRBot to run
+    offline: nextValidId / reqIds, reqHistoricalData, reqMktData ticks, reqPositions,
+    placeOrder / cancelOrder / reqGlobalCancel with simulated fills, reqExecutions
+
+    latency: seconds added to every message sent to a client, the round trip seen by
+             the bot
+    ticks_per_s: ticks of every streamed symbol a second
+    history_bars_per_s: historical answers are held back len(bars) / history_bars_per_s
+                        seconds, None answers at once
+    bars: {(symbol, barSizeSetting): pd.DataFrame} OHLCV bars served as they are,
+          otherwise a random walk is generated, kept so later requests agree with it
+    ticks: {symbol: pd.DataFrame} ticks replayed by reqMktData, see Market
+    port: 0 picks a free port, read it back from self.port after start()
+
+    Orders: market orders fill at once at the touch, limit orders as soon as the
+    touch reaches their price, always for their whole quantity. openOrder messages
+    are not simulated, the orderStatus ones are
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 7497,
+        latency: float = 0.0,
+        ticks_per_s: float = 10,
+        history_bars_per_s: float = None,
+        bars: dict = None,
+        ticks: dict = None,
+        price: float = 100.0,
+        volatility: float = 0.01,
+        seed: int = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.ticks_per_s = ticks_per_s
+        self.history_bars_per_s = history_bars_per_s
+        self.bars = {} if bars is None else bars
+        self.ticks = {} if ticks is None else ticks
+        self.price = price
+        self.volatility = volatility
+        self.rng = np.random.default_rng(seed)
+
+        self.markets = {}  # {symbol: Market}
+        self.con_ids = {}  # {symbol: conId}
+        self.positions = {}  # {symbol: [position, avgCost]}
+        self.orders = {}  # {(session, orderId): order dict}
+        self._histories = {}  # {(symbol, seconds): pd.DataFrame} generated bars
+        self._tick_time = {}  # {symbol: time.perf_counter() of the last tick}
+        self._next_order_id = 1
+        self._exec_ids = itertools.count(1)
+        self._sessions = []
+        self._lock = threading.RLock()
+        self._server = None
+        self._running = False
+
+        self.received = 0
+        self.fills = 0
+        self._sent = 0  # messages sent to clients since disconnected
+        self.tick_to_order = deque(maxlen=100_000)  # seconds, see metrics()
+
+        self._handlers = {
+            OUT.START_API: self._start_api,
+            OUT.REQ_IDS: self._req_ids,
+            OUT.REQ_CURRENT_TIME: self._req_current_time,
+            OUT.REQ_MKT_DATA: self._req_mkt_data,
+            OUT.CANCEL_MKT_DATA: self._cancel_mkt_data,
+            OUT.REQ_HISTORICAL_DATA: self._req_historical_data,
+            OUT.CANCEL_HISTORICAL_DATA: self._cancel_historical_data,
+            OUT.REQ_POSITIONS: self._req_positions,
+            OUT.CANCEL_POSITIONS: self._cancel_positions,
+            OUT.PLACE_ORDER: self._place_order,
+            OUT.CANCEL_ORDER: self._cancel_order,
+            OUT.REQ_GLOBAL_CANCEL: self._req_global_cancel,
+            OUT.REQ_OPEN_ORDERS: self._req_open_orders,
+            OUT.REQ_ALL_OPEN_ORDERS: self._req_open_orders,
+            OUT.REQ_EXECUTIONS: self._req_executions,
+        }
+
+    #################### Server ####################
+    def start(self):
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        self._running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._stream, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._server.close()
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _accept(self):
+        while self._running:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = _Session(sock, self.latency)
+            threading.Thread(target=self._serve, args=[session], daemon=True).start()
+
+    def _serve(self, session: _Session):
+        try:
+            # "API\0" then the client versions, answered with the server version
+            # and connection time alone in one message
+            if session.recv(4) != b"API\0":
+                raise ConnectionError("not an API client")
+            session.read()
+            session.send(SERVER_VERSION, time.strftime("%Y%m%d %H:%M:%S UTC"))
+            with self._lock:
+                self._sessions.append(session)
+            while self._running:
+                fields = session.read()
+                self.received += 1
+                handler = self._handlers.get(int(fields[0]))
+                if handler is None:
+                    logging.debug("simulator ignores message %s", fields[0])
+                    continue
+                with self._lock:
+                    handler(session, fields)
+        except (ConnectionError, OSError) as e:
+            logging.debug("simulator session closed: %s", e)
+        finally:
+            with self._lock:
+                if session in self._sessions:
+                    self._sessions.remove(session)
+                for key in [key for key in self.orders if key[0] is session]:
+                    del self.orders[key]
+                self._sent += session.sent
+            session.close()
+
+    #################### Requests ####################
+    def _start_api(self, session: _Session, fields: list):
+        session.client_id = int(fields[2])
+        session.send(IN.NEXT_VALID_ID, 1, self._next_order_id)
+        session.send(IN.MANAGED_ACCTS, 1, ACCOUNT)
+
+    def _req_ids(self, session: _Session, fields: list):
+        session.send(IN.NEXT_VALID_ID, 1, self._next_order_id)
+
+    def _req_current_time(self, session: _Session, fields: list):
+        session.send(IN.CURRENT_TIME, 1, int(time.time()))
+
+    def _req_open_orders(self, session: _Session, fields: list):
+        session.send(IN.OPEN_ORDER_END, 1)
+
+    def _req_mkt_data(self, session: _Session, fields: list):
+        # [msgId, version, reqId, conId, symbol, ...]
+        self._market(fields[4])
+        session.market_data[int(fields[2])] = fields[4]
+
+    def _cancel_mkt_data(self, session: _Session, fields: list):
+        session.market_data.pop(int(fields[2]), None)
+
+    def _req_positions(self, session: _Session, fields: list):
+        session.positions = True
+        for symbol in self.positions:
+            self._send_position(session, symbol)
+        session.send(IN.POSITION_END, 1)
+
+    def _cancel_positions(self, session: _Session, fields: list):
+        session.positions = False
+
+    def _req_executions(self, session: _Session, fields: list):
+        reqId = int(fields[2])
+        for _, execution in session.executions:
+            session.send(IN.EXECUTION_DATA, reqId, *execution)
+        session.send(IN.EXECUTION_DATA_END, 1, reqId)
+
+    def _error(self, session: _Session, reqId: int, errorCode: int, errorString: str):
+        session.send(IN.ERR_MSG, 2, reqId, errorCode, errorString)
+
+    #################### Market Data ####################
+    def _market(self, symbol: str) -> Market:
+        market = self.markets.get(symbol)
+        if market is None:
+            market = self.markets[symbol] = Market(
+                self.price, self.volatility, ticks=self.ticks.get(symbol), rng=self.rng
+            )
+            self.con_ids[symbol] = 100_000 + len(self.con_ids)
+        return market
+
+    def _stream(self):
+        period = 1 / self.ticks_per_s
+        due = time.monotonic()
+        while self._running:
+            due = max(due + period, time.monotonic())
+            time.sleep(max(0.0, due - time.monotonic()))
+            with self._lock:
+                subscribers = {}  # {symbol: [(session, reqId)]}
+                for session in self._sessions:
+                    for reqId, symbol in session.market_data.items():
+                        subscribers.setdefault(symbol, []).append((session, reqId))
+                for symbol, targets in subscribers.items():
+                    market = self.markets[symbol]
+                    market.step(period)
+                    self._tick_time[symbol] = time.perf_counter()
+                    for session, reqId in targets:
+                        self._send_ticks(session, reqId, market)
+                    self._match(symbol)
+
+    def _send_ticks(self, session: _Session, reqId: int, market: Market):
+        size = int(self.rng.integers(1, 50)) * 100
+        # tickPrice with its size, [msgId, version, reqId, tickType, price, size, attrib]
+        session.send(IN.TICK_PRICE, 6, reqId, BID, market.bid, size, 0)
+        session.send(IN.TICK_PRICE, 6, reqId, ASK, market.ask, size, 0)
+        session.send(IN.TICK_PRICE, 6, reqId, LAST, market.last, market.last_size, 0)
+        session.send(IN.TICK_SIZE, 6, reqId, VOLUME, market.volume)
+
+    #################### Historical Data ####################
+    def _req_historical_data(self, session: _Session, fields: list):
+        # [msgId, reqId, conId, symbol, secType, ..., includeExpired, endDateTime,
+        #  barSizeSetting, durationStr, useRTH, whatToShow, formatDate, ...]
+        reqId, symbol = int(fields[1]), fields[3]
+        endDateTime, barSizeSetting, durationStr = fields[15:18]
+        try:
+            bars = self.history(symbol, barSizeSetting, durationStr, endDateTime)
+        except (ValueError, KeyError) as e:
+            self._error(session, reqId, 321, f"Error validating request: {e}")
+            return
+        seconds = bar_seconds(barSizeSetting)
+        fmt = "%Y%m%d" if seconds >= 86400 else "%Y%m%d %H:%M:%S UTC"
+        dates = bars.index.strftime(fmt)
+        message = [IN.HISTORICAL_DATA, reqId, dates[0], dates[-1], len(bars)]
+        for date, o, h, l, c, v in zip(dates, *(bars[c] for c in bars.columns)):
+            message += [date, o, h, l, c, int(v), round((o + h + l + c) / 4, 4), 1]
+
+        if not self.history_bars_per_s:
+            session.send(*message)
+            return
+
+        def answer():
+            with self._lock:
+                if session.history.pop(reqId, None) is not None:
+                    session.send(*message)
+
+        timer = threading.Timer(len(bars) / self.history_bars_per_s, answer)
+        session.history[reqId] = timer
+        timer.start()
+
+    def _cancel_historical_data(self, session: _Session, fields: list):
+        timer = session.history.pop(int(fields[2]), None)
+        if timer is not None:
+            timer.cancel()
+
+    def history(
+        self, symbol: str, barSizeSetting: str, durationStr: str, endDateTime: str = ""
+    ) -> pd.DataFrame:
+        """
+        OHLCV bars of a request, from self.bars or the random walk of symbol
+        """
+        seconds = bar_seconds(barSizeSetting)
+        end = pd.Timestamp.now(tz="utc")
+        if endDateTime:
+            end = pd.Timestamp(endDateTime[:17], tz="utc")
+        start = end - pd.Timedelta(seconds=duration_seconds(durationStr))
+        if (symbol, barSizeSetting) in self.bars:
+            bars = self.bars[symbol, barSizeSetting]
+        else:
+            if seconds == 86400:
+                grid = pd.bdate_range(start.normalize(), end.normalize(), tz="utc")
+            else:
+                grid = pd.date_range(
+                    start.floor(f"{seconds}s"), end, freq=f"{seconds}s", tz="utc"
+                )
+            bars = self._extend(symbol, seconds, grid)
+        bars = bars[(bars.index > start - pd.Timedelta(seconds=seconds))]
+        bars = bars[bars.index <= end]
+        if not len(bars):
+            raise ValueError(f"no data for {symbol} {durationStr} {barSizeSetting}")
+        return bars[["open", "high", "low", "close", "volume"]]
+
+    def _extend(self, symbol: str, seconds: int, grid: pd.DatetimeIndex):
+        # generated bars of symbol covering grid, the walk grows backward and forward
+        # from what earlier requests were given
+        bars = self._histories.get((symbol, seconds))
+        sigma = self.volatility * np.sqrt(seconds / 86400)
+        parts = []
+        if bars is None:
+            before, after = grid, grid[:0]
+            first, last = self._market(symbol).last, None
+        else:
+            before = grid[grid < bars.index[0]]
+            after = grid[grid > bars.index[-1]]
+            first, last = bars["open"].iloc[0], bars["close"].iloc[-1]
+        if len(before):
+            steps = np.exp(self.rng.normal(0, sigma, len(before)).cumsum())
+            path = np.r_[first, first * steps][::-1]
+            parts.append(pd.DataFrame(_walk(self.rng, path, sigma), index=before))
+        if bars is not None:
+            parts.append(bars)
+        if len(after):
+            steps = np.exp(self.rng.normal(0, sigma, len(after)).cumsum())
+            path = np.r_[last, last * steps]
+            parts.append(pd.DataFrame(_walk(self.rng, path, sigma), index=after))
+        bars = self._histories[symbol, seconds] = pd.concat(parts)
+        return bars
+
+    #################### Orders ####################
+    def _place_order(self, session: _Session, fields: list):
+        # [msgId, orderId, conId, symbol, ..., action, totalQuantity, orderType,
+        #  lmtPrice, auxPrice, ...]
+        orderId, symbol = int(fields[1]), fields[3]
+        action, quantity, orderType, lmtPrice = fields[16:20]
+        tick = self._tick_time.get(symbol)
+        if tick is not None:
+            self.tick_to_order.append(time.perf_counter() - tick)
+        self._next_order_id = max(self._next_order_id, orderId + 1)
+        order = self.orders.get((session, orderId))
+        if order is not None and order["status"] != "Submitted":
+            self._error(session, orderId, 104, "Cannot modify a filled order.")
+            return
+        if order is None:
+            order = self.orders[session, orderId] = {
+                "session": session,
+                "orderId": orderId,
+                "symbol": symbol,
+                "action": action,
+                "filled": 0.0,
+                "avg_price": 0.0,
+            }
+        order["status"] = "Submitted"
+        order["quantity"] = float(quantity)
+        order["type"] = orderType
+        order["price"] = float(lmtPrice) if lmtPrice else None
+        self._market(symbol)
+        self._order_status(order)
+        self._match(symbol)
+
+    def _cancel_order(self, session: _Session, fields: list):
+        order = self.orders.get((session, int(fields[2])))
+        if order is None or order["status"] != "Submitted":
+            self._error(
+                session,
+                int(fields[2]),
+                10147,
+                "OrderId that needs to be cancelled is not found.",
+            )
+            return
+        order["status"] = "Cancelled"
+        self._order_status(order)
+
+    def _req_global_cancel(self, session: _Session, fields: list):
+        # every order of every client, like TWS
+        for order in self.orders.values():
+            if order["status"] == "Submitted":
+                order["status"] = "Cancelled"
+                self._order_status(order)
+
+    def _order_status(self, order: dict):
+        # [msgId, orderId, status, filled, remaining, avgFillPrice, permId, parentId,
+        #  lastFillPrice, clientId, whyHeld, mktCapPrice]
+        order["session"].send(
+            IN.ORDER_STATUS,
+            order["orderId"],
+            order["status"],
+            order["filled"],
+            order["quantity"] - order["filled"],
+            order["avg_price"],
+            order["orderId"],
+            0,
+            order["avg_price"],
+            order["session"].client_id,
+            "",
+            0,
+        )
+
+    def _match(self, symbol: str):
+        # fill the open orders of symbol the touch reaches
+        market = self.markets[symbol]
+        for order in list(self.orders.values()):
+            if order["symbol"] != symbol or order["status"] != "Submitted":
+                continue
+            buy = order["action"] == "BUY"
+            price = market.ask if buy else market.bid
+            limit = order["price"]
+            if order["type"] == "LMT":
+                if limit is None or (price > limit if buy else price < limit):
+                    continue
+            self._fill(order, price)
+
+    def _fill(self, order: dict, price: float):
+        session, symbol = order["session"], order["symbol"]
+        shares = order["quantity"] - order["filled"]
+        order["avg_price"] = (
+            order["avg_price"] * order["filled"] + price * shares
+        ) / order["quantity"]
+        order["filled"] = order["quantity"]
+        order["status"] = "Filled"
+        self.fills += 1
+
+        # [orderId, contract, execution] fields of an execDetails, after its reqId
+        side = "BOT" if order["action"] == "BUY" else "SLD"
+        execution = [
+            order["orderId"],
+            self.con_ids[symbol],
+            symbol,
+            "STK",
+            "",
+            0.0,
+            "",
+            "",
+            "ARCA",
+            "USD",
+            symbol,
+            symbol,
+            f"{self.port:04x}.{next(self._exec_ids):08x}.01.01",
+            time.strftime("%Y%m%d  %H:%M:%S"),
+            ACCOUNT,
+            "ARCA",
+            side,
+            shares,
+            price,
+            order["orderId"],
+            session.client_id,
+            0,
+            order["filled"],
+            order["avg_price"],
+            "",
+            "",
+            "",
+            "",
+            1,
+        ]
+        session.executions.append((order["orderId"], execution))
+        session.send(IN.EXECUTION_DATA, -1, *execution)
+        self._order_status(order)
+
+        held, cost = self.positions.get(symbol, [0.0, 0.0])
+        change = shares if side == "BOT" else -shares
+        new = held + change
+        if new == 0:
+            cost = 0.0
+        elif held == 0 or (held > 0) != (new > 0):
+            cost = price
+        elif abs(new) > abs(held):
+            cost = (cost * held + price * change) / new
+        self.positions[symbol] = [new, cost]
+        for other in self._sessions:
+            if other.positions:
+                self._send_position(other, symbol)
+
+    def _send_position(self, session: _Session, symbol: str):
+        position, cost = self.positions[symbol]
+        # [msgId, version, account, conId, symbol, secType, lastTradeDate, strike,
+        #  right, multiplier, exchange, currency, localSymbol, tradingClass, position,
+        #  avgCost]
+        session.send(
+            IN.POSITION_DATA,
+            3,
+            ACCOUNT,
+            self.con_ids[symbol],
+            symbol,
+            "STK",
+            "",
+            0.0,
+            "",
+            "",
+            "ARCA",
+            "USD",
+            symbol,
+            symbol,
+            position,
+            cost,
+        )
+
+    #################### Inspection ####################
+    def metrics(self) -> pd.Series:
+        """
+        Messages received and sent, fills, and the ms from the last tick of a symbol to
+        a placeOrder of it (latency included)
+        """
+        with self._lock:
+            sent = self._sent + sum(session.sent for session in self._sessions)
+            waits = np.array(self.tick_to_order) * 1000
+        empty = not len(waits)
+        return pd.Series(
+            {
+                "received": self.received,
+                "sent": sent,
+                "fills": self.fills,
+                "orders": len(waits),
+                "tick_to_order_mean_ms": np.nan if empty else waits.mean(),
+                "tick_to_order_p50_ms": np.nan if empty else np.percentile(waits, 50),
+                "tick_to_order_p99_ms": np.nan if empty else np.percentile(waits, 99),
+                "tick_to_order_max_ms": np.nan if empty else waits.max(),
+            }
+        )
+
+
+if __name__ == "__main__":
+    from ibkr_bot import IBKRBot
+
+    # benchmark IBKRBot against the simulator: historical throughput, then the time
+    # from a tick to the order it triggers and from an order to its fill
+    tickers = [f"S{i:03d}" for i in range(100)]
+    simulator = TWSSimulator(port=0, latency=0.001, ticks_per_s=20, seed=0).start()
+    bot = IBKRBot(tickers=tickers)
+    bot.pacer.historical = (10_000, 600)  # the simulator does not pace
+    bot.set_connection(port=simulator.port, clientId=1)
+    threading.Thread(target=bot.run, daemon=True).start()
+    bot.request_order_id().result(5)
+
+    start = time.perf_counter()
+    failed = bot.kline_download("1 Y", "1 day")
+    elapsed = time.perf_counter() - start
+    count = sum(len(bot.kline_data[ticker]) for ticker in tickers)
+    print(
+        f"kline_download: {count} bars in {elapsed:.3f}s, {count / elapsed:,.0f} bars/s"
+    )
+
+    # a limit order far from the touch on every 10th last price of the first ticker
+    ticks = itertools.count()
+
+    def on_tick(reqId, tickType, price):
+        if reqId == 0 and tickType == LAST and next(ticks) % 10 == 0:
+            bot.place_order(tickers[0], "BUY", "LIMIT", 1, round(price * 0.9, 2))
+
+    bot.subscribe("tick", on_tick)
+    bot.stream_data()
+    time.sleep(5)
+    bot.unsubscribe("tick", on_tick)
+    bot.cancel_all_open_orders()
+
+    fills = []
+    for _ in range(50):
+        start = time.perf_counter()
+        bot.place_order(tickers[1], "BUY", "MARKET", 100).wait(5)
+        fills.append((time.perf_counter() - start) * 1000)
+    print(simulator.metrics())
+    print(f"placeOrder -> fill: {np.mean(fills):.2f}ms mean, {np.max(fills):.2f}ms max")
+    print(bot.balance())
+
+    bot.close()
+    simulator.stop()